@@ -1,23 +1,58 @@
-from fastapi import FastAPI, HTTPException, Response, status, Depends, BackgroundTasks, Body
+from fastapi import FastAPI, HTTPException, Request, Response, status, Depends, Body, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Union, Literal, Dict
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, field_validator
+from typing import Any, List, Optional, Tuple, Union, Literal, Dict
 from datetime import date, datetime, timedelta
 from abc import ABC
+from dataclasses import replace
 from enum import Enum
+import base64
 import random
+import hashlib
+import json
+import resource
+import time
+import socket
+import threading
+import numpy as np
 import pandas as pd
 from jose import jwt, JWTError
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
+from bson.errors import InvalidId
+from contextlib import asynccontextmanager
 
 import os
 
 from backtester.back_tester import BackTester
 from backtester.environment import Environment as BackTesterEnvironment
+from backtester.market_data import MarketData
+from backtester.shared_data import SharedDataStore
+from backtester.coverage import coverage, find_gaps
+from backtester.comparison import compare
+from backtester.streaming import FIELDS as BAR_FIELDS, PaperTrader
+from backtester.run_control import BacktestAborted, RunControl
+from backtester.analytics import compute_summary
+from backtester.cost_model import Admission, AdmissionPolicy, estimate_cost
+from backtester import portfolio_history
+from backtester.robustness import block_bootstrap, daily_returns, summarize_paths, trade_reshuffle
+from backtester.optimization import (
+    expand_grid, halving_cost, make_strategy, strategy_params, successive_halving, walk_forward
+)
 from backtester.strategies.percentage_sma_strategy import PercentageSMAStrategy as BackTesterPercentageSMAStrategy
 from backtester.strategies.rsi_strategy import RSIStrategy as BackTesterRSIStrategy
+from backtester.strategies.ranking_strategy import RankingStrategy as BackTesterRankingStrategy
+from backtester.strategies.expression_strategy import ExpressionStrategy as BackTesterExpressionStrategy
+from backtester.expressions import CompiledExpression
+from run_registry import Quota, QuotaExceeded, QueueFull, RunQueue, run_to_dict
+from worker import Worker
+from warmup import Warmup
+from metrics import MetricsRegistry
 from auth import (
     UserCreate, UserLogin, User, Token, verify_password,
     get_password_hash, create_access_token, get_current_user,
@@ -26,17 +61,198 @@ from auth import (
 
 import dotenv
 
-dotenv.load_dotenv()
+# Everything below is initialized in lifespan() so importing the app has no
+# side effects (no CSV parsing, no Mongo connection)
+warmup = Warmup()
+metrics_registry = MetricsRegistry()
+data_df: Optional[pd.DataFrame] = None
+trading_calendar: List[date] = []
+shared_market_data: Optional[MarketData] = None
+# Set when MARKET_DATA_DIR is; market data is then memory-mapped from there
+# and shared with every other worker process instead of parsed per process
+shared_data_store: Optional[SharedDataStore] = None
+client: Optional[MongoClient] = None
+db = None
+users_collection = None
+
+BACKTEST_MAX_SECONDS: Optional[float] = None
+BACKTEST_MAX_MEMORY_MB: Optional[float] = None
+BACKTEST_SECONDS_PER_UNIT: Optional[float] = None
+BACKTEST_INSTRUMENT = False
+backtest_queue: Optional[RunQueue] = None
+# Per-user limits, charged from the resources recorded with each run in backtest_runs
+user_quota = Quota()
+admission_policy: Optional[AdmissionPolicy] = None
+# Worker threads that execute queued backtests inside this API process
+BACKTEST_WORKERS = 2
+backtest_workers: List[Worker] = []
+# Paper trading sessions this process has served, by environment id: (session id, trader, lock).
+# The session itself is stored in MongoDB, so any process can rebuild it and catch up
+paper_sessions: Dict[str, tuple] = {}
+paper_sessions_lock = threading.Lock()
+
+DATA_PATH = "./backtester/data.csv"
+
+def _optional_float_env(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+def _configure():
+    global client, db, users_collection
+    global BACKTEST_MAX_SECONDS, BACKTEST_MAX_MEMORY_MB, BACKTEST_SECONDS_PER_UNIT, BACKTEST_INSTRUMENT
+    global backtest_queue, admission_policy, BACKTEST_WORKERS, shared_data_store, user_quota
+
+    # Initialize MongoDB client (connects lazily on first operation)
+    mongo_uri = os.getenv("MONGO_URI")
+    client = MongoClient(f"{mongo_uri}")
+    db = client['backtesting']
+    users_collection = db['users']
+
+    # Per-run budgets; a run that exceeds either is aborted between trading days
+    BACKTEST_MAX_SECONDS = _optional_float_env("BACKTEST_MAX_SECONDS")
+    BACKTEST_MAX_MEMORY_MB = _optional_float_env("BACKTEST_MAX_MEMORY_MB")
+
+    # Admission control: cost is measured in units of ticker x trading day x (1 + lookback)
+    admission_policy = AdmissionPolicy(
+        low_priority_units=_optional_float_env("BACKTEST_LOW_PRIORITY_UNITS"),
+        reject_units=_optional_float_env("BACKTEST_REJECT_UNITS"),
+    )
+    BACKTEST_SECONDS_PER_UNIT = _optional_float_env("BACKTEST_SECONDS_PER_UNIT")
+
+    # Opt-in per-phase timers in BackTester; results are stored in the metrics collection
+    BACKTEST_INSTRUMENT = os.getenv("BACKTEST_INSTRUMENT", "").lower() in ("1", "true", "yes")
+
+    # Backtests are queued in MongoDB and run by workers (worker.py); with
+    # BACKTEST_WORKERS=0 this process only enqueues
+    backtest_queue = RunQueue(
+        db['backtest_runs'],
+        lease_seconds=float(os.getenv("BACKTEST_LEASE_SECONDS", "30")),
+        max_attempts=int(os.getenv("BACKTEST_MAX_ATTEMPTS", "3")),
+        max_queued=int(os.getenv("BACKTEST_MAX_QUEUED")) if os.getenv("BACKTEST_MAX_QUEUED") else None,
+        environments=db['environments'],
+    )
+    BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", "2"))
+
+    # Unset means unlimited; checked before queueing a backtest and before batch and walk-forward runs
+    user_quota = Quota(
+        cpu_seconds_per_day=_optional_float_env("QUOTA_CPU_SECONDS_PER_DAY"),
+        max_concurrent_runs=int(os.getenv("QUOTA_MAX_CONCURRENT_RUNS")) if os.getenv("QUOTA_MAX_CONCURRENT_RUNS") else None,
+    )
+
+    market_data_dir = os.getenv("MARKET_DATA_DIR")
+    shared_data_store = SharedDataStore(market_data_dir) if market_data_dir else None
+
+def _warm(warmup: Warmup):
+    """Background warmup: parse the dataset, build shared market data, precompute indicators."""
+    global data_df, trading_calendar, shared_market_data
+
+    with warmup.phase("indexes"):
+        # Separately, so one failing step does not silently skip the others
+        for step, run in [
+            ("create result indexes", lambda: _ensure_indexes(db)),
+            ("create run queue indexes", backtest_queue.ensure_indexes),
+            ("backfill listing fields", lambda: _backfill_listing_fields(db)),
+        ]:
+            try:
+                run()
+            except Exception as e:
+                print(f"[STARTUP] Could not {step}: {type(e).__name__}: {e}")
 
-data_df = pd.read_csv("./backtester/data.csv")
+    if shared_data_store is not None:
+        with warmup.phase("shared_data"):
+            # The first worker to start publishes the CSV; the rest, and
+            # restarted workers, attach to whatever version is current
+            version = shared_data_store.ensure(DATA_PATH)
+            market_data = shared_data_store.attach(version)
+            trading_calendar = market_data.trading_dates
+            shared_market_data = market_data
+        print(f"[STARTUP] Attached shared market data version {version}")
+        warmup.mark_data_loaded()
+    else:
+        with warmup.phase("read_csv"):
+            data_df = pd.read_csv(DATA_PATH)
+            # Sorted trading calendar of the dataset, used to estimate backtest cost up front
+            trading_calendar = sorted(pd.to_datetime(data_df["date"]).dt.date.unique())
+        warmup.mark_data_loaded()
 
-# Initialize MongoDB client
-mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(f"{mongo_uri}")
-db = client['backtesting']
-users_collection = db['users']
+        with warmup.phase("market_data"):
+            market_data = MarketData(data_df)
 
-app = FastAPI()
+    with warmup.phase("indicators"):
+        # Precompute the indicator series of every strategy in every stored environment.
+        # Only an optimization: backtests compute what is missing, so the market data is
+        # published below even if MongoDB cannot be read
+        try:
+            for env in db.environments.find({}, {"stocks": 1, "strategies": 1}):
+                try:
+                    # On the view backtests of the environment's tickers will run on
+                    env_market_data = market_data.for_tickers(env.get("stocks", []))
+                    for strategy in _get_backtester_strategies(env):
+                        for ticker in env.get("stocks", []):
+                            strategy.warmup(env_market_data, ticker)
+                except Exception as e:
+                    print(f"[STARTUP] Skipping indicator warmup for {env['_id']}: {type(e).__name__}: {e}")
+        except Exception as e:
+            print(f"[STARTUP] Could not load environments for indicator warmup: {type(e).__name__}: {e}")
+
+    shared_market_data = market_data
+
+def _wait_for_data(timeout: Optional[float] = 0):
+    """Raise 503 unless the dataset has been loaded (optionally waiting up to timeout seconds)."""
+    if not warmup.wait_for_data(timeout=timeout) or (data_df is None and shared_market_data is None):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Market data is not loaded yet",
+            headers={"Retry-After": "5"}
+        )
+    _reattach_shared_data()
+
+def _reattach_shared_data():
+    """Switch to the current shared market data version if another process published a new one."""
+    global trading_calendar, shared_market_data
+    if shared_data_store is None or shared_market_data is None:
+        return
+    version = shared_data_store.current()
+    if version is None or version == shared_market_data.version:
+        return
+    try:
+        market_data = shared_data_store.attach(version)
+    except FileNotFoundError:
+        # Already replaced by a newer version; pick that up on the next request
+        return
+    # Runs in progress keep the version they started with
+    trading_calendar = market_data.trading_dates
+    shared_market_data = market_data
+    print(f"[SHARED DATA] Attached market data version {version}")
+
+def _market_data(tickers: Optional[List[str]] = None) -> MarketData:
+    """
+    Market data of tickers (all by default) on the days any of them trades,
+    as MarketData(data_df, tickers) builds it. Sliced from the shared copy
+    once warmup has built it, so results do not depend on whether it has.
+    """
+    if shared_market_data is None:
+        return MarketData(data_df, tickers)
+    return shared_market_data.for_tickers(tickers)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with warmup.phase("config"):
+        dotenv.load_dotenv()
+        _configure()
+    warmup.start(_warm)
+    stop_workers = threading.Event()
+    for i in range(BACKTEST_WORKERS):
+        worker = make_worker(f"{socket.gethostname()}:{os.getpid()}:api-{i}")
+        worker.start(stop_workers)
+        backtest_workers.append(worker)
+    yield
+    stop_workers.set()
+    backtest_workers.clear()
+    if client is not None:
+        client.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -45,8 +261,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+# Compress large result payloads (returns/portfolio/trades series)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/{env_name}/returns), not the concrete path
+    route = request.scope.get("route")
+    metrics_registry.observe_request(
+        request.method,
+        route.path if route is not None else "unmatched",
+        response.status_code,
+        time.perf_counter() - started
+    )
+    return response
+
 # Secret key for JWT token signing (in production, use a secure environment variable)
 SECRET_KEY = "your-secret-key-keep-it-secret"
 ALGORITHM = "HS256"
@@ -113,6 +347,33 @@ class RSIStrategy(Strategy):
     stop_loss_pct: Optional[float] = None
     take_profit_pct: Optional[float] = None
 
+class RankingStrategy(Strategy):
+    type: Literal["RankingStrategy"]
+    metric: Literal["momentum", "rsi"]
+    lookback: int
+    top_n: int
+    rebalance_days: int
+    position_type: Literal["long", "short"]
+    select: Optional[Literal["highest", "lowest"]] = None
+    description: str = "Ranks the whole universe each rebalance day and holds the top names with equal weights"
+    stop_loss_pct: Optional[float] = None
+    take_profit_pct: Optional[float] = None
+
+class ExpressionStrategy(Strategy):
+    type: Literal["ExpressionStrategy"]
+    expression: str
+    position_type: Literal["long", "short"]
+    description: str = "Enters positions when an expression over prices and indicators is true"
+    stop_loss_pct: Optional[float] = None
+    take_profit_pct: Optional[float] = None
+
+    @field_validator("expression")
+    @classmethod
+    def _compiles(cls, expression: str) -> str:
+        # ExpressionError is a ValueError, so invalid rules are rejected with 422
+        CompiledExpression(expression)
+        return expression
+
 class VolumeMAStrategy(Strategy):
     type: Literal["VolumeMAStrategy"]
     days: int
@@ -125,7 +386,8 @@ class Environment(BaseModel):
     stocks: List[str]
     start_date: date
     end_date: date
-    strategies: List[Union[ExampleStrategy, ExampleStrategy2, PercentageSMAStrategy, RSIStrategy]]
+    strategies: List[Union[ExampleStrategy, ExampleStrategy2, PercentageSMAStrategy, RSIStrategy, RankingStrategy, ExpressionStrategy]]
+    missing_data: Literal["abort", "ffill", "skip"] = "abort"
 
 # New model for returns data
 class ReturnsData(BaseModel):
@@ -137,6 +399,16 @@ class PortfolioData(BaseModel):
     date: date
     positions: Dict[str, float]  # stock -> amount
 
+class PortfolioEvent(BaseModel):
+    date: date
+    stock: str
+    amount: float  # net amount from this date on, 0 once closed
+
+class PortfolioEventsData(BaseModel):
+    dates: List[date]
+    initial: Dict[str, float]  # positions held before the first date
+    events: List[PortfolioEvent]
+
 # New model for trade data
 class TradeType(str, Enum):
     LONG = "Long"
@@ -148,10 +420,191 @@ class TradeData(BaseModel):
     cash: float
     type: TradeType
 
+class TradeAggregate(BaseModel):
+    stock: str
+    trades: int
+    long: int
+    short: int
+    notional: float  # sum of cash over the trades
+
+MAX_TRADES_PAGE = 10000
+
 # Response model for backtest
 class BacktestResponse(BaseModel):
     status: str = "ok"
 
+class CostEstimateResponse(BaseModel):
+    tickers: int
+    trading_days: int
+    strategies: int
+    max_lookback: int
+    units: float
+    estimated_seconds: float
+    admission: Literal["admit", "low_priority", "reject"]
+
+class CoverageGap(BaseModel):
+    stock: str
+    missing_days: int
+    first: date
+    last: date
+
+class CoverageResponse(BaseModel):
+    trading_days: int
+    complete: bool
+    gaps: List[CoverageGap]
+
+class RunUsage(BaseModel):
+    wall_s: float
+    cpu_s: float
+    peak_rss_mb: Optional[float] = None
+    trading_days: Optional[int] = None
+    strategy_calls: Optional[int] = None
+    positions_opened: Optional[int] = None
+
+class BacktestRunResponse(BaseModel):
+    run_id: str
+    status: str
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    usage: Optional[RunUsage] = None
+    attached: bool = False
+    estimate: Optional[CostEstimateResponse] = None
+
+class RunResultResponse(BacktestRunResponse):
+    kind: str = "backtest"
+    result: Optional[Dict[str, Any]] = None
+
+# Request/response models for batch backtests
+class EnvironmentListItem(BaseModel):
+    name: str
+    stocks: List[str]
+    start_date: date
+    end_date: date
+    missing_data: Literal["abort", "ffill", "skip"] = "abort"
+    strategy_count: int = 0
+    run_status: Optional[str] = None
+    last_run_at: Optional[datetime] = None
+    last_return: Optional[float] = None
+
+ENVIRONMENT_SORTS = ("name", "last_run_at", "last_return", "strategy_count")
+MAX_ENVIRONMENTS_PAGE = 500
+
+class UserUsageResponse(BaseModel):
+    active_runs: int
+    runs_last_day: int
+    cpu_seconds_last_day: float
+    window_resets_at: Optional[datetime] = None
+    cpu_seconds_per_day: Optional[float] = None
+    max_concurrent_runs: Optional[int] = None
+
+class BatchBacktestRequest(BaseModel):
+    environments: Union[Literal["all"], List[str]] = "all"
+
+class BatchBacktestStatus(BaseModel):
+    name: str
+    status: Literal["queued", "not_found", "rejected"]
+    detail: Optional[str] = None
+    # Run to follow with GET /{env_name}/backtest/status; attached to an identical active run if attached
+    run_id: Optional[str] = None
+    attached: Optional[bool] = None
+
+# Request/response models for walk-forward optimization
+class WalkForwardRequest(BaseModel):
+    strategy: str
+    param_grid: Dict[str, List[Any]]
+    train_days: int = 252
+    test_days: int = 63
+    step_days: Optional[int] = None
+    metric: Literal["sharpe", "sortino", "total_return", "cagr"] = "sharpe"
+    max_workers: Optional[int] = None
+
+class WalkForwardWindowResult(BaseModel):
+    train_start: date
+    train_end: date
+    test_start: date
+    test_end: date
+    best_params: Dict[str, Any]
+    train_score: Optional[float] = None
+    test_return: Optional[float] = None
+
+class WalkForwardResponse(BaseModel):
+    strategy_type: str
+    metric: str
+    candidates: int
+    windows: List[WalkForwardWindowResult]
+    equity_curve: List[ReturnsData]
+
+# Request model for comparing environments
+MAX_COMPARED_ENVIRONMENTS = 100
+
+class CompareRequest(BaseModel):
+    environments: List[str]
+    baseline: Optional[str] = None
+    calendar: Literal["union", "intersection"] = "union"
+    max_points: Optional[int] = 500
+
+# Request/response models for successive-halving parameter search
+class ParameterSearchRequest(BaseModel):
+    strategy: str
+    param_grid: Dict[str, List[Any]]
+    metric: Literal["sharpe", "sortino", "total_return", "cagr"] = "sharpe"
+    min_days: int = 63
+    keep: float = 0.5
+    max_candidate_days: Optional[int] = None
+    max_workers: Optional[int] = None
+
+class SearchRung(BaseModel):
+    end_date: date
+    trading_days: int
+    candidates: int
+    best_score: Optional[float] = None
+
+class SearchCandidate(BaseModel):
+    params: Dict[str, Any]
+    trading_days: int
+    end_date: date
+    score: Optional[float] = None
+
+class ParameterSearchResponse(BaseModel):
+    strategy_type: str
+    metric: str
+    candidates: int
+    best_params: Dict[str, Any]
+    best_score: Optional[float] = None
+    best_summary: Dict[str, Any]
+    candidate_days: int
+    exhaustive_candidate_days: int
+    budget_exhausted: bool
+    rungs: List[SearchRung]
+    results: List[SearchCandidate]
+
+# Request/response models for paper trading
+class PaperBar(BaseModel):
+    stock: str
+    date: date
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float = 0
+
+class PaperBarUpdate(BaseModel):
+    stock: str
+    date: date
+    trades: List[TradeData]
+    returns: float
+    cash: float
+    positions: Dict[str, float]
+
+class PaperStatus(BaseModel):
+    bars: int
+    last_date: Optional[date] = None
+    trades: int
+    returns: Optional[float] = None
+    cash: float
+    positions: Dict[str, float]
+
 class ExampleRequest(BaseModel):
     value: int
 
@@ -190,6 +643,28 @@ def _get_backtester_strategies(env: Environment):
                 name=strategy.get('name', 'RSI'),
                 type='RSIStrategy'
             )
+        elif strategy['type'] == 'RankingStrategy':
+            instance = BackTesterRankingStrategy(
+                metric=strategy['metric'],
+                lookback=strategy['lookback'],
+                top_n=strategy['top_n'],
+                rebalance_days=strategy['rebalance_days'],
+                position_type=strategy['position_type'],
+                select=strategy.get('select'),
+                stop_loss_pct=strategy.get('stop_loss_pct'),
+                take_profit_pct=strategy.get('take_profit_pct'),
+                name=strategy.get('name', 'Ranking'),
+                type='RankingStrategy'
+            )
+        elif strategy['type'] == 'ExpressionStrategy':
+            instance = BackTesterExpressionStrategy(
+                expression=strategy['expression'],
+                position_type=strategy['position_type'],
+                stop_loss_pct=strategy.get('stop_loss_pct'),
+                take_profit_pct=strategy.get('take_profit_pct'),
+                name=strategy.get('name', 'Expression'),
+                type='ExpressionStrategy'
+            )
         elif strategy['type'] == 'VolumeMAStrategy':
             instance = BackTesterVolumeMAStrategy(
                 days=strategy['days']
@@ -215,29 +690,27 @@ def _get_backtester_environment(env: Environment):
         end_date=end_date,
         strategies=strategies,
         cash=1000,  # TODO: Make this dynamic
+        missing_data=env.get('missing_data', 'abort'),
     )
 
-def _backtest(env: Environment, mongo_db):
-    backtester_env = _get_backtester_environment(env)
-    tester = BackTester(data_df=data_df, env=backtester_env)
-    tester.backtest()
-
-    # Get results from backtester
-    trades = tester.get_trades()  # List[Trade]
-    holdings_by_date = tester.get_holdings()  # Dict[date, Holdings]
+def _trade_data(trade) -> dict:
+    return {
+        "date": trade.date.isoformat(),
+        "stock": trade.ticker,
+        "cash": abs(trade.amount),  # Use absolute value since we indicate direction in type
+        "type": "Long" if trade.amount > 0 else "Short"
+    }
 
+def _backtest_documents(trades, holdings_by_date, positions, portfolio_events, initial_cash):
+    """
+    Convert BackTester trades and holdings into the returns/portfolio/trades API
+    format, plus a small performance summary document. The portfolio is stored
+    as change events; /{env_name}/portfolio rebuilds daily snapshots from them.
+    """
     # Convert trades to our API format
-    trades_data = []
-    for trade in trades:
-        trades_data.append({
-            "date": trade.date.isoformat(),
-            "stock": trade.ticker,
-            "cash": abs(trade.amount),  # Use absolute value since we indicate direction in type
-            "type": "Long" if trade.amount > 0 else "Short"
-        })
+    trades_data = [_trade_data(trade) for trade in trades]
 
     # Convert holdings to our API format
-    portfolio_data = []
     returns_data = []
     
     # Sort dates to ensure chronological order
@@ -245,40 +718,229 @@ def _backtest(env: Environment, mongo_db):
     for date in dates:
         holding = holdings_by_date[date]
         
-        # Portfolio data
-        portfolio_data.append({
-            "date": date.isoformat(),
-            "positions": holding.portfolio
-        })
-        
         # Returns data
         returns_data.append({
             "date": date.isoformat(),
             "returns": holding.returns
         })
 
-    # Store results in MongoDB
-    env_id = str(env['_id'])
-    
-    # Update or insert returns data
-    mongo_db.returns.update_one(
-        {"environment_id": env_id},
-        {"$set": {"data": returns_data}},
-        upsert=True
+    portfolio_data = {
+        "dates": [date.isoformat() for date in dates],
+        "events": [
+            {"date": event.date.isoformat(), "stock": event.ticker, "amount": event.amount}
+            for event in portfolio_events
+        ]
+    }
+
+    # Positions with their realized (or marked) P&L, in exit order
+    positions_data = [
+        {
+            "stock": position.ticker,
+            "strategy": position.strategy,
+            "amount": position.amount,
+            "entry_date": position.entry_date.isoformat() if position.entry_date else None,
+            "entry_price": position.entry_price,
+            "exit_date": position.exit_date.isoformat(),
+            "exit_price": position.exit_price,
+            "closed": position.closed,
+            "pnl": position.pnl
+        }
+        for position in positions
+    ]
+
+    return {
+        "returns": returns_data,
+        "portfolio": portfolio_data,
+        "trades": trades_data,
+        "positions": positions_data,
+        "summary": compute_summary(holdings_by_date, trades, positions, initial_cash)
+    }
+
+def _content_etag(data) -> str:
+    """Strong ETag derived from the content of a stored result series."""
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha1(payload.encode()).hexdigest() + '"'
+
+# Collections holding one result document per environment, keyed by environment_id
+RESULT_COLLECTIONS = ("returns", "portfolio", "trades", "positions", "metrics", "summary", "usage")
+# Stored one document per item in <collection>_rows; the result document only keeps etag, count
+# and rows_id, the rows of the current result, so a new result replaces the old one in one write
+ROW_COLLECTIONS = ("trades",)
+
+def _store_results(mongo_db, results_by_env_id):
+    """Upsert result documents for many environments with one bulk write per collection."""
+    for collection in RESULT_COLLECTIONS:
+        operations = []
+        stored_rows = []
+        for env_id, documents in results_by_env_id.items():
+            if collection not in documents:
+                continue
+            data = documents[collection]
+            if collection in ROW_COLLECTIONS:
+                rows_id = _store_rows(mongo_db, collection, env_id, data)
+                stored_rows.append((env_id, rows_id))
+                update = {
+                    "$set": {"count": len(data), "etag": _content_etag(data), "rows_id": rows_id},
+                    "$unset": {"data": ""}
+                }
+            else:
+                update = {"$set": {"data": data, "etag": _content_etag(data)}}
+            operations.append(UpdateOne({"environment_id": env_id}, update, upsert=True))
+        if operations:
+            mongo_db[collection].bulk_write(operations, ordered=False)
+        # Only once the result documents point at the new rows; if anything above
+        # failed, the previous rows are still current and the next run drops these
+        for env_id, rows_id in stored_rows:
+            mongo_db[collection + "_rows"].delete_many({"environment_id": env_id, "rows_id": {"$ne": rows_id}})
+
+    # Denormalized onto the environments, so GET /environments never reads the result collections
+    now = datetime.utcnow()
+    listing = [
+        UpdateOne({"_id": ObjectId(env_id)}, {"$set": {
+            "last_run_at": now,
+            "last_return": documents["returns"][-1]["returns"] if documents["returns"] else None,
+        }})
+        for env_id, documents in results_by_env_id.items()
+        if "returns" in documents
+    ]
+    if listing:
+        mongo_db.environments.bulk_write(listing, ordered=False)
+
+def _store_rows(mongo_db, collection: str, env_id: str, items: list) -> str:
+    """Insert an environment's rows under a new rows_id and return it; seq keeps the order the backtest produced them in."""
+    rows_id = str(ObjectId())
+    if items:
+        mongo_db[collection + "_rows"].insert_many(
+            [dict(item, environment_id=env_id, rows_id=rows_id, seq=seq) for seq, item in enumerate(items)],
+            ordered=False
+        )
+    return rows_id
+
+def _delete_results(mongo_db, env_id: str):
+    for collection in RESULT_COLLECTIONS:
+        mongo_db[collection].delete_one({"environment_id": env_id})
+    for collection in ROW_COLLECTIONS:
+        mongo_db[collection + "_rows"].delete_many({"environment_id": env_id})
+    mongo_db.environments.update_one({"_id": ObjectId(env_id)}, {"$set": {"last_run_at": None, "last_return": None}})
+
+def _ensure_indexes(mongo_db):
+    # Trades are read per environment, optionally one ticker, in (date, seq) order
+    mongo_db.trades_rows.create_index([("environment_id", 1), ("rows_id", 1), ("stock", 1), ("date", 1), ("seq", 1)])
+    mongo_db.trades_rows.create_index([("environment_id", 1), ("rows_id", 1), ("date", 1), ("seq", 1)])
+    # A paper trading bar is applied once: processes racing to append the same seq conflict
+    mongo_db.paper_bars.create_index([("session_id", 1), ("seq", 1)], unique=True)
+    # GET /environments pages through a user's environments in any of ENVIRONMENT_SORTS
+    for field in ENVIRONMENT_SORTS:
+        mongo_db.environments.create_index([("user_id", 1), (field, 1), ("_id", 1)])
+
+# Last stage of the pipeline updates that change an environment's strategies, so
+# strategy_count follows the array even on documents the backfill has not reached
+_COUNT_STRATEGIES = {"$set": {"strategy_count": {"$size": "$strategies"}}}
+
+def _backfill_listing_fields(mongo_db):
+    """Add the listing fields to environments created before they were maintained."""
+    for env in mongo_db.environments.find({"strategy_count": {"$exists": False}}, {"strategies": 1}):
+        env_id = str(env["_id"])
+        returns = mongo_db.returns.find_one({"environment_id": env_id}, {"data": {"$slice": -1}})
+        run = backtest_queue.latest(env_id)
+        mongo_db.environments.update_one({"_id": env["_id"]}, {"$set": {
+            "strategy_count": len(env.get("strategies", [])),
+            "run_status": run["status"] if run else None,
+            "last_run_at": run["finished_at"] if run else None,
+            "last_return": returns["data"][-1]["returns"] if returns and returns.get("data") else None,
+        }})
+
+def _estimate(backtester_env: BackTesterEnvironment) -> CostEstimateResponse:
+    _wait_for_data()
+    if BACKTEST_SECONDS_PER_UNIT is not None:
+        estimate = estimate_cost(backtester_env, trading_calendar, BACKTEST_SECONDS_PER_UNIT)
+    else:
+        estimate = estimate_cost(backtester_env, trading_calendar)
+    return CostEstimateResponse(
+        **estimate.to_dict(),
+        admission=admission_policy.decide(estimate).value
     )
-    
-    # Update or insert portfolio data
-    mongo_db.portfolio.update_one(
-        {"environment_id": env_id},
-        {"$set": {"data": portfolio_data}},
-        upsert=True
+
+def _backtest(env: Environment, mongo_db, control: Optional[RunControl] = None) -> dict:
+    """Run and store a backtest of a stored environment; returns the resources the backtest used."""
+    try:
+        _wait_for_data(timeout=300)
+        backtester_env = _get_backtester_environment(env)
+        tester = BackTester(
+            data_df=data_df,
+            env=backtester_env,
+            market_data=_market_data(backtester_env.tickers),
+            control=control,
+            instrument=BACKTEST_INSTRUMENT
+        )
+        tester.backtest()
+
+        # Store results in MongoDB
+        documents = _backtest_documents(
+            tester.get_trades(), tester.get_holdings(), tester.get_positions(),
+            tester.get_portfolio_events(), backtester_env.cash
+        )
+        run_metrics = tester.get_metrics()
+        if run_metrics is not None:
+            documents["metrics"] = run_metrics
+        documents["usage"] = tester.get_usage()
+        _store_results(mongo_db, {str(env['_id']): documents})
+    except BacktestAborted as e:
+        print(f"[BACKTEST] Aborted {env['name']}: {e.reason}")
+        metrics_registry.observe_run("cancelled" if control is not None and control.cancelled else "aborted")
+        raise
+    except Exception:
+        metrics_registry.observe_run("failed")
+        raise
+
+    metrics_registry.observe_run("done", run_metrics)
+    return documents["usage"]
+
+def _quota_exceeded(e: QuotaExceeded) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Compute quota exceeded: {e.reason}",
+        headers={"Retry-After": str(e.retry_after)}
     )
-    
-    # Update or insert trades data
-    mongo_db.trades.update_one(
-        {"environment_id": env_id},
-        {"$set": {"data": trades_data}},
-        upsert=True
+
+def _submit_run(
+    env: dict, estimate: CostEstimateResponse, kind: str = "backtest", request: Optional[BaseModel] = None
+) -> BacktestRunResponse:
+    """Queue a run of env at the priority its estimate was admitted with and wake this process's workers."""
+    priority = RunQueue.LOW if estimate.admission == Admission.LOW_PRIORITY.value else RunQueue.NORMAL
+    try:
+        run, created = backtest_queue.submit(
+            env, priority, user_quota, kind=kind, params=request.dict() if request is not None else None
+        )
+    except QuotaExceeded as e:
+        raise _quota_exceeded(e)
+    except QueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many runs queued, try again later",
+            headers={"Retry-After": "30"}
+        )
+    if created:
+        for worker in backtest_workers:
+            worker.wake()
+    return BacktestRunResponse(**run_to_dict(run), attached=not created, estimate=estimate)
+
+def _find_strategy(env: dict, name: str) -> Optional[dict]:
+    return next((s for s in env.get('strategies', []) if s.get('name') == name), None)
+
+def _children_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def make_worker(worker_id: str, poll_seconds: float = 1.0) -> Worker:
+    """A worker that runs queued runs with this process's market data and budgets."""
+    return Worker(
+        backtest_queue,
+        _run,
+        worker_id=worker_id,
+        poll_seconds=poll_seconds,
+        max_seconds=BACKTEST_MAX_SECONDS,
+        max_memory_mb=BACKTEST_MAX_MEMORY_MB,
     )
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
@@ -323,15 +985,126 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     
     return Token(access_token=access_token, token_type="bearer")
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
+
+def _conditional_result_response(request: Request, collection, env_id: str) -> Response:
+    """
+    Serve a stored result series with an ETag, answering 304 Not Modified
+    without loading the series when the client already has the current version.
+    """
+    headers = {"Cache-Control": "no-cache"}
+    stored = collection.find_one({"environment_id": env_id}, {"etag": 1})
+    if stored and stored.get("etag"):
+        headers["ETag"] = stored["etag"]
+        if _etag_matches(request, stored["etag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    result = collection.find_one({"environment_id": env_id}, {"data": 1})
+    if not result:
+        return JSONResponse(content=None, headers=headers)
+
+    data = result.get("data", [])
+    if "ETag" not in headers:
+        # Results stored before ETags were recorded
+        headers["ETag"] = _content_etag(data)
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(content=data, headers=headers)
+
 # Helper function to convert MongoDB ObjectId to string
 def convert_objectid(item):
     if isinstance(item, dict) and '_id' in item:
         item['_id'] = str(item['_id'])
     return item
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once market data and indicator caches are warm, 503 before."""
+    body = warmup.status()
+    return JSONResponse(
+        content=body,
+        status_code=status.HTTP_200_OK if warmup.ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: HTTP latency per route and aggregates over instrumented backtests."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/usage", response_model=UserUsageResponse)
+async def get_usage(current_user: User = Depends(get_current_user)):
+    """Compute used by the authenticated user over the last 24 hours, and their quota."""
+    return UserUsageResponse(
+        **backtest_queue.user_usage(current_user.username),
+        cpu_seconds_per_day=user_quota.cpu_seconds_per_day,
+        max_concurrent_runs=user_quota.max_concurrent_runs,
+    )
+
+@app.get("/environments", response_model=List[EnvironmentListItem])
+async def list_environments(
+    response: Response,
+    sort: Literal["name", "last_run_at", "last_return", "strategy_count"] = "name",
+    order: Literal["asc", "desc"] = "asc",
+    limit: int = Query(50, ge=1, le=MAX_ENVIRONMENTS_PAGE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    One page of the authenticated user's environments for a list view: no
+    strategy bodies, only the strategy count and the last run's status,
+    time and return. The X-Next-Cursor header, when present, is the cursor
+    of the next page with the same sort and order.
+    """
+    direction = 1 if order == "asc" else -1
+    query = {"user_id": current_user.username}
+    if cursor:
+        query.update(_environment_after(sort, direction, *_decode_environment_cursor(cursor, sort)))
+    envs = list(
+        db.environments.find(query, {field: 1 for field in EnvironmentListItem.model_fields})
+        .sort([(sort, direction), ("_id", direction)])
+        .limit(limit + 1)
+    )
+    if len(envs) > limit:
+        envs = envs[:limit]
+        response.headers["X-Next-Cursor"] = _encode_environment_cursor(envs[-1], sort)
+    return [EnvironmentListItem(**env) for env in envs]
+
+def _encode_environment_cursor(env: dict, sort: str) -> str:
+    value = env.get(sort)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, str(env["_id"])]).encode()).decode()
+
+def _decode_environment_cursor(cursor: str, sort: str):
+    try:
+        value, env_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if value is not None and sort == "last_run_at":
+            value = datetime.fromisoformat(value)
+        return value, ObjectId(env_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid cursor")
+
+def _environment_after(sort: str, direction: int, value, env_id: ObjectId) -> dict:
+    """Query for the environments after (value, env_id) in sort order; nulls sort before any value."""
+    after = "$gt" if direction == 1 else "$lt"
+    if value is None:
+        same = {sort: None, "_id": {after: env_id}}
+        return {"$or": [same, {sort: {"$ne": None}}]} if direction == 1 else same
+    conditions = [{sort: {after: value}}, {sort: value, "_id": {after: env_id}}]
+    if direction == -1:
+        conditions.append({sort: None})
+    return {"$or": conditions}
+
 @app.get("/envs", response_model=List[Environment])
 async def get_environments(current_user: User = Depends(get_current_user)):
-    """Get all environments for the authenticated user."""
+    """Get all environments for the authenticated user, strategies included; GET /environments pages through them."""
     user_id = current_user.username
     print(f"[GET ENVS] Fetching environments for user: {user_id}")
     envs = list(db.environments.find({"user_id": user_id}))
@@ -359,6 +1132,10 @@ async def get_environments(current_user: User = Depends(get_current_user)):
                     'position_type': strategy.get('position_type', 'long')
                 }
                 strategies.append(RSIStrategy(**strategy_data))
+            elif strategy_type == 'RankingStrategy':
+                strategies.append(RankingStrategy(**strategy))
+            elif strategy_type == 'ExpressionStrategy':
+                strategies.append(ExpressionStrategy(**strategy))
         
         # Convert dates from strings to date objects
         env['start_date'] = datetime.strptime(env['start_date'], "%Y-%m-%d").date()
@@ -394,68 +1171,859 @@ async def get_environment(
 @app.get("/{env_name}/returns", response_model=Optional[List[ReturnsData]])
 async def get_environment_returns(
     env_name: str,
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
-    """Get returns data for the specified environment."""
+    """Get returns data for the specified environment (supports If-None-Match)."""
     user_id = current_user.username
     env = db.environments.find_one({"user_id": user_id, "name": env_name})
     if not env:
         raise HTTPException(status_code=404, detail="Environment not found")
     
-    returns = db.returns.find_one({"environment_id": str(env['_id'])})
-    if not returns:
-        return None
-    
-    return returns.get('data', [])
+    return _conditional_result_response(request, db.returns, str(env['_id']))
 
-@app.get("/{env_name}/portfolio", response_model=Optional[List[PortfolioData]])
+@app.get("/{env_name}/portfolio", response_model=Optional[Union[List[PortfolioData], PortfolioEventsData]])
 async def get_environment_portfolio(
     env_name: str,
+    request: Request,
+    format: Literal["dense", "events"] = "dense",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Get portfolio data for the specified environment."""
+    """
+    Get portfolio data for the specified environment (supports If-None-Match).
+
+    format=dense returns a snapshot per trading day; format=events returns the
+    positions held before start and the changes from start to end, which is
+    much smaller for strategies that trade rarely.
+    """
     user_id = current_user.username
     env = db.environments.find_one({"user_id": user_id, "name": env_name})
     if not env:
         raise HTTPException(status_code=404, detail="Environment not found")
-    
-    portfolio = db.portfolio.find_one({"environment_id": str(env['_id'])})
-    if not portfolio:
-        return None
-    
-    return portfolio.get('data', [])
+
+    headers = {"Cache-Control": "no-cache"}
+    stored = db.portfolio.find_one({"environment_id": str(env['_id'])}, {"etag": 1})
+    if stored and stored.get("etag"):
+        # The same stored history gives a different body per format and range
+        variant = f"{stored['etag']}:{format}:{start}:{end}"
+        headers["ETag"] = '"' + hashlib.sha1(variant.encode()).hexdigest() + '"'
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    result = db.portfolio.find_one({"environment_id": str(env['_id'])}, {"data": 1})
+    if not result:
+        return JSONResponse(content=None, headers=headers)
+
+    data = result.get("data", [])
+    if isinstance(data, list):
+        # Results stored as daily snapshots before events were recorded
+        dates = [snapshot["date"] for snapshot in data]
+        events = [
+            {"date": change.date, "stock": change.ticker, "amount": change.amount}
+            for change in portfolio_history.encode((s["date"], s["positions"]) for s in data)
+        ]
+    else:
+        dates, events = data["dates"], data["events"]
+
+    start = start.isoformat() if start else None
+    end = end.isoformat() if end else None
+    if format == "dense":
+        content = portfolio_history.dense(dates, events, start, end)
+    else:
+        days, initial, changes = portfolio_history.replay(dates, events, start, end)
+        content = {"dates": days, "initial": initial, "events": changes}
+    if "ETag" not in headers:
+        headers["ETag"] = _content_etag(content)
+    return JSONResponse(content=content, headers=headers)
+
+def _encode_cursor(row: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps([row["date"], row["seq"]]).encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        day, seq = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(day), int(seq)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid cursor")
+
+def _trade_rows_env(env_name: str, current_user: User) -> str:
+    """Environment id of env_name, moving trades stored as one array into rows on first access."""
+    env = db.environments.find_one({"user_id": current_user.username, "name": env_name})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+    env_id = str(env['_id'])
+    legacy = db.trades.find_one({"environment_id": env_id, "data": {"$exists": True}}, {"data": 1})
+    if legacy:
+        _store_results(db, {env_id: {"trades": legacy["data"]}})
+    return env_id
+
+def _trade_filter(stored: dict, ticker, start, end, side) -> dict:
+    # Rows stored before rows_id was recorded have none
+    query = {"environment_id": stored["environment_id"], "rows_id": stored.get("rows_id")}
+    if ticker:
+        query["stock"] = ticker
+    if start or end:
+        query["date"] = {}
+        if start:
+            query["date"]["$gte"] = start.isoformat()
+        if end:
+            query["date"]["$lte"] = end.isoformat()
+    if side:
+        query["type"] = side.value
+    return query
 
 @app.get("/{env_name}/trades", response_model=Optional[List[TradeData]])
 async def get_environment_trades(
     env_name: str,
+    request: Request,
+    ticker: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    side: Optional[TradeType] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_TRADES_PAGE),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Get trades data for the specified environment."""
+    """
+    Get trades data for the specified environment (supports If-None-Match).
+
+    Trades can be filtered by ticker, date range and side. With limit set,
+    at most limit trades are returned and the X-Next-Cursor header, when
+    present, is the cursor of the next page.
+    """
+    env_id = _trade_rows_env(env_name, current_user)
+
+    headers = {"Cache-Control": "no-cache"}
+    stored = db.trades.find_one({"environment_id": env_id}, {"environment_id": 1, "etag": 1, "rows_id": 1})
+    if not stored:
+        return JSONResponse(content=None, headers=headers)
+    etag = stored["etag"]
+    query_string = str(request.query_params)
+    if query_string:
+        # Each filter and page is a different body of the same stored trades
+        etag = '"' + hashlib.sha1(f"{etag}:{query_string}".encode()).hexdigest() + '"'
+    headers["ETag"] = etag
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    query = _trade_filter(stored, ticker, start, end, side)
+    if cursor:
+        day, seq = _decode_cursor(cursor)
+        query["$or"] = [{"date": {"$gt": day}}, {"date": day, "seq": {"$gt": seq}}]
+    rows = db.trades_rows.find(
+        query, {"_id": 0, "date": 1, "stock": 1, "cash": 1, "type": 1, "seq": 1}
+    ).sort([("date", 1), ("seq", 1)])
+    if limit is not None:
+        rows = rows.limit(limit + 1)
+    rows = list(rows)
+
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1])
+    for row in rows:
+        del row["seq"]
+    return JSONResponse(content=rows, headers=headers)
+
+@app.get("/{env_name}/trades/summary", response_model=List[TradeAggregate])
+async def get_environment_trades_summary(
+    env_name: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    side: Optional[TradeType] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Per-ticker trade counts and notional for the specified environment, computed in MongoDB."""
+    env_id = _trade_rows_env(env_name, current_user)
+    stored = db.trades.find_one({"environment_id": env_id}, {"environment_id": 1, "rows_id": 1})
+    if not stored:
+        return []
+    pipeline = [
+        {"$match": _trade_filter(stored, None, start, end, side)},
+        {"$group": {
+            "_id": "$stock",
+            "trades": {"$sum": 1},
+            "long": {"$sum": {"$cond": [{"$eq": ["$type", TradeType.LONG.value]}, 1, 0]}},
+            "short": {"$sum": {"$cond": [{"$eq": ["$type", TradeType.SHORT.value]}, 1, 0]}},
+            "notional": {"$sum": "$cash"},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    return [
+        TradeAggregate(stock=row["_id"], trades=row["trades"], long=row["long"], short=row["short"], notional=row["notional"])
+        for row in db.trades_rows.aggregate(pipeline)
+    ]
+
+@app.get("/{env_name}/backtest/estimate", response_model=CostEstimateResponse)
+async def estimate_backtest(
+    env_name: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Predict the cost of backtesting this environment and whether it would be admitted."""
     user_id = current_user.username
     env = db.environments.find_one({"user_id": user_id, "name": env_name})
     if not env:
         raise HTTPException(status_code=404, detail="Environment not found")
-    
-    trades = db.trades.find_one({"environment_id": str(env['_id'])})
-    if not trades:
-        return None
-    
-    return trades.get('data', [])
 
-@app.post("/{env_name}/backtest", status_code=status.HTTP_200_OK, response_class=Response)
+    return _estimate(_get_backtester_environment(env))
+
+@app.get("/{env_name}/coverage", response_model=CoverageResponse)
+async def get_coverage(
+    env_name: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Missing bars of the environment's stocks between its start and end date."""
+    user_id = current_user.username
+    env = db.environments.find_one({"user_id": user_id, "name": env_name})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    _wait_for_data()
+    backtester_env = _get_backtester_environment(env)
+    market_data = _market_data(backtester_env.tickers)
+    dates = market_data.trading_dates
+    first_row = int(np.searchsorted(dates, backtester_env.start_date))
+    last_row = int(np.searchsorted(dates, backtester_env.end_date, side="right")) - 1
+    available = coverage(market_data, backtester_env.tickers)
+    gaps = find_gaps(market_data, backtester_env.tickers, available, first_row, last_row)
+    return CoverageResponse(
+        trading_days=max(last_row - first_row + 1, 0),
+        complete=not gaps,
+        gaps=[
+            CoverageGap(stock=ticker, missing_days=len(days), first=days[0], last=days[-1])
+            for ticker, days in gaps.items()
+        ]
+    )
+
+@app.post("/{env_name}/backtest", status_code=status.HTTP_200_OK, response_model=BacktestRunResponse)
 async def run_backtest(
-    background_tasks: BackgroundTasks,
     env_name: str,
     current_user: User = Depends(get_current_user)
 ):
-    """Trigger a backtest for the specified environment and store results."""
+    """
+    Queue a backtest of the specified environment; a worker runs it and stores the results.
+
+    The run's estimated cost decides whether it is queued normally, queued
+    behind cheaper runs, or rejected. Submitting while an identical run is
+    queued or running attaches to that run instead of starting another one.
+    A new run is refused with 429 if the user is over their compute quota.
+    """
     user_id = current_user.username
     env = db.environments.find_one({"user_id": user_id, "name": env_name})
     if not env:
         raise HTTPException(status_code=404, detail="Environment not found")
     
-    background_tasks.add_task(_backtest, env, db)
-    
+    estimate = _estimate(_get_backtester_environment(env))
+    if estimate.admission == Admission.REJECT.value:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": "Backtest is too expensive to run", "estimate": estimate.dict()}
+        )
+
+    return _submit_run(env, estimate)
+
+@app.get("/{env_name}/backtest/status", response_model=Optional[BacktestRunResponse])
+async def get_backtest_status(
+    env_name: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the status of the most recent backtest run of this environment."""
+    user_id = current_user.username
+    env = db.environments.find_one({"user_id": user_id, "name": env_name})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    run = backtest_queue.latest(str(env['_id']))
+    if run is None:
+        return None
+    return BacktestRunResponse(**run_to_dict(run))
+
+@app.get("/runs/{run_id}", response_model=RunResultResponse)
+async def get_run(
+    run_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get a queued run of any kind, with the result of a finished walk-forward or parameter search."""
+    run = backtest_queue.get(run_id)
+    if run is None or run.get("user_id") != current_user.username:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return RunResultResponse(**run_to_dict(run), kind=run.get("kind") or "backtest", result=run.get("result"))
+
+@app.get("/{env_name}/summary")
+async def get_environment_summary(
+    env_name: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get the performance summary of the last run: CAGR, volatility, Sharpe/Sortino,
+    drawdown, turnover, exposure, win rate and per-strategy attribution.
+    """
+    user_id = current_user.username
+    env = db.environments.find_one({"user_id": user_id, "name": env_name})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    return _conditional_result_response(request, db.summary, str(env['_id']))
+
+@app.get("/{env_name}/robustness")
+def get_environment_robustness(
+    env_name: str,
+    method: Literal["block_bootstrap", "trade_reshuffle"] = "block_bootstrap",
+    paths: int = Query(10000, ge=1, le=100000),
+    block_size: int = Query(20, ge=1),
+    with_replacement: bool = False,
+    seed: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Resample the last run to see how fragile its returns are: block-bootstrap
+    the daily returns, or reshuffle its closed trades (with_replacement=true
+    also resamples them, which spreads the terminal return). Returns confidence
+    bands for equity and drawdown plus the distribution of max drawdown and
+    terminal return.
+    """
+    user_id = current_user.username
+    env = db.environments.find_one({"user_id": user_id, "name": env_name})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+    env_id = str(env['_id'])
+    rng = np.random.default_rng(seed)
+
+    if method == "block_bootstrap":
+        stored = db.returns.find_one({"environment_id": env_id}, {"data": 1})
+        series = stored.get("data", []) if stored else []
+        if len(series) < 2:
+            raise HTTPException(status_code=404, detail="No backtest returns to resample")
+        resampled = block_bootstrap(daily_returns([point["returns"] for point in series]), paths, block_size, rng)
+        result = summarize_paths(resampled)
+        result["dates"] = [series[i]["date"] for i in result["index"]]
+    else:
+        stored = db.positions.find_one({"environment_id": env_id}, {"data": 1})
+        closed = [p for p in (stored.get("data", []) if stored else []) if p["closed"]]
+        if len(closed) < 2:
+            raise HTTPException(status_code=404, detail="No closed trades to reshuffle; rerun the backtest")
+        closed.sort(key=lambda p: p["exit_date"])
+        initial_cash = _get_backtester_environment(env).cash
+        resampled = trade_reshuffle(np.array([p["pnl"] for p in closed]), initial_cash, paths, with_replacement, rng)
+        result = summarize_paths(resampled)
+        result["dates"] = None
+
+    result["method"] = method
+    return result
+
+@app.get("/{env_name}/backtest/metrics")
+async def get_backtest_metrics(
+    env_name: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the phase timers and counters stored with the last instrumented run (BACKTEST_INSTRUMENT=1)."""
+    user_id = current_user.username
+    env = db.environments.find_one({"user_id": user_id, "name": env_name})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    return _conditional_result_response(request, db.metrics, str(env['_id']))
+
+@app.get("/{env_name}/backtest/usage")
+async def get_backtest_usage(
+    env_name: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the wall and CPU time, peak memory, trading days, strategy calls and positions opened of the last run."""
+    user_id = current_user.username
+    env = db.environments.find_one({"user_id": user_id, "name": env_name})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    return _conditional_result_response(request, db.usage, str(env['_id']))
+
+@app.post("/{env_name}/backtest/cancel", response_model=List[BacktestRunResponse])
+async def cancel_backtest(
+    env_name: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Cancel queued or running backtests of this environment; they stop before the next trading day."""
+    user_id = current_user.username
+    env = db.environments.find_one({"user_id": user_id, "name": env_name})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    cancelled = backtest_queue.cancel(str(env['_id']))
+    return [BacktestRunResponse(**run_to_dict(run)) for run in cancelled]
+
+@app.post("/backtest/batch", response_model=List[BatchBacktestStatus])
+def run_batch_backtest(
+    request: BatchBacktestRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Queue backtests of several environments (or "all" of them).
+
+    Each environment is admitted and submitted like POST /{env_name}/backtest,
+    so it attaches to an identical active run and cancels a stale one rather
+    than racing it to write the results. Workers run the members in parallel
+    on their shared copy of the market data.
+    """
+    user_id = current_user.username
+    if request.environments == "all":
+        envs = list(db.environments.find({"user_id": user_id}))
+        missing = []
+    else:
+        envs = list(db.environments.find({"user_id": user_id, "name": {"$in": request.environments}}))
+        found = {env["name"] for env in envs}
+        missing = [name for name in request.environments if name not in found]
+    print(f"[BATCH BACKTEST] {len(envs)} environments for user: {user_id}")
+
+    statuses = [BatchBacktestStatus(name=name, status="not_found") for name in missing]
+    if not envs:
+        return statuses
+    try:
+        backtest_queue.check_quota(user_id, user_quota)
+    except QuotaExceeded as e:
+        raise _quota_exceeded(e)
+
+    queued = False
+    for env in envs:
+        estimate = _estimate(_get_backtester_environment(env))
+        if estimate.admission == Admission.REJECT.value:
+            statuses.append(BatchBacktestStatus(
+                name=env["name"],
+                status="rejected",
+                detail=f"estimated cost of {estimate.units:.0f} units is over the limit"
+            ))
+            continue
+        priority = RunQueue.LOW if estimate.admission == Admission.LOW_PRIORITY.value else RunQueue.NORMAL
+        try:
+            run, created = backtest_queue.submit(env, priority, user_quota)
+        except QuotaExceeded as e:
+            statuses.append(BatchBacktestStatus(name=env["name"], status="rejected", detail=e.reason))
+            continue
+        except QueueFull as e:
+            statuses.append(BatchBacktestStatus(name=env["name"], status="rejected", detail=str(e)))
+            continue
+        queued = queued or created
+        statuses.append(BatchBacktestStatus(
+            name=env["name"], status="queued", run_id=run["_id"], attached=not created
+        ))
+
+    if queued:
+        for worker in backtest_workers:
+            worker.wake()
+    return statuses
+
+@app.post("/compare")
+def compare_environments(
+    request: CompareRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Compare the last runs of several environments on one calendar: equity
+    curves, drawdowns, drawdowns relative to the baseline environment (the
+    first by default), the correlation matrix of daily returns and per-run
+    totals. calendar="intersection" keeps only dates every run has; curves
+    are downsampled to at most max_points dates.
+    """
+    names = list(dict.fromkeys(request.environments))
+    if not names or len(names) > MAX_COMPARED_ENVIRONMENTS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Compare between 1 and {MAX_COMPARED_ENVIRONMENTS} environments"
+        )
+    if request.baseline is not None and request.baseline not in names:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="baseline is not one of the environments")
+    if request.max_points is not None and request.max_points < 2:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="max_points must be at least 2")
+
+    envs = {
+        env["name"]: str(env["_id"])
+        for env in db.environments.find({"user_id": current_user.username, "name": {"$in": names}}, {"name": 1})
+    }
+    missing = [name for name in names if name not in envs]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Environments not found: {', '.join(missing)}")
+
+    # All series in one query
+    stored = {
+        doc["environment_id"]: doc.get("data") or []
+        for doc in db.returns.find({"environment_id": {"$in": list(envs.values())}}, {"environment_id": 1, "data": 1})
+    }
+    # Environments that have not been backtested are listed instead of failing the comparison
+    no_results = [name for name in names if not stored.get(envs[name])]
+    names = [name for name in names if name not in no_results]
+    if not names or request.baseline in no_results:
+        raise HTTPException(status_code=404, detail=f"No backtest results for: {', '.join(no_results)}")
+
+    series = [stored[envs[name]] for name in names]
+    result = compare(
+        names,
+        [np.array([point["date"] for point in points], dtype="datetime64[D]") for points in series],
+        [np.fromiter((point["returns"] for point in points), dtype=float, count=len(points)) for points in series],
+        baseline=request.baseline,
+        calendar=request.calendar,
+        max_points=request.max_points,
+    )
+    result["no_results"] = no_results
+    # Already plain lists; skip the response encoder's walk over every point
+    return JSONResponse(content=result)
+
+@app.post("/{env_name}/walk-forward", response_model=BacktestRunResponse)
+def run_walk_forward(
+    env_name: str,
+    request: WalkForwardRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Queue a walk-forward optimization of one of the environment's strategies:
+    for each rolling window, pick the param_grid combination that scores best
+    on the train days and report how it does on the following test days.
+    GET /runs/{run_id} returns the result once a worker has run it.
+    """
+    user_id = current_user.username
+    env = db.environments.find_one({"user_id": user_id, "name": env_name})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    strategy = _find_strategy(env, request.strategy)
+    if strategy is None:
+        raise HTTPException(status_code=404, detail="Strategy not found")
+
+    try:
+        base_params = strategy_params(strategy['type'], strategy)
+        candidates = [{**base_params, **params} for params in expand_grid(request.param_grid)]
+        candidate_strategies = [make_strategy(strategy['type'], params) for params in candidates]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    # Every window backtests each candidate over its train days once and the
+    # winner over its test days, so scale a single run's estimate accordingly
+    backtester_env = _get_backtester_environment(env)
+    backtester_env = replace(backtester_env, strategies=candidate_strategies[:1])
+    estimate = _estimate(backtester_env)
+    windows = max(1, (estimate.trading_days - request.train_days) // (request.step_days or request.test_days) + 1)
+    units = estimate.units / max(estimate.trading_days, 1) * windows * (
+        request.train_days * len(candidates) + request.test_days
+    )
+    scaled = estimate.copy(update={
+        "units": units,
+        "estimated_seconds": estimate.estimated_seconds / max(estimate.units, 1) * units,
+    })
+    scaled = scaled.copy(update={"admission": admission_policy.decide(scaled).value})
+    if scaled.admission == Admission.REJECT.value:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": "Walk-forward is too expensive to run", "estimate": scaled.dict()}
+        )
+
+    print(f"[WALK FORWARD] {env_name}: {len(candidates)} candidates for user: {user_id}")
+    return _submit_run(env, scaled, "walk_forward", request)
+
+@app.post("/{env_name}/search", response_model=BacktestRunResponse)
+def run_parameter_search(
+    env_name: str,
+    request: ParameterSearchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Queue a successive-halving search over one of the environment's
+    strategies: every param_grid combination runs on the first min_days
+    trading days, the best keep fraction by metric is extended to longer
+    ranges from where it stopped, until the survivors reach the environment's
+    end date. max_candidate_days caps the trading days simulated over all
+    candidates. GET /runs/{run_id} returns the result once a worker has run it.
+    """
+    user_id = current_user.username
+    env = db.environments.find_one({"user_id": user_id, "name": env_name})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    strategy = _find_strategy(env, request.strategy)
+    if strategy is None:
+        raise HTTPException(status_code=404, detail="Strategy not found")
+
+    try:
+        base_params = strategy_params(strategy['type'], strategy)
+        candidates = [{**base_params, **params} for params in expand_grid(request.param_grid)]
+        candidate_strategies = [make_strategy(strategy['type'], params) for params in candidates]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    # Scale a single run's estimate to the candidate-days the search simulates at most
+    backtester_env = _get_backtester_environment(env)
+    backtester_env = replace(backtester_env, strategies=candidate_strategies[:1])
+    estimate = _estimate(backtester_env)
+    if not 0 < request.keep < 1 or request.min_days < 1:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="keep must be between 0 and 1 and min_days at least 1"
+        )
+    candidate_days = halving_cost(len(candidates), max(estimate.trading_days, 1), request.min_days, request.keep)
+    if request.max_candidate_days is not None:
+        candidate_days = min(candidate_days, request.max_candidate_days)
+    units = estimate.units / max(estimate.trading_days, 1) * candidate_days
+    scaled = estimate.copy(update={
+        "units": units,
+        "estimated_seconds": estimate.estimated_seconds / max(estimate.units, 1) * units,
+    })
+    scaled = scaled.copy(update={"admission": admission_policy.decide(scaled).value})
+    if scaled.admission == Admission.REJECT.value:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": "Parameter search is too expensive to run", "estimate": scaled.dict()}
+        )
+
+    print(f"[SEARCH] {env_name}: {len(candidates)} candidates for user: {user_id}")
+    return _submit_run(env, scaled, "search", request)
+
+def _walk_forward(env: dict, request: WalkForwardRequest) -> dict:
+    """Walk-forward of a stored environment's strategy, as queued by POST /{env_name}/walk-forward."""
+    strategy = _find_strategy(env, request.strategy)
+    if strategy is None:
+        raise ValueError(f"Strategy {request.strategy} not found")
+    backtester_env = _get_backtester_environment(env)
+    return walk_forward(
+        _market_data(backtester_env.tickers),
+        backtester_env.tickers,
+        backtester_env.start_date,
+        backtester_env.end_date,
+        strategy['type'],
+        request.param_grid,
+        base_params=strategy_params(strategy['type'], strategy),
+        train_days=request.train_days,
+        test_days=request.test_days,
+        step_days=request.step_days,
+        metric=request.metric,
+        cash=backtester_env.cash,
+        max_workers=request.max_workers,
+        missing_data=backtester_env.missing_data,
+    )
+
+def _search(env: dict, request: ParameterSearchRequest) -> dict:
+    """Parameter search over a stored environment's strategy, as queued by POST /{env_name}/search."""
+    strategy = _find_strategy(env, request.strategy)
+    if strategy is None:
+        raise ValueError(f"Strategy {request.strategy} not found")
+    backtester_env = _get_backtester_environment(env)
+    return successive_halving(
+        _market_data(backtester_env.tickers),
+        backtester_env.tickers,
+        backtester_env.start_date,
+        backtester_env.end_date,
+        strategy['type'],
+        request.param_grid,
+        base_params=strategy_params(strategy['type'], strategy),
+        metric=request.metric,
+        cash=backtester_env.cash,
+        min_days=request.min_days,
+        keep=request.keep,
+        max_candidate_days=request.max_candidate_days,
+        max_workers=request.max_workers,
+        missing_data=backtester_env.missing_data,
+    )
+
+# Runs that return their result instead of storing it: (request model, function, response model)
+JOBS = {
+    "walk_forward": (WalkForwardRequest, _walk_forward, WalkForwardResponse),
+    "search": (ParameterSearchRequest, _search, ParameterSearchResponse),
+}
+
+def _run(run: dict, control: RunControl) -> tuple:
+    """Execute a claimed run for a worker; returns (usage, result) as Worker expects."""
+    if run.get("kind") not in JOBS:
+        return _backtest(run["env"], db, control), None
+    request_model, execute, response_model = JOBS[run["kind"]]
+    _wait_for_data(timeout=300)
+    children_started = _children_cpu_seconds()
+    result = response_model(**execute(run["env"], request_model(**run["params"])))
+    # Pool processes are joined by now, so their CPU time is in RUSAGE_CHILDREN;
+    # children of other runs finishing meanwhile are charged here too
+    return {"pool_cpu_s": _children_cpu_seconds() - children_started}, jsonable_encoder(result)
+
+def _history_frame(stocks: List[str], before: date) -> pd.DataFrame:
+    """Daily bars of stocks before a date, as rows like the dataset's."""
+    if data_df is not None:
+        df = data_df[data_df["ticker"].isin(stocks)]
+        return df[pd.to_datetime(df["date"]).dt.date < before]
+    dates = shared_market_data.trading_dates
+    rows = int(np.searchsorted(dates, before))
+    frames = []
+    for stock in stocks:
+        frame = pd.DataFrame({field: shared_market_data.get_series(field, stock)[:rows] for field in BAR_FIELDS})
+        frame["date"] = dates[:rows]
+        frame["ticker"] = stock
+        frames.append(frame.dropna(subset=["close"]))
+    return pd.concat(frames) if frames else None
+
+def _paper_status(trader: PaperTrader) -> PaperStatus:
+    last_date = max(trader.holdings) if trader.holdings else None
+    holding = trader.holdings[last_date] if last_date else None
+    return PaperStatus(
+        bars=sum(trader.bars_received.values()),
+        last_date=last_date,
+        trades=len(trader.trades),
+        returns=holding.returns if holding else None,
+        cash=trader.current_cash,
+        positions=holding.portfolio if holding else {}
+    )
+
+def _build_paper_trader(env: dict) -> PaperTrader:
+    backtester_env = _get_backtester_environment(env)
+    return PaperTrader(backtester_env, history=_history_frame(backtester_env.tickers, backtester_env.start_date))
+
+def _paper_session(env_name: str, current_user: User) -> Tuple[str, str]:
+    """Environment id and session id of env_name's paper trading session."""
+    env = db.environments.find_one({"user_id": current_user.username, "name": env_name}, {"_id": 1})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+    env_id = str(env['_id'])
+    stored = db.paper_sessions.find_one({"_id": env_id}, {"session_id": 1})
+    if stored is None:
+        raise HTTPException(status_code=404, detail="No paper trading session; start one first")
+    return env_id, stored["session_id"]
+
+def _paper_trader(env_id: str, session_id: str) -> Tuple[PaperTrader, threading.Lock]:
+    """This process's trader of a session and its lock; take the lock and _paper_catch_up before using it."""
+    session = paper_sessions.get(env_id)
+    if session is None or session[0] != session_id:
+        # Started or last served by another process: rebuild it from the environment it was started with
+        stored = db.paper_sessions.find_one({"_id": env_id, "session_id": session_id}, {"env": 1})
+        if stored is None:
+            raise HTTPException(status_code=404, detail="No paper trading session; start one first")
+        _wait_for_data(timeout=30)
+        session = (session_id, _build_paper_trader(stored["env"]), threading.Lock())
+        with paper_sessions_lock:
+            paper_sessions[env_id] = session
+    return session[1], session[2]
+
+def _paper_catch_up(session_id: str, trader: PaperTrader):
+    """Apply the bars other processes have applied to the session since trader last saw it."""
+    applied = sum(trader.bars_received.values())
+    for bar in db.paper_bars.find({"session_id": session_id, "seq": {"$gte": applied}}).sort("seq", 1):
+        trader.on_bar(bar["stock"], date.fromisoformat(bar["date"]), *(bar[field] for field in BAR_FIELDS))
+
+@app.post("/{env_name}/paper", response_model=PaperStatus)
+def start_paper_trading(
+    env_name: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Start (or restart) paper trading the environment's strategies. Indicators
+    are warmed up on the stored bars before the environment's start date;
+    bars posted to /{env_name}/paper/bars from then on are traded on.
+    """
+    user_id = current_user.username
+    env = db.environments.find_one({"user_id": user_id, "name": env_name})
+    if not env:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    _wait_for_data(timeout=30)
+    try:
+        trader = _build_paper_trader(env)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    env_id = str(env['_id'])
+    session_id = str(ObjectId())
+    # The environment as it is now, so later edits do not change how the session's bars replay
+    db.paper_sessions.replace_one(
+        {"_id": env_id},
+        {"session_id": session_id, "user_id": user_id, "env": env, "started_at": datetime.utcnow()},
+        upsert=True
+    )
+    db.paper_bars.delete_many({"environment_id": env_id, "session_id": {"$ne": session_id}})
+    with paper_sessions_lock:
+        paper_sessions[env_id] = (session_id, trader, threading.Lock())
+    print(f"[PAPER] Started {env_name} for user: {user_id}")
+    return _paper_status(trader)
+
+@app.post("/{env_name}/paper/bars", response_model=List[PaperBarUpdate])
+def ingest_paper_bars(
+    env_name: str,
+    bars: List[PaperBar],
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Trade on new bars, in date order, and return each bar's trades and the
+    holdings after it. A bar that is out of order or not for one of the
+    environment's stocks is rejected with 422; bars before it stay applied.
+    If another request applied a bar to the session at the same time, the
+    bar is rejected with 409; post it again.
+    """
+    env_id, session_id = _paper_session(env_name, current_user)
+    trader, lock = _paper_trader(env_id, session_id)
+    updates = []
+    with lock:
+        _paper_catch_up(session_id, trader)
+        for bar in bars:
+            seq = sum(trader.bars_received.values())
+            try:
+                update = trader.on_bar(bar.stock, bar.date, bar.open, bar.high, bar.low, bar.close, bar.volume)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+            try:
+                db.paper_bars.insert_one({
+                    "environment_id": env_id, "session_id": session_id, "seq": seq,
+                    "stock": bar.stock, "date": bar.date.isoformat(),
+                    **{field: getattr(bar, field) for field in BAR_FIELDS},
+                })
+            except Exception as e:
+                # The trader is ahead of the stored session now; rebuild it on the next request
+                with paper_sessions_lock:
+                    paper_sessions.pop(env_id, None)
+                if isinstance(e, DuplicateKeyError):
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail=f"Bar {seq} of the session was posted concurrently; bars before it are applied"
+                    )
+                raise
+            updates.append(PaperBarUpdate(
+                stock=update.ticker,
+                date=update.date,
+                trades=[_trade_data(trade) for trade in update.trades],
+                returns=update.holdings.returns,
+                cash=update.holdings.cash,
+                positions=update.holdings.portfolio
+            ))
+    return updates
+
+@app.get("/{env_name}/paper", response_model=PaperStatus)
+def get_paper_trading(
+    env_name: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the current cash, positions and returns of the paper trading session."""
+    env_id, session_id = _paper_session(env_name, current_user)
+    trader, lock = _paper_trader(env_id, session_id)
+    with lock:
+        _paper_catch_up(session_id, trader)
+        return _paper_status(trader)
+
+@app.get("/{env_name}/paper/trades", response_model=List[TradeData])
+def get_paper_trades(
+    env_name: str,
+    since: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the session's trades from the since-th on, so clients can poll for new ones."""
+    env_id, session_id = _paper_session(env_name, current_user)
+    trader, lock = _paper_trader(env_id, session_id)
+    with lock:
+        _paper_catch_up(session_id, trader)
+        return [_trade_data(trade) for trade in trader.trades[since:]]
+
+@app.delete("/{env_name}/paper", status_code=status.HTTP_200_OK, response_class=Response)
+def stop_paper_trading(
+    env_name: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Stop the paper trading session and discard its state."""
+    env_id, _ = _paper_session(env_name, current_user)
+    db.paper_sessions.delete_one({"_id": env_id})
+    db.paper_bars.delete_many({"environment_id": env_id})
+    with paper_sessions_lock:
+        paper_sessions.pop(env_id, None)
     return Response(status_code=status.HTTP_200_OK)
 
 # Request models for creating new items
@@ -464,9 +2032,10 @@ class CreateEnvironmentRequest(BaseModel):
     stocks: List[str]
     start_date: date
     end_date: date
+    missing_data: Literal["abort", "ffill", "skip"] = "abort"
 
 class AddStrategyRequest(BaseModel):
-    strategy: Union[ExampleStrategy, ExampleStrategy2, PercentageSMAStrategy, RSIStrategy]
+    strategy: Union[ExampleStrategy, ExampleStrategy2, PercentageSMAStrategy, RSIStrategy, RankingStrategy, ExpressionStrategy]
 
 @app.post("/environments", status_code=status.HTTP_200_OK, response_class=Response)
 async def create_environment(
@@ -492,7 +2061,12 @@ async def create_environment(
         "stocks": request.stocks,
         "start_date": request.start_date.isoformat(),
         "end_date": request.end_date.isoformat(),
-        "strategies": []
+        "missing_data": request.missing_data,
+        "strategies": [],
+        "strategy_count": 0,
+        "run_status": None,
+        "last_run_at": None,
+        "last_return": None,
     }
     
     # Insert into MongoDB
@@ -527,7 +2101,12 @@ async def add_strategy(
     # Add the strategy
     db.environments.update_one(
         {"_id": env["_id"]},
-        {"$push": {"strategies": strategy_dict}}
+        [
+            {"$set": {"strategies": {"$concatArrays": [
+                {"$ifNull": ["$strategies", []]}, {"$literal": [strategy_dict]}
+            ]}}},
+            _COUNT_STRATEGIES,
+        ]
     )
     
     return Response(status_code=status.HTTP_200_OK)
@@ -543,14 +2122,18 @@ async def delete_strategy(
     
     # Find and update the environment
     result = db.environments.update_one(
-        {"user_id": user_id, "name": env_name},
-        {"$pull": {"strategies": {"name": strategy_name}}}
+        {"user_id": user_id, "name": env_name, "strategies.name": strategy_name},
+        [
+            {"$set": {"strategies": {"$filter": {
+                "input": "$strategies", "cond": {"$ne": ["$$this.name", {"$literal": strategy_name}]}
+            }}}},
+            _COUNT_STRATEGIES,
+        ]
     )
     
     if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Environment not found")
-    
-    if result.modified_count == 0:
+        if db.environments.find_one({"user_id": user_id, "name": env_name}, {"_id": 1}) is None:
+            raise HTTPException(status_code=404, detail="Environment not found")
         raise HTTPException(status_code=404, detail="Strategy not found")
     
     return Response(status_code=status.HTTP_200_OK)
@@ -571,9 +2154,7 @@ async def delete_environment(
     env_id = str(env['_id'])
     
     # Delete all associated data
-    db.returns.delete_one({"environment_id": env_id})
-    db.portfolio.delete_one({"environment_id": env_id})
-    db.trades.delete_one({"environment_id": env_id})
+    _delete_results(db, env_id)
     
     # Delete the environment
     db.environments.delete_one({"_id": env['_id']})
@@ -613,7 +2194,13 @@ async def update_environment(
         "stocks": request.stocks,
         "start_date": request.start_date.isoformat(),
         "end_date": request.end_date.isoformat(),
-        "strategies": strategies
+        "missing_data": request.missing_data,
+        "strategies": strategies,
+        # The results are deleted below, so the listing fields describe no run
+        "strategy_count": len(strategies),
+        "run_status": None,
+        "last_run_at": None,
+        "last_return": None,
     }
     
     # Update in MongoDB
@@ -624,9 +2211,7 @@ async def update_environment(
     
     # Delete any existing backtest results since environment parameters changed
     env_id = str(existing['_id'])
-    db.returns.delete_one({"environment_id": env_id})
-    db.portfolio.delete_one({"environment_id": env_id})
-    db.trades.delete_one({"environment_id": env_id})
+    _delete_results(db, env_id)
     
     return Response(status_code=status.HTTP_200_OK)
 
@@ -0,0 +1,127 @@
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backtester.back_tester import Holdings, PositionRecord, Trade
+
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def _ratio(numerator: float, denominator: float) -> Optional[float]:
+    if denominator == 0 or not np.isfinite(denominator):
+        return None
+    return float(numerator / denominator)
+
+
+def drawdown(equity: np.ndarray) -> np.ndarray:
+    """Fractional distance below the running peak for each point of an equity curve."""
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(peak > 0, equity / peak - 1, 0.0)
+
+
+def max_drawdown_duration(equity: np.ndarray) -> int:
+    """Longest stretch, in trading days, spent below a previous peak."""
+    if len(equity) == 0:
+        return 0
+    index = np.arange(len(equity))
+    at_peak = equity >= np.maximum.accumulate(equity)
+    last_peak = np.maximum.accumulate(np.where(at_peak, index, 0))
+    return int((index - last_peak).max())
+
+
+def compute_summary(
+    holdings: Dict[date, Holdings],
+    trades: List[Trade],
+    positions: List[PositionRecord],
+    initial_cash: float,
+) -> dict:
+    """
+    Performance summary of a backtest, computed from the holdings as arrays.
+
+    Returns are daily simple returns of the equity curve (starting from
+    initial_cash); ratios are annualized with 252 trading days and a zero
+    risk-free rate. Attribution splits P&L by the strategy that opened each
+    position, with open positions marked at the last simulated close.
+    """
+    dates = sorted(holdings)
+    n_days = len(dates)
+    summary = {
+        "start_date": dates[0].isoformat() if dates else None,
+        "end_date": dates[-1].isoformat() if dates else None,
+        "trading_days": n_days,
+        "trades": len(trades),
+    }
+    if n_days == 0:
+        return summary
+
+    cumulative = np.fromiter((holdings[d].returns for d in dates), dtype=float, count=n_days)
+    cash = np.fromiter((holdings[d].cash for d in dates), dtype=float, count=n_days)
+    equity = initial_cash * (1 + cumulative)
+
+    previous = np.concatenate(([initial_cash], equity[:-1]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily = np.where(previous != 0, equity / previous - 1, 0.0)
+        # Net value of positions as a fraction of equity
+        exposure = np.where(equity != 0, (equity - cash) / equity, 0.0)
+
+    mean = daily.mean()
+    volatility = daily.std(ddof=1) if n_days > 1 else 0.0
+    downside = np.sqrt(np.mean(np.minimum(daily, 0) ** 2))
+    annualizer = np.sqrt(TRADING_DAYS_PER_YEAR)
+
+    total_return = float(cumulative[-1])
+    years = n_days / TRADING_DAYS_PER_YEAR
+    growth = 1 + total_return
+    cagr = float(growth ** (1 / years) - 1) if growth > 0 else -1.0
+
+    traded_notional = float(sum(abs(trade.amount) for trade in trades))
+    average_equity = float(np.abs(equity).mean())
+    invested = np.fromiter((bool(holdings[d].portfolio) for d in dates), dtype=bool, count=n_days)
+
+    drawdowns = drawdown(equity)
+
+    closed_pnl = np.array([p.pnl for p in positions if p.closed], dtype=float)
+
+    by_strategy: Dict[str, Dict[str, float]] = defaultdict(
+        lambda: {"pnl": 0.0, "realized_pnl": 0.0, "positions": 0, "closed": 0, "wins": 0}
+    )
+    for position in positions:
+        stats = by_strategy[position.strategy or "unknown"]
+        pnl = position.pnl
+        stats["pnl"] += pnl
+        stats["positions"] += 1
+        if position.closed:
+            stats["realized_pnl"] += pnl
+            stats["closed"] += 1
+            stats["wins"] += pnl > 0
+
+    summary.update({
+        "total_return": total_return,
+        "cagr": cagr,
+        "volatility": float(volatility * annualizer),
+        "sharpe": _ratio(mean * annualizer, volatility),
+        "sortino": _ratio(mean * annualizer, downside),
+        "max_drawdown": float(drawdowns.min()),
+        "max_drawdown_duration_days": max_drawdown_duration(equity),
+        "turnover": _ratio(traded_notional, average_equity),
+        "annual_turnover": _ratio(traded_notional, average_equity * years),
+        "average_exposure": float(exposure.mean()),
+        "time_in_market": float(invested.mean()),
+        "closed_positions": int(len(closed_pnl)),
+        "win_rate": float((closed_pnl > 0).mean()) if len(closed_pnl) else None,
+        "attribution": {
+            name: {
+                "pnl": stats["pnl"],
+                "realized_pnl": stats["realized_pnl"],
+                "return_contribution": stats["pnl"] / initial_cash,
+                "positions": stats["positions"],
+                "win_rate": stats["wins"] / stats["closed"] if stats["closed"] else None,
+            }
+            for name, stats in by_strategy.items()
+        },
+    })
+    return summary
@@ -1,11 +1,27 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import Dict
 from backtester.environment import Environment
 from backtester.market_data import MarketData
+from backtester.coverage import DataCoverageError, FilledMarketData, coverage, fill_rows, find_gaps
+from backtester.run_control import RunControl, _current_rss_mb
+from backtester.instrumentation import BacktestMetrics, RunUsage
+from backtester.portfolio_history import PortfolioChange, diff
 from datetime import date, timedelta
+from time import perf_counter, thread_time
+import numpy as np
 import pandas as pd
-from typing import Optional, Set, List
-from backtester.strategies.base_strategy import StrategyType
+from typing import Optional, Set, List, Tuple
+from backtester.strategies.base_strategy import Strategy, StrategyType
+
+
+def _overrides(strategy: Strategy, method: str) -> bool:
+    """Whether strategy's class replaces the base Strategy implementation of method."""
+    return getattr(type(strategy), method) is not getattr(Strategy, method)
+
+
+def _strategy_name(strategy: Strategy) -> str:
+    """The name the strategy was configured with, or its class name if it has none."""
+    return getattr(strategy, "name", None) or type(strategy).__name__
 
 
 @dataclass(frozen=True)
@@ -15,6 +31,25 @@ class Position:
     entered_price: float
     liquidate_below: Optional[float] = None
     liquidate_above: Optional[float] = None
+    strategy: Optional[str] = None
+    entered_date: Optional[date] = None
+
+
+@dataclass
+class PositionRecord:
+    """A closed position, or an open one marked to market at the last simulated date."""
+    ticker: str
+    strategy: Optional[str]
+    amount: float
+    entry_date: Optional[date]
+    entry_price: float
+    exit_date: date
+    exit_price: float
+    closed: bool
+
+    @property
+    def pnl(self) -> float:
+        return (self.exit_price - self.entry_price) * self.amount
 
 
 @dataclass
@@ -31,15 +66,46 @@ class Trade:
     date: date
 
 class BackTester:
-    def __init__(self, data_df: pd.DataFrame, env: Environment):
-        self.all_market_data = MarketData(data_df, env.tickers)
+    def __init__(
+        self,
+        data_df: Optional[pd.DataFrame],
+        env: Environment,
+        market_data: Optional[MarketData] = None,
+        control: Optional[RunControl] = None,
+        instrument: bool = False,
+    ):
+        # A prebuilt MarketData lets several backtests share one parsed copy
+        if market_data is None:
+            market_data = MarketData(data_df, env.tickers)
+        self.all_market_data = market_data
+        # The data as given; all_market_data may become a forward-filled view of it
+        self._market_data = market_data
         self.env = env
+        self.control = control
+        # Per-phase timers and counters, only collected when instrument=True
+        self.metrics: Optional[BacktestMetrics] = BacktestMetrics() if instrument else None
+        self.usage = RunUsage()
+        self._rss_baseline_mb = 0.0
 
         self.holdings: Dict[date, Holdings] = {}
         self.trades: List[Trade] = []
+        self.closed_positions: List[PositionRecord] = []
+        # Open positions of rebalancing strategies, keyed by position in env.strategies
+        self.rebalanced_positions: Dict[int, Set[Position]] = {}
+        # Net amount changes per ticker; the daily snapshots in holdings can be rebuilt from these
+        self.portfolio_events: List[PortfolioChange] = []
+        self._last_portfolio: Dict[str, float] = {}
 
         self.current_cash = env.cash
         self.current_portfolio: Dict[str, Set[Position]] = {}
+        # First calendar date not simulated yet, set once backtest() has run
+        self._next_date: Optional[date] = None
+
+    def __getstate__(self):
+        # Market data stays with the process that has it; pass it to resume() after unpickling
+        state = self.__dict__.copy()
+        state["all_market_data"] = state["_market_data"] = None
+        return state
 
     def _simulate_long_position(
         self,
@@ -49,7 +115,7 @@ class BackTester:
         liquidate_below: Optional[float],
         liquidate_above: Optional[float],
         strategy=None
-    ):
+    ) -> Optional[Position]:
         # Calculate available cash considering all current positions
         total_portfolio_value = self._get_portfolio_value(self.current_portfolio, date)
         total_assets = self.current_cash + total_portfolio_value
@@ -67,6 +133,7 @@ class BackTester:
         price = self.all_market_data.get_close_price(ticker, date)
         amount = available_cash_to_buy / price
 
+        strategy_name = _strategy_name(strategy) if strategy is not None else None
         if strategy is not None:
             strategy.entry_price = price
             liquidate_above_price = strategy.liquidate_above()
@@ -77,15 +144,20 @@ class BackTester:
 
         self.trades.append(Trade(ticker=ticker, amount=amount*price, date=date))
 
-        self.current_portfolio[ticker].add(
-            Position(
-                ticker=ticker,
-                amount=amount,
-                entered_price=price,
-                liquidate_above=liquidate_above_price,
-                liquidate_below=liquidate_below_price,
-            )
+        position = Position(
+            ticker=ticker,
+            amount=amount,
+            entered_price=price,
+            liquidate_above=liquidate_above_price,
+            liquidate_below=liquidate_below_price,
+            strategy=strategy_name,
+            entered_date=date,
         )
+        self.current_portfolio[ticker].add(position)
+        self.usage.positions_opened += 1
+        if self.metrics is not None:
+            self.metrics.position_opened(strategy_name)
+        return position
 
     def _simulate_short_position(
         self,
@@ -95,7 +167,7 @@ class BackTester:
         liquidate_below: Optional[float],
         liquidate_above: Optional[float],
         strategy=None
-    ):
+    ) -> Optional[Position]:
         # Calculate available cash considering all current positions
         total_portfolio_value = self._get_portfolio_value(self.current_portfolio, date)
         total_assets = self.current_cash + total_portfolio_value
@@ -113,6 +185,7 @@ class BackTester:
         price = self.all_market_data.get_close_price(ticker, date)
         amount = -(available_cash_to_short / price)
 
+        strategy_name = _strategy_name(strategy) if strategy is not None else None
         if strategy is not None:
             strategy.entry_price = price
             liquidate_above_price = strategy.liquidate_above()
@@ -123,33 +196,69 @@ class BackTester:
 
         self.trades.append(Trade(ticker=ticker, amount=amount*price, date=date))
 
-        self.current_portfolio[ticker].add(
-            Position(
-                ticker=ticker,
-                amount=amount,
-                entered_price=price,
-                liquidate_above=liquidate_above_price,
-                liquidate_below=liquidate_below_price,
-            )
+        position = Position(
+            ticker=ticker,
+            amount=amount,
+            entered_price=price,
+            liquidate_above=liquidate_above_price,
+            liquidate_below=liquidate_below_price,
+            strategy=strategy_name,
+            entered_date=date,
         )
-
-    def _shouldLiquidatePosition(self, position: Position, date: date):
-        price = self.all_market_data.get_close_price(position.ticker, date)
-
-        if position.liquidate_below and price < position.liquidate_below:
-            return True
-
-        if position.liquidate_above and price > position.liquidate_above:
-            return True
-
-        return False
-
-    def _liquidatePosition(self, position: Position, date: date):
-        price = self.all_market_data.get_close_price(position.ticker, date)
+        self.current_portfolio[ticker].add(position)
+        self.usage.positions_opened += 1
+        if self.metrics is not None:
+            self.metrics.position_opened(strategy_name)
+        return position
+
+    def _liquidation_price(self, position: Position, date: date) -> Optional[float]:
+        """
+        Price at which position is liquidated on date, or None to keep it.
+
+        With intraday market data the position exits at the close of the first
+        bar of the day that crosses a limit. Positions entered today entered at
+        the day's close, so only that close is checked for them.
+        """
+        started = perf_counter() if self.metrics is not None else 0.0
+        exit_price = None
+
+        if self.all_market_data.resolution is not None and position.entered_date != date:
+            closes = np.asarray(self.all_market_data.get_bars(position.ticker, date).close)
+            crossed = np.zeros(len(closes), dtype=bool)
+            if position.liquidate_below:
+                crossed |= closes < position.liquidate_below
+            if position.liquidate_above:
+                crossed |= closes > position.liquidate_above
+            if crossed.any():
+                exit_price = float(closes[crossed.argmax()])
+        else:
+            price = self.all_market_data.get_close_price(position.ticker, date)
+            if (
+                (position.liquidate_below and price < position.liquidate_below)
+                or (position.liquidate_above and price > position.liquidate_above)
+            ):
+                exit_price = price
+
+        if self.metrics is not None:
+            self.metrics.add("liquidation_check", perf_counter() - started)
+        return exit_price
+
+    def _liquidatePosition(self, position: Position, date: date, price: Optional[float] = None):
+        started = perf_counter() if self.metrics is not None else 0.0
+        if price is None:
+            price = self.all_market_data.get_close_price(position.ticker, date)
         self.current_cash += price * position.amount
         self.current_portfolio[position.ticker].remove(position)
+        for held in self.rebalanced_positions.values():
+            held.discard(position)
+        self.closed_positions.append(self._position_record(position, date, price, closed=True))
+
+        if self.metrics is not None:
+            self.metrics.add("liquidation", perf_counter() - started)
+            self.metrics.position_closed(position.strategy)
 
     def _get_portfolio_value(self, portfolio: Dict[str, float], date: date) -> float:
+        started = perf_counter() if self.metrics is not None else 0.0
         value = 0
         for ticker in portfolio:
             for position in portfolio[ticker]:
@@ -157,9 +266,12 @@ class BackTester:
                     self.all_market_data.get_close_price(ticker, date) * position.amount
                 )
 
+        if self.metrics is not None:
+            self.metrics.add("portfolio_value", perf_counter() - started)
         return value
 
     def _snapshotHoldings(self, date: date) -> Holdings:
+        started = perf_counter() if self.metrics is not None else 0.0
         returns = (
             self.current_cash
             + self._get_portfolio_value(self.current_portfolio, date)
@@ -177,33 +289,248 @@ class BackTester:
             if compressed_portfolio[ticker] != 0
         }
 
+        changes = diff(self._last_portfolio, compressed_portfolio, date)
+        if changes:
+            self.portfolio_events.extend(changes)
+            self._last_portfolio = compressed_portfolio
+        else:
+            # Unchanged days share one dict instead of holding a copy each
+            compressed_portfolio = self._last_portfolio
+
+        if self.metrics is not None:
+            self.metrics.add("snapshot", perf_counter() - started)
         return Holdings(
             cash=self.current_cash, portfolio=compressed_portfolio, returns=returns
         )
 
+    def _precompute_signals(
+        self, start_date: date, end_date: date
+    ) -> Tuple[Dict[int, np.ndarray], Dict[int, np.ndarray]]:
+        """
+        Entry masks and target weights for the whole run, keyed by position in
+        env.strategies, for strategies that implement signals_for_range or
+        weights_for_range. Rows follow the trading dates in [start_date,
+        end_date], columns follow env.tickers.
+        """
+        trading_dates = [
+            d for d in self.all_market_data.trading_dates if start_date <= d <= end_date
+        ]
+        signals = {}
+        weights = {}
+        for i, strategy in enumerate(self.env.strategies):
+            started = perf_counter() if self.metrics is not None else 0.0
+            if _overrides(strategy, "weights_for_range"):
+                weights[i] = strategy.weights_for_range(
+                    trading_dates, self.env.tickers, self.all_market_data
+                )
+                self.rebalanced_positions.setdefault(i, set())
+            elif _overrides(strategy, "signals_for_range"):
+                signals[i] = strategy.signals_for_range(
+                    trading_dates, self.env.tickers, self.all_market_data
+                )
+            else:
+                continue
+            self.usage.strategy_calls += len(trading_dates) * len(self.env.tickers)
+            if self.metrics is not None:
+                elapsed = perf_counter() - started
+                self.metrics.add("should_enter", elapsed)
+                self.metrics.add_strategy_call(
+                    _strategy_name(strategy), elapsed, calls=len(trading_dates) * len(self.env.tickers)
+                )
+        return signals, weights
+
+    def _check_coverage(self, start_date: date, end_date: date) -> Optional[np.ndarray]:
+        """
+        Apply env.missing_data to the bars the run reads before simulating.
+
+        Raises DataCoverageError for "abort" if any ticker misses a bar between
+        start_date and end_date. For "ffill" and "skip", market data is
+        replaced by a forward-filled view and the returned (run days x
+        env.tickers) mask tells which tickers can be traded each day; None
+        means all of them every day.
+        """
+        dates = self._market_data.trading_dates
+        first_row = int(np.searchsorted(dates, start_date))
+        last_row = int(np.searchsorted(dates, end_date, side="right")) - 1
+        if last_row < first_row:
+            return None
+
+        available = coverage(self._market_data, self.env.tickers)
+        run = available[first_row:last_row + 1]
+        if run.all():
+            return None
+        if self.env.missing_data == "abort":
+            raise DataCoverageError(find_gaps(self._market_data, self.env.tickers, available, first_row, last_row))
+
+        self.all_market_data = FilledMarketData(self._market_data, self.env.tickers, available)
+        if self.env.missing_data == "skip":
+            return run
+        # Forward-filled tickers trade once they have a first bar
+        return fill_rows(available)[first_row:last_row + 1] >= 0
+
+    def _rebalance(
+        self, index: int, strategy: Strategy, weights: np.ndarray, date: date, tradable: Optional[np.ndarray] = None
+    ):
+        """
+        Move a rebalancing strategy to its target weights at today's close:
+        liquidate its positions in tickers it no longer holds, then open
+        positions worth weight x total assets in newly selected tickers.
+        Positions in tickers that stay selected are kept as they are, and so
+        are positions in tickers that cannot be traded today.
+        """
+        held = self.rebalanced_positions[index]
+        if tradable is not None:
+            weights = np.where(tradable, weights, 0)
+            untradable = {ticker for ticker, ok in zip(self.env.tickers, tradable) if not ok}
+        else:
+            untradable = set()
+        targets = {
+            ticker: weight for ticker, weight in zip(self.env.tickers, weights) if weight > 0
+        }
+        for position in list(held):
+            if position.ticker not in targets and position.ticker not in untradable:
+                self._liquidatePosition(position, date)
+
+        held_tickers = {position.ticker for position in held}
+        simulate = (
+            self._simulate_long_position
+            if strategy.strategy_type() == StrategyType.LONG
+            else self._simulate_short_position
+        )
+        for ticker, weight in targets.items():
+            if ticker in held_tickers:
+                continue
+            position = simulate(
+                ticker,
+                exposure=weight,
+                liquidate_above=None,
+                liquidate_below=None,
+                date=date,
+                strategy=strategy
+            )
+            if position is not None:
+                held.add(position)
+
+    def _should_enter_day(self, strategy: Strategy, date: date) -> Optional[np.ndarray]:
+        """Entry mask over env.tickers for strategies with a batch should_enter, else None."""
+        if not _overrides(strategy, "should_enter_batch"):
+            return None
+        started = perf_counter() if self.metrics is not None else 0.0
+        mask = strategy.should_enter_batch(date, self.env.tickers, self.all_market_data)
+        self.usage.strategy_calls += len(self.env.tickers)
+        if self.metrics is not None:
+            elapsed = perf_counter() - started
+            self.metrics.add("should_enter", elapsed)
+            self.metrics.add_strategy_call(_strategy_name(strategy), elapsed, calls=len(self.env.tickers))
+        return mask
+
     def backtest(self):
-        start_date = self.env.start_date
+        started, cpu_started = perf_counter(), thread_time()
+        # Memory is charged as growth over what the process held before the run
+        self._rss_baseline_mb = _current_rss_mb()
+        try:
+            self._simulate()
+        finally:
+            # Also accounted when the run fails or is aborted halfway
+            self.usage.wall_s += perf_counter() - started
+            self.usage.cpu_s += thread_time() - cpu_started
+            self._sample_memory()
+
+    def resume(self, end_date: date, market_data: Optional[MarketData] = None):
+        """
+        Continue a finished backtest up to a later end date. The result is the
+        same as backtesting the whole range at once, without re-simulating
+        the days already done. An unpickled backtest may differ in the last
+        digits, since its positions are summed in a different order.
+
+        Args:
+            end_date (date): New end date of the environment
+            market_data (MarketData, optional): The market data the backtest ran on;
+                required after unpickling, which drops it
+        """
+        if market_data is not None:
+            self.all_market_data = self._market_data = market_data
+        if self._market_data is None:
+            raise ValueError("Backtest has no market data to resume on")
+        if end_date < self.env.end_date:
+            raise ValueError(f"Cannot resume to {end_date}, the backtest already ran to {self.env.end_date}")
+        self.env = replace(self.env, end_date=end_date)
+        self.backtest()
+
+    def _sample_memory(self):
+        self.usage.peak_rss_mb = max(self.usage.peak_rss_mb, _current_rss_mb() - self._rss_baseline_mb)
+
+    def _simulate(self):
+        start_date = self._next_date or self.env.start_date
         end_date = self.env.end_date
 
         current_date = start_date
 
+        if self.control is not None:
+            self.control.start()
+
+        # Gaps in the data are found before any work is done, not by a
+        # ValueError on the first missing bar
+        tradable = self._check_coverage(start_date, end_date)
+
+        # Strategies with vectorized signals are evaluated for the whole run up
+        # front; the rest are asked once per day (batch) or per ticker
+        range_signals, range_weights = self._precompute_signals(start_date, end_date)
+        day_row = -1
+
         while current_date <= end_date:
             if not self.all_market_data.is_trading_date(current_date):
                 current_date += timedelta(days=1)
                 continue
 
-            for strategy in self.env.strategies:
-                for ticker in self.env.tickers:
+            if self.control is not None:
+                # Raises BacktestAborted when cancelled or over budget
+                self.control.check()
+            day_row += 1
+            self.usage.trading_days += 1
+            if self.usage.trading_days % RunControl.MEMORY_CHECK_INTERVAL == 0:
+                self._sample_memory()
+
+            for s, strategy in enumerate(self.env.strategies):
+                rebalancing = s in range_weights
+                if rebalancing:
+                    entries = None
+                elif s in range_signals:
+                    entries = range_signals[s][day_row]
+                else:
+                    entries = self._should_enter_day(strategy, current_date)
+
+                for t, ticker in enumerate(self.env.tickers):
+                    if tradable is not None and not tradable[day_row, t]:
+                        continue
+
                     if ticker in self.current_portfolio:
                         for position in list(self.current_portfolio[ticker]):
-                            if self._shouldLiquidatePosition(
-                                position=position, date=current_date
-                            ):
-                                self._liquidatePosition(position, current_date)
-
-                    if strategy.should_enter(
-                        current_date, ticker, self.all_market_data
-                    ):
+                            exit_price = self._liquidation_price(position, current_date)
+                            if exit_price is not None:
+                                self._liquidatePosition(position, current_date, exit_price)
+
+                    if rebalancing:
+                        continue
+
+                    if entries is not None:
+                        should_enter = entries[t]
+                    elif self.metrics is None:
+                        self.usage.strategy_calls += 1
+                        should_enter = strategy.should_enter(
+                            current_date, ticker, self.all_market_data
+                        )
+                    else:
+                        self.usage.strategy_calls += 1
+                        started = perf_counter()
+                        should_enter = strategy.should_enter(
+                            current_date, ticker, self.all_market_data
+                        )
+                        elapsed = perf_counter() - started
+                        self.metrics.add("should_enter", elapsed)
+                        self.metrics.add_strategy_call(_strategy_name(strategy), elapsed)
+
+                    if should_enter:
                         if strategy.strategy_type() == StrategyType.LONG:
                             self._simulate_long_position(
                                 ticker,
@@ -223,12 +550,59 @@ class BackTester:
                                 strategy=strategy
                             )
 
+                if rebalancing and not np.isnan(range_weights[s][day_row]).all():
+                    self._rebalance(
+                        s, strategy, range_weights[s][day_row], current_date,
+                        tradable[day_row] if tradable is not None else None,
+                    )
+
             self.holdings[current_date] = self._snapshotHoldings(current_date)
+            if self.metrics is not None:
+                self.metrics.end_day()
 
             current_date += timedelta(days=1)
+
+        self._next_date = current_date
     
     def get_trades(self) -> Dict[date, List[Trade]]:
         return self.trades
     
     def get_holdings(self) -> Dict[date, Holdings]:
         return self.holdings
+
+    def get_portfolio_events(self) -> List[PortfolioChange]:
+        return self.portfolio_events
+
+    def _position_record(self, position: Position, date: date, price: float, closed: bool) -> PositionRecord:
+        return PositionRecord(
+            ticker=position.ticker,
+            strategy=position.strategy,
+            amount=position.amount,
+            entry_date=position.entered_date,
+            entry_price=position.entered_price,
+            exit_date=date,
+            exit_price=price,
+            closed=closed,
+        )
+
+    def get_positions(self) -> List[PositionRecord]:
+        """Closed positions plus open positions marked at the last simulated close."""
+        records = list(self.closed_positions)
+        if not self.holdings:
+            return records
+
+        last_date = max(self.holdings)
+        for ticker, positions in self.current_portfolio.items():
+            for position in positions:
+                try:
+                    price = self.all_market_data.get_close_price(ticker, last_date)
+                except ValueError:
+                    price = position.entered_price
+                records.append(self._position_record(position, last_date, price, closed=False))
+        return records
+
+    def get_metrics(self) -> Optional[dict]:
+        return self.metrics.to_dict() if self.metrics is not None else None
+
+    def get_usage(self) -> dict:
+        return self.usage.to_dict()
@@ -0,0 +1,379 @@
+"""
+Columnar, memory-mapped storage for intraday bars.
+
+Each ticker is a directory of raw little-endian column files (one value per
+bar, in timestamp order) that are appended to on import and memory-mapped on
+read, so a multi-year minute-level history never has to fit in memory.
+
+Timestamps are whole seconds since the epoch in exchange-local time, so the
+trading day of a bar is timestamp // 86400.
+
+Import a CSV of timestamp,ticker,open,high,low,close,volume rows with:
+
+    python -m backtester.bar_store import ./bars ./minute_bars.csv --resolution 60
+
+A store can also materialize daily bars and daily indicators of the close
+(--indicators default, or e.g. --indicators sma:20,rsi:14). They are kept in
+each ticker's daily/ directory and updated incrementally on every append, so
+backtests read them instead of recomputing them.
+"""
+import argparse
+import json
+import os
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtester import indicators
+
+
+SECONDS_PER_DAY = 86400
+COLUMNS = {
+    "timestamp": np.dtype("<i8"),
+    "open": np.dtype("<f8"),
+    "high": np.dtype("<f8"),
+    "low": np.dtype("<f8"),
+    "close": np.dtype("<f8"),
+    "volume": np.dtype("<f8"),
+}
+META_FILE = "meta.json"
+DAILY_DIR = "daily"
+# SMA windows and RSI period most strategies use
+DEFAULT_INDICATORS = ("sma:5", "sma:10", "sma:20", "sma:50", "sma:200", "rsi:14")
+
+
+def day_number(day: date) -> int:
+    """Trading day of a date in the same units as timestamp // SECONDS_PER_DAY."""
+    return (day - date(1970, 1, 1)).days
+
+
+def parse_indicator(spec: str) -> Tuple[str, int]:
+    """("sma", 20) for "sma:20"; only SMA windows and RSI periods can be materialized."""
+    name, _, window = spec.partition(":")
+    if name not in ("sma", "rsi") or not window.isdigit() or int(window) <= 0:
+        raise ValueError(f"Cannot materialize indicator {spec!r}, expected e.g. sma:20 or rsi:14")
+    return name, int(window)
+
+
+def compute_materialized(spec: str, closes: np.ndarray) -> np.ndarray:
+    """
+    Values of a materialized indicator over a ticker's daily closes. SMAs
+    average whatever history exists during their first window - 1 days,
+    like indicators.sma(closes, window, min_periods=1).
+    """
+    name, window = parse_indicator(spec)
+    if name == "sma":
+        return indicators.sma(closes, window, 1)
+    return indicators.rsi(closes, window)
+
+
+def materialized_history(spec: str) -> int:
+    """Number of closes the indicator value of a day depends on, including that day."""
+    name, window = parse_indicator(spec)
+    return window if name == "sma" else window + 1
+
+
+def to_timestamps(values) -> np.ndarray:
+    """Seconds since the epoch for datetimes or datetime strings, read as exchange-local times."""
+    return pd.to_datetime(values).to_numpy(dtype="datetime64[s]").astype("<i8")
+
+
+@dataclass
+class Bars:
+    """A run of bars for one ticker as parallel arrays, possibly views of the memory-mapped files."""
+    timestamp: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def aggregate(self, buckets: np.ndarray) -> "Bars":
+        """Merge consecutive bars with equal bucket keys (keys must be non-decreasing)."""
+        if len(self) == 0:
+            return self
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        ends = np.concatenate((starts[1:], [len(self)])) - 1
+        return Bars(
+            timestamp=np.asarray(self.timestamp[starts]),
+            open=np.asarray(self.open[starts]),
+            high=np.maximum.reduceat(self.high, starts),
+            low=np.minimum.reduceat(self.low, starts),
+            close=np.asarray(self.close[ends]),
+            volume=np.add.reduceat(self.volume, starts),
+        )
+
+    def resample(self, resolution: int) -> "Bars":
+        """Bars of `resolution` seconds, labelled by the timestamp of their first bar."""
+        return self.aggregate(self.timestamp // resolution)
+
+    def daily(self) -> "Bars":
+        return self.aggregate(self.timestamp // SECONDS_PER_DAY)
+
+
+class BarStore:
+    def __init__(self, path: str):
+        """
+        Open an existing store.
+
+        Args:
+            path (str): Store directory created with BarStore.create
+        """
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.resolution: int = meta["resolution"]
+        # None unless daily bars and indicators are materialized
+        self.indicators: Optional[List[str]] = meta.get("indicators")
+        self._columns: Dict[str, Dict[str, np.ndarray]] = {}
+
+    def __getstate__(self):
+        # Pickling a memmap copies its data; let worker processes remap instead
+        state = dict(self.__dict__)
+        state["_columns"] = {}
+        return state
+
+    @classmethod
+    def create(cls, path: str, resolution: int = 60, indicators: Optional[Iterable[str]] = None) -> "BarStore":
+        """
+        Create an empty store of bars that are `resolution` seconds apart,
+        materializing daily bars and the given indicators if indicators is set.
+        """
+        os.makedirs(path, exist_ok=True)
+        return cls._write_meta(path, resolution, indicators)
+
+    @classmethod
+    def _write_meta(cls, path: str, resolution: int, indicators: Optional[Iterable[str]]) -> "BarStore":
+        meta = {"resolution": resolution, "columns": {k: v.str for k, v in COLUMNS.items()}}
+        if indicators is not None:
+            indicators = list(indicators)
+            for spec in indicators:
+                parse_indicator(spec)
+            meta["indicators"] = indicators
+        with open(os.path.join(path, META_FILE), "w") as f:
+            json.dump(meta, f)
+        return cls(path)
+
+    def materialize(self, indicators: Iterable[str] = DEFAULT_INDICATORS):
+        """Materialize daily bars and indicators for the bars already stored; later appends keep them current."""
+        store = self._write_meta(self.path, self.resolution, indicators)
+        self.indicators = store.indicators
+        for ticker in self.tickers:
+            self._update_daily(ticker, None)
+
+    @property
+    def tickers(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.path)
+            if os.path.isdir(os.path.join(self.path, name))
+        )
+
+    def _file(self, ticker: str, column: str) -> str:
+        return os.path.join(self.path, ticker, column + ".bin")
+
+    def _daily_file(self, ticker: str, column: str) -> str:
+        return os.path.join(self.path, ticker, DAILY_DIR, column.replace(":", "_") + ".bin")
+
+    def _column(self, ticker: str, column: str, daily: bool = False) -> np.ndarray:
+        columns = self._columns.setdefault(ticker, {})
+        key = (DAILY_DIR, column) if daily else column
+        values = columns.get(key)
+        if values is None:
+            file = self._daily_file(ticker, column) if daily else self._file(ticker, column)
+            dtype = COLUMNS.get(column, np.dtype("<f8"))
+            if not os.path.exists(file) or os.path.getsize(file) == 0:
+                values = np.empty(0, dtype=dtype)
+            else:
+                values = np.memmap(file, dtype=dtype, mode="r")
+            columns[key] = values
+        return values
+
+    def _update_daily(self, ticker: str, first_day: Optional[int]):
+        """
+        Recompute the materialized daily bars and indicators of ticker from
+        first_day (a day number, None for all) onwards, reusing stored rows
+        before it and only as many earlier closes as the indicators need.
+        """
+        stored = Bars(**{column: self._column(ticker, column, daily=True) for column in COLUMNS})
+        keep = 0 if first_day is None else int(np.searchsorted(stored.timestamp, first_day * SECONDS_PER_DAY))
+        start = None if first_day is None else first_day * SECONDS_PER_DAY
+        new = self._aggregate_daily(self.bars(ticker, start))
+
+        # Small files rewritten whole and swapped in with os.replace, so
+        # memory maps of the old versions stay valid
+        os.makedirs(os.path.join(self.path, ticker, DAILY_DIR), exist_ok=True)
+        values = {
+            column: np.concatenate((np.asarray(getattr(stored, column)[:keep]), getattr(new, column)))
+            for column in COLUMNS
+        }
+        for spec in self.indicators:
+            context = max(0, keep - materialized_history(spec) + 1)
+            closes = np.concatenate((np.asarray(stored.close[context:keep]), new.close))
+            previous = np.asarray(self._column(ticker, spec, daily=True)[:keep])
+            values[spec] = np.concatenate((previous, compute_materialized(spec, closes)[keep - context:]))
+
+        self._columns.pop(ticker, None)
+        for column, array in values.items():
+            file = self._daily_file(ticker, column)
+            with open(file + ".tmp", "wb") as f:
+                f.write(array.astype(COLUMNS.get(column, np.dtype("<f8"))).tobytes())
+            os.replace(file + ".tmp", file)
+
+    def indicator(self, ticker: str, spec: str) -> Optional[np.ndarray]:
+        """Materialized indicator of ticker, one value per row of daily_bars, or None if it is not materialized."""
+        if not self.indicators or spec not in self.indicators:
+            return None
+        return self._column(ticker, spec, daily=True)
+
+    def daily_bars(self, ticker: str) -> Bars:
+        """All materialized daily bars of ticker."""
+        return Bars(**{column: self._column(ticker, column, daily=True) for column in COLUMNS})
+
+    def append(self, df: pd.DataFrame):
+        """
+        Append rows of timestamp, ticker, open, high, low, close, volume.
+
+        Rows are sorted per ticker; they must all be newer than the bars
+        already stored for that ticker.
+        """
+        df = df.assign(timestamp=to_timestamps(df["timestamp"]))
+        for ticker, rows in df.groupby("ticker", sort=False):
+            rows = rows.sort_values("timestamp", kind="stable")
+            stored = self._column(ticker, "timestamp")
+            if len(stored) and rows["timestamp"].iloc[0] <= stored[-1]:
+                raise ValueError(f"Bars for {ticker} must be appended in timestamp order")
+
+            os.makedirs(os.path.join(self.path, ticker), exist_ok=True)
+            for column, dtype in COLUMNS.items():
+                with open(self._file(ticker, column), "ab") as f:
+                    f.write(rows[column].to_numpy(dtype=dtype).tobytes())
+            # Remap on next read so the new bars are visible
+            self._columns.pop(ticker, None)
+            if self.indicators is not None:
+                self._update_daily(ticker, int(rows["timestamp"].iloc[0]) // SECONDS_PER_DAY)
+
+    def bars(self, ticker: str, start: Optional[int] = None, end: Optional[int] = None) -> Bars:
+        """Bars of ticker with start <= timestamp < end, as views of the memory-mapped columns."""
+        timestamps = self._column(ticker, "timestamp")
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side="left"))
+        return self.slice(ticker, lo, hi)
+
+    def day_bounds(self, ticker: str, days: np.ndarray):
+        """First and one-past-last bar index of ticker for each day number in days."""
+        timestamps = self._column(ticker, "timestamp")
+        starts = np.searchsorted(timestamps, days * SECONDS_PER_DAY, side="left")
+        ends = np.searchsorted(timestamps, (days + 1) * SECONDS_PER_DAY, side="left")
+        return starts, ends
+
+    def slice(self, ticker: str, lo: int, hi: int) -> Bars:
+        """Bars lo:hi of ticker, as views of the memory-mapped columns."""
+        return Bars(**{column: self._column(ticker, column)[lo:hi] for column in COLUMNS})
+
+    def daily(
+        self,
+        ticker: str,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        chunk_bars: int = 1_000_000,
+    ) -> Bars:
+        """
+        Daily bars of ticker, read from the materialized daily bars if there
+        are any, otherwise aggregated from the stored bars reading at most
+        about chunk_bars bars (always whole days) into memory at a time.
+        """
+        start = None if start_date is None else day_number(start_date) * SECONDS_PER_DAY
+        end = None if end_date is None else (day_number(end_date) + 1) * SECONDS_PER_DAY
+        if self.indicators is not None:
+            daily = self.daily_bars(ticker)
+            lo = 0 if start is None else int(np.searchsorted(daily.timestamp, start))
+            hi = len(daily) if end is None else int(np.searchsorted(daily.timestamp, end))
+            return Bars(**{column: np.asarray(getattr(daily, column)[lo:hi]) for column in COLUMNS})
+        return self._aggregate_daily(self.bars(ticker, start, end), chunk_bars)
+
+    @staticmethod
+    def _aggregate_daily(bars: Bars, chunk_bars: int = 1_000_000) -> Bars:
+        chunks = []
+        lo = 0
+        while lo < len(bars):
+            hi = min(lo + chunk_bars, len(bars))
+            if hi < len(bars):
+                # End the chunk at a day boundary so no day is split; a single
+                # day longer than chunk_bars becomes its own chunk
+                day_start = (int(bars.timestamp[hi]) // SECONDS_PER_DAY) * SECONDS_PER_DAY
+                cut = int(np.searchsorted(bars.timestamp, day_start, side="left"))
+                if cut <= lo:
+                    cut = int(np.searchsorted(bars.timestamp, day_start + SECONDS_PER_DAY, side="left"))
+                hi = cut
+            chunk = Bars(**{column: getattr(bars, column)[lo:hi] for column in COLUMNS})
+            chunks.append(chunk.daily())
+            lo = hi
+
+        if not chunks:
+            return Bars(**{column: np.empty(0, dtype=dtype) for column, dtype in COLUMNS.items()})
+        return Bars(**{column: np.concatenate([getattr(c, column) for c in chunks]) for column in COLUMNS})
+
+    def daily_frame(
+        self,
+        tickers: Optional[Iterable[str]] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> pd.DataFrame:
+        """Daily bars as rows of date, ticker, open, close, high, low, volume, the format MarketData reads."""
+        frames = []
+        for ticker in tickers or self.tickers:
+            daily = self.daily(ticker, start_date, end_date)
+            frames.append(pd.DataFrame({
+                "date": (daily.timestamp // SECONDS_PER_DAY).astype("datetime64[D]").astype(str),
+                "ticker": ticker,
+                "open": daily.open,
+                "close": daily.close,
+                "high": daily.high,
+                "low": daily.low,
+                "volume": daily.volume.astype(np.int64),
+            }))
+        if not frames:
+            return pd.DataFrame(columns=["date", "ticker", "open", "close", "high", "low", "volume"])
+        return pd.concat(frames, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Append bars from a CSV file")
+    import_parser.add_argument("store")
+    import_parser.add_argument("csv")
+    import_parser.add_argument("--resolution", type=int, default=60, help="Seconds per bar for a new store")
+    import_parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    import_parser.add_argument(
+        "--indicators",
+        help='Materialize daily bars and these indicators, "default" or e.g. sma:20,rsi:14',
+    )
+    args = parser.parse_args(argv)
+
+    indicators = None
+    if args.indicators:
+        indicators = DEFAULT_INDICATORS if args.indicators == "default" else args.indicators.split(",")
+        indicators = list(indicators)
+    if os.path.exists(os.path.join(args.store, META_FILE)):
+        store = BarStore(args.store)
+        if indicators is not None and indicators != store.indicators:
+            store.materialize(indicators)
+            print(f"[BAR STORE] Materialized {', '.join(indicators)}")
+    else:
+        store = BarStore.create(args.store, args.resolution, indicators)
+    rows = 0
+    for chunk in pd.read_csv(args.csv, chunksize=args.chunk_rows):
+        store.append(chunk)
+        rows += len(chunk)
+        print(f"[BAR STORE] Imported {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional
+
+from backtester.back_tester import BackTester, Holdings, PositionRecord, Trade
+from backtester.environment import Environment
+from backtester.market_data import MarketData
+from backtester.portfolio_history import PortfolioChange
+from backtester.run_control import RunControl
+
+
+@dataclass
+class BatchResult:
+    trades: List[Trade]
+    holdings: Dict[date, Holdings]
+    error: Optional[str] = None
+    metrics: Optional[dict] = None
+    positions: List[PositionRecord] = field(default_factory=list)
+    portfolio_events: List[PortfolioChange] = field(default_factory=list)
+    usage: Optional[dict] = None
+
+
+# Set once per worker process by _init_worker so the shared market data is
+# pickled a single time per worker instead of once per environment
+_worker_market_data: Optional[MarketData] = None
+
+
+def _init_worker(market_data: MarketData):
+    global _worker_market_data
+    _worker_market_data = market_data
+
+
+def _run_one(
+    name: str,
+    env: Environment,
+    market_data: Optional[MarketData] = None,
+    control: Optional[RunControl] = None,
+    instrument: bool = False,
+):
+    tester = None
+    try:
+        tester = BackTester(
+            data_df=None,
+            env=env,
+            # Each environment sees only its own tickers' calendar, as if run alone
+            market_data=(market_data or _worker_market_data).for_tickers(env.tickers),
+            control=control,
+            instrument=instrument,
+        )
+        tester.backtest()
+        return name, BatchResult(
+            trades=tester.get_trades(),
+            holdings=tester.get_holdings(),
+            metrics=tester.get_metrics(),
+            positions=tester.get_positions(),
+            portfolio_events=tester.get_portfolio_events(),
+            usage=tester.get_usage(),
+        )
+    except Exception as e:
+        # What a failed run used until it failed still counts
+        usage = tester.get_usage() if tester is not None else None
+        return name, BatchResult(trades=[], holdings={}, error=f"{type(e).__name__}: {e}", usage=usage)
+
+
+def run_batch(
+    envs: Dict[str, Environment],
+    market_data: MarketData,
+    max_workers: Optional[int] = None,
+    control: Optional[RunControl] = None,
+    instrument: bool = False,
+) -> Dict[str, BatchResult]:
+    """
+    Backtest every environment in envs against the same market data, each on
+    a view of its own tickers.
+
+    Environments run in parallel worker processes; a failure in one environment
+    is reported in its BatchResult and does not stop the others. control's
+    budget applies to each environment separately.
+    """
+    if max_workers == 1 or len(envs) <= 1:
+        return dict(
+            _run_one(name, env, market_data, copy.deepcopy(control), instrument)
+            for name, env in envs.items()
+        )
+
+    results: Dict[str, BatchResult] = {}
+    # Spawn rather than fork: the API process has live threads (scheduler,
+    # warmup, server) whose locks a forked child could inherit while held
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(market_data,),
+    ) as executor:
+        futures = [
+            executor.submit(_run_one, name, env, None, control, instrument)
+            for name, env in envs.items()
+        ]
+        for future in futures:
+            name, result = future.result()
+            results[name] = result
+    return results
@@ -0,0 +1,169 @@
+"""
+Side-by-side comparison of several runs' stored return series.
+
+The series are aligned on one calendar as a (dates x runs) matrix, so every
+statistic is a handful of array operations however many runs are compared.
+"""
+from typing import Dict, List, Literal, Optional, Sequence
+
+import numpy as np
+
+from backtester.analytics import TRADING_DAYS_PER_YEAR
+
+
+Calendar = Literal["union", "intersection"]
+
+
+def align(
+    dates: Sequence[np.ndarray], cumulative_returns: Sequence[np.ndarray], calendar: Calendar = "union"
+) -> tuple:
+    """
+    Align runs on a common calendar.
+
+    Args:
+        dates (Sequence[np.ndarray]): Sorted datetime64[D] dates of each run
+        cumulative_returns (Sequence[np.ndarray]): Cumulative return of each run on its dates
+        calendar (str): "union" keeps every date of any run, "intersection" only dates all runs have
+
+    Returns:
+        (dates, matrix): The calendar and a (dates x runs) matrix of cumulative
+        returns. With "union" a run is forward-filled over dates it skips and
+        NaN before its first and after its last date.
+    """
+    counts = np.array([len(d) for d in dates])
+    if not len(counts) or not counts.sum():
+        return np.array([], dtype="datetime64[D]"), np.full((0, len(counts)), np.nan)
+
+    all_dates = np.concatenate(dates)
+    calendar_dates, rows = np.unique(all_dates, return_inverse=True)
+    columns = np.repeat(np.arange(len(counts)), counts)
+    matrix = np.full((len(calendar_dates), len(counts)), np.nan)
+    matrix[rows, columns] = np.concatenate(cumulative_returns)
+
+    present = ~np.isnan(matrix)
+    if calendar == "intersection":
+        keep = present.all(axis=1)
+        return calendar_dates[keep], matrix[keep]
+
+    # Forward-fill inside each run's span: index of the latest present row per cell
+    index = np.where(present, np.arange(len(matrix))[:, None], 0)
+    np.maximum.accumulate(index, axis=0, out=index)
+    filled = matrix[index, np.arange(matrix.shape[1])]
+    last = len(matrix) - 1 - np.argmax(present[::-1], axis=0)
+    filled[np.arange(len(matrix))[:, None] > last] = np.nan
+    return calendar_dates, filled
+
+
+def daily_returns(equity: np.ndarray) -> np.ndarray:
+    """Daily simple returns per column of a (dates x runs) equity matrix; NaN where either day is missing."""
+    previous = np.vstack((np.full((1, equity.shape[1]), np.nan), equity[:-1]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(previous != 0, equity / previous - 1, np.nan)
+
+
+def correlation(returns: np.ndarray, min_overlap: int = 2) -> np.ndarray:
+    """
+    Pairwise correlation of the columns of returns over the days both have a
+    value, as one set of matrix products instead of a loop over pairs. NaN
+    where two runs overlap on fewer than min_overlap days or one is constant.
+    """
+    present = (~np.isnan(returns)).astype(float)
+    values = np.nan_to_num(returns)
+    n = present.T @ present
+    # sums[i, j]: sum of run i's returns over the days run j also has one
+    sums = values.T @ present
+    squares = (values * values).T @ present
+    products = values.T @ values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = n * products - sums * sums.T
+        variance = n * squares - sums * sums
+        result = covariance / np.sqrt(variance * variance.T)
+    result[(n < min_overlap) | ~np.isfinite(result)] = np.nan
+    np.fill_diagonal(result, np.where(np.diag(n) >= min_overlap, 1.0, np.nan))
+    return np.clip(result, -1.0, 1.0)
+
+
+def drawdowns(equity: np.ndarray) -> np.ndarray:
+    """analytics.drawdown of every column of a (dates x runs) matrix; NaN where the equity is."""
+    # fmax skips the NaN before a run starts
+    peak = np.fmax.accumulate(equity, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = np.where(peak > 0, equity / peak - 1, 0.0)
+    result[np.isnan(equity)] = np.nan
+    return result
+
+
+def sample_index(steps: int, max_points: Optional[int]) -> np.ndarray:
+    """Up to max_points evenly spaced indexes of steps, always including the first and last."""
+    if max_points is None or steps <= max_points:
+        return np.arange(steps)
+    return np.unique(np.linspace(0, steps - 1, max_points).round().astype(int))
+
+
+def _nullable(matrix: np.ndarray) -> list:
+    """Nested lists of matrix with None for NaN, which JSON has no value for."""
+    values = matrix.astype(object)
+    values[np.isnan(matrix)] = None
+    return values.tolist()
+
+
+def _column_lists(matrix: np.ndarray, names: List[str]) -> Dict[str, list]:
+    return dict(zip(names, _nullable(matrix.T)))
+
+
+def compare(
+    names: List[str],
+    dates: Sequence[np.ndarray],
+    cumulative_returns: Sequence[np.ndarray],
+    baseline: Optional[str] = None,
+    calendar: Calendar = "union",
+    max_points: Optional[int] = 500,
+) -> dict:
+    """
+    Overlaid equity curves (growth of 1), drawdowns, drawdowns relative to a
+    baseline run, a correlation matrix of daily returns and per-run totals.
+
+    The relative drawdown of a run is the drawdown of its equity divided by
+    the baseline's: how far it has fallen behind its best standing against
+    the baseline (by default the first run). Curves are reported at up to
+    max_points dates; the statistics use every date.
+    """
+    baseline = baseline if baseline is not None else names[0]
+    calendar_dates, cumulative = align(dates, cumulative_returns, calendar)
+    equity = 1 + cumulative
+    returns = daily_returns(equity)
+    own_drawdowns = drawdowns(equity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative = equity / equity[:, [names.index(baseline)]]
+    relative[~np.isfinite(relative)] = np.nan
+    relative_drawdowns = drawdowns(relative)
+
+    index = sample_index(len(calendar_dates), max_points)
+    summary = {}
+    for j, name in enumerate(names):
+        present = np.flatnonzero(~np.isnan(equity[:, j]))
+        daily = returns[~np.isnan(returns[:, j]), j]
+        relative_present = ~np.isnan(relative_drawdowns[:, j])
+        summary[name] = {
+            "start_date": str(calendar_dates[present[0]]) if len(present) else None,
+            "end_date": str(calendar_dates[present[-1]]) if len(present) else None,
+            "total_return": float(cumulative[present[-1], j]) if len(present) else None,
+            "volatility": float(daily.std(ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR)) if len(daily) > 1 else None,
+            "max_drawdown": float(own_drawdowns[present, j].min()) if len(present) else None,
+            "max_relative_drawdown": (
+                float(relative_drawdowns[relative_present, j].min()) if relative_present.any() else None
+            ),
+        }
+
+    return {
+        "environments": names,
+        "baseline": baseline,
+        "calendar": calendar,
+        "trading_days": int(len(calendar_dates)),
+        "dates": [str(d) for d in calendar_dates[index]],
+        "equity": _column_lists(equity[index], names),
+        "drawdown": _column_lists(own_drawdowns[index], names),
+        "relative_drawdown": _column_lists(relative_drawdowns[index], names),
+        "correlation": _nullable(correlation(returns)),
+        "summary": summary,
+    }
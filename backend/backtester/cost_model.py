@@ -0,0 +1,79 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, asdict
+from datetime import date
+from enum import Enum
+from typing import List, Optional
+
+from backtester.environment import Environment
+
+
+# Rough wall-clock cost of one unit (one ticker, one trading day, one strategy
+# with no lookback) on the per-ticker engine. Calibrate with the benchmarks.
+DEFAULT_SECONDS_PER_UNIT = 2e-6
+
+
+@dataclass
+class CostEstimate:
+    tickers: int
+    trading_days: int
+    strategies: int
+    max_lookback: int
+    units: float
+    estimated_seconds: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def count_trading_days(trading_dates: List[date], start_date: date, end_date: date) -> int:
+    """Number of dates of the sorted calendar that fall in [start_date, end_date]."""
+    return max(0, bisect_right(trading_dates, end_date) - bisect_left(trading_dates, start_date))
+
+
+def estimate_cost(
+    env: Environment,
+    trading_dates: List[date],
+    seconds_per_unit: float = DEFAULT_SECONDS_PER_UNIT,
+) -> CostEstimate:
+    """
+    Predict the cost of backtesting env.
+
+    Every trading day each strategy is evaluated for every ticker and reads
+    lookback_days() bars of history, and all open positions are revalued, so
+    the cost is tickers x trading days x sum over strategies of (1 + lookback).
+    """
+    tickers = len(env.tickers)
+    trading_days = count_trading_days(trading_dates, env.start_date, env.end_date)
+    per_ticker_day = 1 + sum(1 + strategy.lookback_days() for strategy in env.strategies)
+    units = float(tickers * trading_days * per_ticker_day)
+    return CostEstimate(
+        tickers=tickers,
+        trading_days=trading_days,
+        strategies=len(env.strategies),
+        max_lookback=max((s.lookback_days() for s in env.strategies), default=0),
+        units=units,
+        estimated_seconds=units * seconds_per_unit,
+    )
+
+
+class Admission(Enum):
+    ADMIT = "admit"
+    LOW_PRIORITY = "low_priority"
+    REJECT = "reject"
+
+
+@dataclass
+class AdmissionPolicy:
+    """
+    Runs estimated above low_priority_units are queued behind normal runs and
+    runs above reject_units are refused outright. None disables a threshold.
+    """
+    low_priority_units: Optional[float] = None
+    reject_units: Optional[float] = None
+
+    def decide(self, estimate: CostEstimate) -> Admission:
+        if self.reject_units is not None and estimate.units > self.reject_units:
+            return Admission.REJECT
+        if self.low_priority_units is not None and estimate.units > self.low_priority_units:
+            return Admission.LOW_PRIORITY
+        return Admission.ADMIT
@@ -0,0 +1,142 @@
+"""
+Data coverage of a backtest's tickers and what to do about missing bars.
+
+coverage() is a (trading dates x tickers) bitmap of which bars exist, built
+once per run so gaps are found before simulating rather than by a
+ValueError halfway through. The environment's missing_data policy decides
+what happens to them:
+
+    abort   raise DataCoverageError listing the gaps (the default)
+    ffill   a missing bar is the previous bar's close; the ticker trades as usual
+    skip    the ticker is not traded that day; held positions are valued at the previous close
+"""
+from datetime import date
+from typing import Dict, List, Literal, Optional
+
+import numpy as np
+
+from backtester.bar_store import Bars, SECONDS_PER_DAY, day_number
+from backtester.market_data import MarketData, TickerData
+
+
+MissingDataPolicy = Literal["abort", "ffill", "skip"]
+POLICIES = ("abort", "ffill", "skip")
+
+
+class DataCoverageError(ValueError):
+    def __init__(self, gaps: Dict[str, List[date]]):
+        self.gaps = gaps
+        details = "; ".join(
+            f"{ticker}: {len(days)} days from {days[0]} to {days[-1]}" for ticker, days in gaps.items()
+        )
+        super().__init__(f"Missing bars for {details}")
+
+
+def coverage(market_data: MarketData, tickers: List[str]) -> np.ndarray:
+    """(trading dates x tickers) bitmap, True where the ticker has a bar with a close price."""
+    if not tickers:
+        return np.zeros((len(market_data.trading_dates), 0), dtype=bool)
+    return np.column_stack([~np.isnan(market_data.get_close_series(t)) for t in tickers])
+
+
+def find_gaps(
+    market_data: MarketData, tickers: List[str], available: np.ndarray, first_row: int, last_row: int
+) -> Dict[str, List[date]]:
+    """Trading dates in rows first_row..last_row on which each ticker has no bar."""
+    gaps = {}
+    missing = ~available[first_row:last_row + 1]
+    for j in np.flatnonzero(missing.any(axis=0)):
+        rows = np.flatnonzero(missing[:, j]) + first_row
+        gaps[tickers[j]] = [market_data.trading_dates[i] for i in rows]
+    return gaps
+
+
+def fill_rows(available: np.ndarray) -> np.ndarray:
+    """Per cell, the latest row at or before it where the ticker has a bar, -1 before its first bar."""
+    rows = np.where(available, np.arange(len(available))[:, None], -1)
+    return np.maximum.accumulate(rows, axis=0) if len(rows) else rows
+
+
+class FilledMarketData(MarketData):
+    def __init__(self, base: MarketData, tickers: List[str], available: Optional[np.ndarray] = None):
+        """
+        View of base in which every missing bar of tickers after their first
+        bar is a flat bar at the previous close with no volume.
+
+        Args:
+            base (MarketData): Market data with gaps
+            tickers (List[str]): Tickers to fill
+            available (np.ndarray, optional): coverage(base, tickers) if already computed
+        """
+        self.base = base
+        self.trading_dates = base.trading_dates
+        self._date_index = base._date_index
+        self.resolution = base.resolution
+
+        if available is None:
+            available = coverage(base, tickers)
+        fill = fill_rows(available)
+        gapped = np.flatnonzero(~available.all(axis=0))
+        self._available: Dict[str, np.ndarray] = {tickers[j]: available[:, j] for j in gapped}
+        self._fill: Dict[str, np.ndarray] = {tickers[j]: fill[:, j] for j in gapped}
+        self._series = {}
+        self._indicators = {}
+
+    def __getattr__(self, name):
+        # Anything specific to the base class (e.g. an intraday store)
+        if name == "base":
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    @property
+    def tickers(self) -> List[str]:
+        return self.base.tickers
+
+    def is_trading_date(self, check_date: date) -> bool:
+        return self.base.is_trading_date(check_date)
+
+    def get_close_series(self, ticker: str) -> np.ndarray:
+        return self.get_series("close", ticker)
+
+    def get_series(self, field: str, ticker: str) -> np.ndarray:
+        if ticker not in self._fill:
+            return self.base.get_series(field, ticker)
+        key = (field, ticker)
+        series = self._series.get(key)
+        if series is None:
+            fill = self._fill[ticker]
+            filled = ~self._available[ticker] & (fill >= 0)
+            series = np.where(fill >= 0, self.base.get_series(field, ticker)[fill], np.nan)
+            series[filled] = 0.0 if field == "volume" else self.base.get_close_series(ticker)[fill[filled]]
+            self._series[key] = series
+        return series
+
+    def get_indicator(self, name: str, ticker: str, *params) -> np.ndarray:
+        if ticker not in self._fill:
+            return self.base.get_indicator(name, ticker, *params)
+        return super().get_indicator(name, ticker, *params)
+
+    def _get_data(self, ticker: str, day: date) -> TickerData:
+        index = self._date_index.get(day)
+        if ticker not in self._fill or index is None or self._available[ticker][index]:
+            return self.base._get_data(ticker, day)
+        row = self._fill[ticker][index]
+        if row < 0:
+            raise ValueError(f"No data for {ticker} on {day}")
+        close = self.base.get_close_price(ticker, self.trading_dates[row])
+        return TickerData(open=close, close=close, high=close, low=close, volume=0)
+
+    def get_bars(self, ticker: str, day: date) -> Bars:
+        index = self._date_index.get(day)
+        if ticker not in self._fill or index is None or self._available[ticker][index]:
+            return self.base.get_bars(ticker, day)
+        # One flat bar at the previous close for a filled day
+        close = self._get_data(ticker, day).close
+        return Bars(
+            timestamp=np.array([day_number(day) * SECONDS_PER_DAY], dtype=np.int64),
+            open=np.array([close]),
+            high=np.array([close]),
+            low=np.array([close]),
+            close=np.array([close]),
+            volume=np.array([0.0]),
+        )
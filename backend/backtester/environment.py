@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Literal
 from backtester.strategies.base_strategy import Strategy
 from datetime import date
 
@@ -11,3 +11,5 @@ class Environment:
     end_date: date
     cash: float
     strategies: List[Strategy]
+    # What to do about missing bars of tickers during the run, see backtester.coverage
+    missing_data: Literal["abort", "ffill", "skip"] = "abort"
@@ -0,0 +1,248 @@
+"""
+Entry rules written as expressions, e.g.
+
+    close < sma(close, 20) * 0.95 and rsi(close, 14) < 30
+
+An expression is parsed with ast, checked against a whitelist of syntax,
+series and functions (nothing is ever passed to eval) and compiled to a plan:
+a list of NumPy steps over whole series in which identical subexpressions
+appear, and are computed, only once.
+
+Series are aligned to MarketData.trading_dates and every value at row i is
+known at the close of day i, so sma(close, 20) includes that day's close.
+Use shift(x, n) to refer to n trading days earlier.
+"""
+import ast
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from backtester import indicators
+
+
+SERIES = ("open", "high", "low", "close", "volume")
+
+# name -> (number of series arguments, number of integer window arguments)
+FUNCTIONS: Dict[str, Tuple[int, int]] = {
+    "sma": (1, 1),
+    "rsi": (1, 1),
+    "momentum": (1, 1),
+    "shift": (1, 1),
+    "abs": (1, 0),
+    "min": (2, 0),
+    "max": (2, 0),
+}
+
+_BINARY = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+}
+_COMPARE = {
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+MAX_LENGTH = 1000
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def _shift(values: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if n < len(values):
+        out[n:] = values[:len(values) - n]
+    return out
+
+
+_FUNCTION_IMPLEMENTATIONS: Dict[str, Callable] = {
+    "sma": lambda x, n: indicators.sma(x, n),
+    "rsi": lambda x, n: indicators.rsi(x, n),
+    "momentum": lambda x, n: indicators.momentum(x, n),
+    "shift": _shift,
+    "abs": np.abs,
+    "min": np.fmin,
+    "max": np.fmax,
+}
+
+
+@dataclass(frozen=True)
+class Step:
+    """One node of the plan; args are indices of earlier steps, params are constants."""
+    op: str
+    args: Tuple[int, ...] = ()
+    params: Tuple = ()
+
+
+class CompiledExpression:
+    def __init__(self, source: str):
+        """
+        Parse and compile an entry rule.
+
+        Raises:
+            ExpressionError: If the expression uses anything outside the whitelist
+        """
+        if len(source) > MAX_LENGTH:
+            raise ExpressionError(f"Expression is longer than {MAX_LENGTH} characters")
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ExpressionError(f"Invalid expression: {e.msg}")
+
+        self.source = source
+        self.steps: List[Step] = []
+        self._index: Dict[Step, int] = {}
+        self._lookback: List[int] = []
+        self.root = self._compile(tree.body)
+        if self.steps[self.root].op not in ("compare", "and", "or", "not"):
+            raise ExpressionError("Expression must be a condition, e.g. close < sma(close, 20)")
+
+    def _add(self, step: Step, lookback: int) -> int:
+        # Identical subexpressions map to the same step, so they run once
+        index = self._index.get(step)
+        if index is None:
+            index = len(self.steps)
+            self.steps.append(step)
+            self._index[step] = index
+            self._lookback.append(lookback)
+        return index
+
+    def _lookback_of(self, args: Tuple[int, ...]) -> int:
+        return max((self._lookback[a] for a in args), default=0)
+
+    def _compile(self, node: ast.AST) -> int:
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ExpressionError(f"Unsupported constant {node.value!r}")
+            return self._add(Step("constant", params=(float(node.value),)), 0)
+
+        if isinstance(node, ast.Name):
+            if node.id not in SERIES:
+                raise ExpressionError(f"Unknown series {node.id}, expected one of {', '.join(SERIES)}")
+            return self._add(Step("series", params=(node.id,)), 0)
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._compile(node.operand)
+            if isinstance(node.op, ast.Not):
+                return self._add(Step("not", (operand,)), self._lookback_of((operand,)))
+            if isinstance(node.op, ast.USub):
+                return self._add(Step("negative", (operand,)), self._lookback_of((operand,)))
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            raise ExpressionError(f"Unsupported operator {type(node.op).__name__}")
+
+        if isinstance(node, ast.BinOp):
+            if type(node.op) not in _BINARY:
+                raise ExpressionError(f"Unsupported operator {type(node.op).__name__}")
+            args = (self._compile(node.left), self._compile(node.right))
+            return self._add(Step(type(node.op).__name__, args), self._lookback_of(args))
+
+        if isinstance(node, ast.BoolOp):
+            op = "and" if isinstance(node.op, ast.And) else "or"
+            args = tuple(self._compile(value) for value in node.values)
+            return self._add(Step(op, args), self._lookback_of(args))
+
+        if isinstance(node, ast.Compare):
+            # a < b < c is (a < b) and (b < c)
+            operands = [self._compile(node.left)] + [self._compile(c) for c in node.comparators]
+            comparisons = []
+            for op, left, right in zip(node.ops, operands, operands[1:]):
+                if type(op) not in _COMPARE:
+                    raise ExpressionError(f"Unsupported comparison {type(op).__name__}")
+                args = (left, right)
+                comparisons.append(self._add(Step("compare", args, (type(op).__name__,)), self._lookback_of(args)))
+            if len(comparisons) == 1:
+                return comparisons[0]
+            args = tuple(comparisons)
+            return self._add(Step("and", args), self._lookback_of(args))
+
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                name = getattr(node.func, "id", None) or ast.unparse(node.func)
+                raise ExpressionError(f"Unknown function {name}, expected one of {', '.join(FUNCTIONS)}")
+            if node.keywords:
+                raise ExpressionError(f"{node.func.id} does not take keyword arguments")
+            n_series, n_windows = FUNCTIONS[node.func.id]
+            if len(node.args) != n_series + n_windows:
+                raise ExpressionError(f"{node.func.id} takes {n_series + n_windows} arguments")
+
+            args = tuple(self._compile(arg) for arg in node.args[:n_series])
+            windows = []
+            for arg in node.args[n_series:]:
+                if not (isinstance(arg, ast.Constant) and type(arg.value) is int and arg.value > 0):
+                    raise ExpressionError(f"The window of {node.func.id} must be a positive whole number")
+                windows.append(arg.value)
+            return self._add(
+                Step("call", args, (node.func.id, *windows)),
+                self._lookback_of(args) + sum(windows),
+            )
+
+        raise ExpressionError(f"Unsupported syntax {type(node).__name__}")
+
+    @property
+    def lookback_days(self) -> int:
+        """Trading days of history before a row that the expression reads."""
+        return self._lookback[self.root]
+
+    def indicator_calls(self) -> List[Tuple[str, str, Tuple[int, ...]]]:
+        """(function, series, windows) of indicator calls applied directly to a raw series."""
+        calls = []
+        for step in self.steps:
+            if step.op == "call" and step.params[0] in indicators.INDICATORS:
+                source = self.steps[step.args[0]]
+                if source.op == "series":
+                    calls.append((step.params[0], source.params[0], tuple(step.params[1:])))
+        return calls
+
+    def evaluate(
+        self,
+        series: Callable[[str], np.ndarray],
+        indicator: Callable[[str, str, Tuple[int, ...]], np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Evaluate the plan over whole series and return the boolean result.
+
+        Args:
+            series: Returns the named raw series (open, high, low, close, volume)
+            indicator: Optional cache lookup for indicator(function, series name, windows)
+                applied directly to a raw series, e.g. MarketData.get_indicator
+        """
+        values: List[np.ndarray] = []
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for step in self.steps:
+                values.append(self._run(step, values, series, indicator))
+        return np.asarray(values[self.root], dtype=bool)
+
+    def _run(self, step: Step, values, series, indicator):
+        args = [values[a] for a in step.args]
+        if step.op == "constant":
+            return step.params[0]
+        if step.op == "series":
+            return np.asarray(series(step.params[0]), dtype=float)
+        if step.op == "negative":
+            return np.negative(args[0])
+        if step.op == "not":
+            return np.logical_not(args[0])
+        if step.op in ("and", "or"):
+            combine = np.logical_and if step.op == "and" else np.logical_or
+            result = args[0]
+            for arg in args[1:]:
+                result = combine(result, arg)
+            return result
+        if step.op == "compare":
+            return _COMPARE[getattr(ast, step.params[0])](args[0], args[1])
+        if step.op == "call":
+            name, windows = step.params[0], step.params[1:]
+            source = self.steps[step.args[0]]
+            if indicator is not None and name in indicators.INDICATORS and source.op == "series":
+                return indicator(name, source.params[0], windows)
+            return _FUNCTION_IMPLEMENTATIONS[name](*args, *windows)
+        return _BINARY[getattr(ast, step.op)](args[0], args[1])
@@ -0,0 +1,211 @@
+import math
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Optional
+
+
+def sma(values: np.ndarray, window: int, min_periods: Optional[int] = None) -> np.ndarray:
+    """
+    Trailing simple moving average; out[i] is the mean of values[i - window + 1 : i + 1].
+
+    With min_periods set, the first window - 1 entries average whatever history
+    exists (at least min_periods values) instead of being NaN. Any NaN inside a
+    window makes that entry NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    out = np.full(n, np.nan)
+    if min_periods is None:
+        min_periods = window
+    if n == 0 or window <= 0:
+        return out
+
+    if n >= window:
+        out[window - 1:] = sliding_window_view(values, window).mean(axis=1)
+
+    # Partial windows at the start of the series
+    for i in range(max(min_periods, 1) - 1, min(window - 1, n)):
+        out[i] = values[: i + 1].mean()
+
+    return out
+
+
+def rsi(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    RSI with simple averages; out[i] uses the period price changes ending at values[i].
+
+    Entries with fewer than period changes of history are NaN. A window with
+    no losses has an RSI of 100.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    out = np.full(n, np.nan)
+    if n <= period or period <= 0:
+        return out
+
+    changes = np.diff(values)
+    windows = sliding_window_view(changes, period)
+    avg_gain = np.where(windows > 0, windows, 0.0).mean(axis=1)
+    avg_loss = np.where(windows < 0, -windows, 0.0).mean(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        values_rsi = 100 - (100 / (1 + rs))
+    values_rsi = np.where(avg_loss == 0, 100.0, values_rsi)
+    # Keep NaN from missing prices instead of turning them into 100
+    values_rsi = np.where(np.isnan(windows).any(axis=1), np.nan, values_rsi)
+
+    out[period:] = values_rsi
+    return out
+
+
+def momentum(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Rate of change over window bars; out[i] is values[i] / values[i - window] - 1.
+
+    The first window entries are NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.full(len(values), np.nan)
+    if window <= 0 or len(values) <= window:
+        return out
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[window:] = values[window:] / values[:-window] - 1
+    return out
+
+
+INDICATORS = {
+    "sma": sma,
+    "rsi": rsi,
+    "momentum": momentum,
+}
+
+
+class OnlineSMA:
+    """
+    sma() one value at a time in O(1): update(x) returns the entry of sma()
+    for a series that ends with x.
+    """
+
+    def __init__(self, window: int, min_periods: Optional[int] = None):
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self._values = deque(maxlen=window)
+        self._sum = 0.0
+        self._nans = 0
+        self._updates = 0
+
+    def update(self, value: float) -> float:
+        if len(self._values) == self.window:
+            self._remove(self._values[0])
+        self._values.append(value)
+        if math.isnan(value):
+            self._nans += 1
+        else:
+            self._sum += value
+
+        # Re-add the window now and then so rounding errors of the running sum never pile up
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self._sum = sum(v for v in self._values if not math.isnan(v))
+
+        if self._nans or len(self._values) < max(self.min_periods, 1):
+            return np.nan
+        return self._sum / len(self._values)
+
+    def _remove(self, value: float):
+        if math.isnan(value):
+            self._nans -= 1
+        else:
+            self._sum -= value
+
+
+class OnlineRSI:
+    """rsi() one value at a time in O(1)."""
+
+    def __init__(self, period: int):
+        self.period = period
+        self._changes = deque(maxlen=period)
+        self._gain = 0.0
+        self._loss = 0.0
+        self._nans = 0
+        self._previous: Optional[float] = None
+        self._updates = 0
+
+    def update(self, value: float) -> float:
+        if self._previous is None:
+            self._previous = value
+            return np.nan
+        change = value - self._previous
+        self._previous = value
+
+        if len(self._changes) == self.period:
+            self._remove(self._changes[0])
+        self._changes.append(change)
+        if math.isnan(change):
+            self._nans += 1
+        elif change > 0:
+            self._gain += change
+        else:
+            self._loss -= change
+
+        self._updates += 1
+        if self._updates % self.period == 0:
+            self._gain = sum(c for c in self._changes if c > 0)
+            self._loss = -sum(c for c in self._changes if c < 0)
+
+        if self._nans or len(self._changes) < self.period:
+            return np.nan
+        if self._loss <= 0:
+            return 100.0
+        rs = (self._gain / self.period) / (self._loss / self.period)
+        return 100 - (100 / (1 + rs))
+
+    def _remove(self, change: float):
+        if math.isnan(change):
+            self._nans -= 1
+        elif change > 0:
+            self._gain -= change
+        else:
+            self._loss += change
+
+
+class OnlineMomentum:
+    """momentum() one value at a time in O(1)."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._values = deque(maxlen=window + 1)
+
+    def update(self, value: float) -> float:
+        self._values.append(value)
+        if len(self._values) <= self.window:
+            return np.nan
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return float(np.float64(value) / self._values[0] - 1)
+
+
+ONLINE_INDICATORS = {
+    "sma": OnlineSMA,
+    "rsi": OnlineRSI,
+    "momentum": OnlineMomentum,
+}
+
+
+def online(name: str, *params):
+    """Online counterpart of compute(name, values, *params), fed one value at a time with update()."""
+    try:
+        indicator = ONLINE_INDICATORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown indicator {name}")
+    return indicator(*params)
+
+
+def compute(name: str, values: np.ndarray, *params) -> np.ndarray:
+    try:
+        indicator = INDICATORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown indicator {name}")
+    return indicator(values, *params)
@@ -0,0 +1,116 @@
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List
+
+import numpy as np
+
+
+# Phases timed inside BackTester.backtest. portfolio_value is also called from
+# position entry and from snapshot, so those phases include part of its time.
+PHASES = ("should_enter", "liquidation_check", "liquidation", "portfolio_value", "snapshot")
+
+
+@dataclass
+class PhaseStats:
+    calls: int = 0
+    total_s: float = 0.0
+    per_day_s: List[float] = field(default_factory=list)
+
+
+@dataclass
+class StrategyStats:
+    calls: int = 0
+    total_s: float = 0.0
+    positions_opened: int = 0
+    positions_closed: int = 0
+
+
+class BacktestMetrics:
+    """
+    Opt-in counters and timers for one backtest.
+
+    BackTester calls add() around each hot-path phase and end_day() after each
+    trading day, so per-day percentiles can be reported without storing every
+    individual call.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, PhaseStats] = {name: PhaseStats() for name in PHASES}
+        self.strategies: Dict[str, StrategyStats] = defaultdict(StrategyStats)
+        self.trading_days = 0
+        self.positions_opened = 0
+        self.positions_closed = 0
+        self._today: Dict[str, float] = defaultdict(float)
+
+    def add(self, phase: str, seconds: float):
+        stats = self.phases[phase]
+        stats.calls += 1
+        stats.total_s += seconds
+        self._today[phase] += seconds
+
+    def add_strategy_call(self, strategy: str, seconds: float, calls: int = 1):
+        stats = self.strategies[strategy]
+        stats.calls += calls
+        stats.total_s += seconds
+
+    def position_opened(self, strategy: str):
+        self.positions_opened += 1
+        self.strategies[strategy].positions_opened += 1
+
+    def position_closed(self, strategy: str):
+        self.positions_closed += 1
+        self.strategies[strategy].positions_closed += 1
+
+    def end_day(self):
+        self.trading_days += 1
+        for name, stats in self.phases.items():
+            stats.per_day_s.append(self._today.get(name, 0.0))
+        self._today.clear()
+
+    def to_dict(self) -> dict:
+        phases = {}
+        for name, stats in self.phases.items():
+            per_day = np.asarray(stats.per_day_s) if stats.per_day_s else np.zeros(1)
+            phases[name] = {
+                "calls": stats.calls,
+                "total_s": stats.total_s,
+                "p50_per_day_s": float(np.percentile(per_day, 50)),
+                "p99_per_day_s": float(np.percentile(per_day, 99)),
+            }
+        return {
+            "trading_days": self.trading_days,
+            "positions_opened": self.positions_opened,
+            "positions_closed": self.positions_closed,
+            "phases": phases,
+            "strategies": {
+                name: {
+                    "calls": stats.calls,
+                    "total_s": stats.total_s,
+                    "positions_opened": stats.positions_opened,
+                    "positions_closed": stats.positions_closed,
+                }
+                for name, stats in self.strategies.items()
+            },
+        }
+
+
+@dataclass
+class RunUsage:
+    """
+    Resources one backtest used. Unlike BacktestMetrics these are always
+    collected: they are a handful of counters, and quotas are charged from them.
+
+    cpu_s is the CPU time of the thread that ran the backtest. peak_rss_mb is
+    the most the process's resident size grew past what it was when the
+    backtest started, sampled every RunControl.MEMORY_CHECK_INTERVAL trading
+    days.
+    """
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    peak_rss_mb: float = 0.0
+    trading_days: int = 0
+    strategy_calls: int = 0
+    positions_opened: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
@@ -1,8 +1,10 @@
 import pandas as pd
-from environment import Environment
-from back_tester import BackTester
+from backtester.environment import Environment
+from backtester.back_tester import BackTester
+from backtester.strategies.percentage_sma_strategy import PercentageSMAStrategy
 from datetime import date
 
+# Run from the backend directory: python -m backtester.main
 data_df = pd.read_csv("./backtester/data.csv")
 
 env = Environment(
@@ -11,8 +13,9 @@ env = Environment(
     end_date=date(2025, 4, 16),
     cash=1000,
     strategies=
-    [ExampleStrategy(
-        days=20, exposure=0.05, liquidate_above=1.05, liquidate_below=0.95
+    [PercentageSMAStrategy(
+        days=20, percentage_change=5, direction="drop", position_type="long",
+        stop_loss_pct=5, take_profit_pct=5
     )],
 )
 
@@ -1,8 +1,12 @@
+import numpy as np
 import pandas as pd
 from datetime import date
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from dataclasses import dataclass
 
+from backtester import indicators
+from backtester.bar_store import BarStore, Bars, SECONDS_PER_DAY, day_number, materialized_history
+
 
 @dataclass(frozen=True)
 class TickerData:
@@ -14,7 +18,25 @@ class TickerData:
 
 
 class MarketData:
-    def __init__(self, all_data_df: pd.DataFrame, tickers: Optional[List[str]] = None):
+    # Seconds per bar returned by get_bars; None when only daily bars exist
+    resolution: Optional[int] = None
+
+    def __init__(
+        self,
+        all_data_df: pd.DataFrame,
+        tickers: Optional[List[str]] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        lookback: int = 0,
+    ):
+        """
+        Args:
+            all_data_df (pd.DataFrame): Rows of date, ticker, open, close, high, low, volume
+            tickers (List[str], optional): Only keep these tickers
+            start_date (date, optional): Drop bars before this date, except for the lookback window
+            end_date (date, optional): Drop bars after this date
+            lookback (int): Number of trading days to keep before start_date
+        """
         self.data: Dict[date, Dict[str, TickerData]] = {}
         self.trading_dates: List[date] = []
 
@@ -22,6 +44,13 @@ class MarketData:
         df["date"] = pd.to_datetime(df["date"]).dt.date
         if tickers:
             df = df[df["ticker"].isin(tickers)]
+        if end_date is not None:
+            df = df[df["date"] <= end_date]
+        if start_date is not None:
+            dates = sorted(df["date"].unique())
+            first = next((i for i, d in enumerate(dates) if d >= start_date), len(dates))
+            if first > 0:
+                df = df[df["date"] >= dates[max(0, first - lookback)]]
 
         for row in df.itertuples(index=False):
             d = row.date
@@ -41,6 +70,101 @@ class MarketData:
 
         self.trading_dates.sort()
 
+        self._date_index: Dict[date, int] = {d: i for i, d in enumerate(self.trading_dates)}
+        # Close series of every ticker at once, aligned to trading_dates; far
+        # cheaper than building each one from the per-day dicts
+        closes = (
+            df.drop_duplicates(["date", "ticker"], keep="last")
+            .pivot(index="date", columns="ticker", values="close")
+            .reindex(self.trading_dates)
+        )
+        self._close_series: Dict[str, np.ndarray] = {
+            ticker: closes[ticker].to_numpy(dtype=float) for ticker in closes.columns
+        }
+        self._series: Dict[Tuple[str, str], np.ndarray] = {}
+        self._indicators: Dict[Tuple, np.ndarray] = {}
+
+    @property
+    def tickers(self) -> List[str]:
+        return sorted({t for bars in self.data.values() for t in bars})
+
+    def __getstate__(self):
+        # Cached views are rebuilt on demand rather than pickled along
+        state = self.__dict__.copy()
+        state.pop("_views", None)
+        return state
+
+    def for_tickers(self, tickers: List[str]) -> "MarketData":
+        """
+        View of this market data restricted to tickers, on the calendar of the
+        days at least one of them has a bar: what MarketData(df, tickers) builds
+        from the same rows. Views are cached, so indicators computed on one are
+        reused by later backtests of the same tickers.
+        """
+        if not tickers:
+            return self
+        key = tuple(sorted(set(tickers)))
+        views = self.__dict__.setdefault("_views", {})
+        view = views.get(key)
+        if view is None:
+            view = views[key] = TickerView(self, list(key))
+        return view
+
+    def has_bars(self, ticker: str) -> np.ndarray:
+        """Boolean array aligned to trading_dates, True where ticker has a bar."""
+        return np.array([ticker in self.data[d] for d in self.trading_dates], dtype=bool)
+
+    def date_index(self, day: date) -> Optional[int]:
+        """Position of day in trading_dates, or None if it is not a trading date."""
+        return self._date_index.get(day)
+
+    def date_rows(self, days: List[date]) -> np.ndarray:
+        """Positions of days in trading_dates as an int array, -1 where a day is not a trading date."""
+        return np.array([self._date_index.get(day, -1) for day in days], dtype=int)
+
+    def get_close_series(self, ticker: str) -> np.ndarray:
+        """Close prices of ticker aligned to trading_dates, NaN where it has no bar."""
+        series = self._close_series.get(ticker)
+        if series is None:
+            series = np.array(
+                [
+                    self.data[d][ticker].close if ticker in self.data[d] else np.nan
+                    for d in self.trading_dates
+                ],
+                dtype=float,
+            )
+            self._close_series[ticker] = series
+        return series
+
+    def get_series(self, field: str, ticker: str) -> np.ndarray:
+        """open, high, low, close or volume of ticker aligned to trading_dates, NaN where it has no bar."""
+        if field == "close":
+            return self.get_close_series(ticker)
+        key = (field, ticker)
+        series = self._series.get(key)
+        if series is None:
+            series = np.array(
+                [
+                    getattr(self.data[d][ticker], field) if ticker in self.data[d] else np.nan
+                    for d in self.trading_dates
+                ],
+                dtype=float,
+            )
+            self._series[key] = series
+        return series
+
+    def get_indicator(self, name: str, ticker: str, *params) -> np.ndarray:
+        """
+        Indicator series of ticker's closes aligned to trading_dates, computed
+        once per (name, ticker, params) and cached for later backtests.
+        """
+        key = (name, ticker) + params
+        series = self._indicators.get(key)
+        if series is None:
+            series = indicators.compute(name, self.get_close_series(ticker), *params)
+            self._indicators[key] = series
+        return series
+
     def get_trading_dates_before(self, target_date: date, n: int) -> List[date]:
         before = [d for d in self.trading_dates if d < target_date]
         return before[-n:] if len(before) >= n else before
@@ -68,3 +192,161 @@ class MarketData:
 
     def get_volume(self, ticker: str, day: date) -> int:
         return self._get_data(ticker, day).volume
+
+
+class TickerView(MarketData):
+    def __init__(self, base: MarketData, tickers: List[str]):
+        """
+        Market data of some of base's tickers, on the trading dates where at
+        least one of them has a bar. Built with MarketData.for_tickers.
+
+        Args:
+            base (MarketData): Market data of all tickers
+            tickers (List[str]): Tickers to keep
+        """
+        self.base = base
+        self.resolution = base.resolution
+        present = np.column_stack([base.has_bars(t) for t in tickers])
+        self._rows = np.flatnonzero(present.any(axis=1))
+        self._tickers = [t for j, t in enumerate(tickers) if present[:, j].any()]
+        self.trading_dates: List[date] = [base.trading_dates[i] for i in self._rows]
+        self._date_index: Dict[date, int] = {d: i for i, d in enumerate(self.trading_dates)}
+        self._series: Dict[Tuple[str, str], np.ndarray] = {}
+        self._indicators: Dict[Tuple, np.ndarray] = {}
+
+    def __getattr__(self, name):
+        # Anything specific to the base class (e.g. an intraday store)
+        if name == "base":
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    @property
+    def tickers(self) -> List[str]:
+        return list(self._tickers)
+
+    def for_tickers(self, tickers: List[str]) -> MarketData:
+        return self.base.for_tickers(tickers)
+
+    def has_bars(self, ticker: str) -> np.ndarray:
+        if ticker not in self._tickers:
+            return np.zeros(len(self.trading_dates), dtype=bool)
+        return self.base.has_bars(ticker)[self._rows]
+
+    def is_trading_date(self, check_date: date) -> bool:
+        return check_date in self._date_index
+
+    def get_close_series(self, ticker: str) -> np.ndarray:
+        return self.get_series("close", ticker)
+
+    def get_series(self, field: str, ticker: str) -> np.ndarray:
+        key = (field, ticker)
+        series = self._series.get(key)
+        if series is None:
+            if ticker in self._tickers:
+                series = np.asarray(self.base.get_series(field, ticker), dtype=float)[self._rows]
+            else:
+                series = np.full(len(self.trading_dates), np.nan)
+            self._series[key] = series
+        return series
+
+    def _get_data(self, ticker: str, day: date) -> TickerData:
+        if ticker not in self._tickers or day not in self._date_index:
+            raise ValueError(f"No data for {ticker} on {day}")
+        return self.base._get_data(ticker, day)
+
+    def get_bars(self, ticker: str, day: date) -> Bars:
+        if ticker not in self._tickers or day not in self._date_index:
+            raise ValueError(f"No data for {ticker} on {day}")
+        return self.base.get_bars(ticker, day)
+
+
+class IntradayMarketData(MarketData):
+    def __init__(
+        self,
+        store: BarStore,
+        tickers: Optional[List[str]] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        lookback: int = 0,
+        resolution: Optional[int] = None,
+    ):
+        """
+        Daily market data aggregated on the fly from intraday bars, which stay
+        in the memory-mapped store and are read a day at a time with get_bars.
+
+        Args:
+            store (BarStore): Intraday bar store
+            tickers (List[str], optional): Only keep these tickers
+            start_date (date, optional): Drop bars before this date, except for the lookback window
+            end_date (date, optional): Drop bars after this date
+            lookback (int): Number of trading days to keep before start_date
+            resolution (int, optional): Seconds per bar of get_bars, a multiple of the store's resolution
+        """
+        resolution = resolution or store.resolution
+        if resolution % store.resolution:
+            raise ValueError(f"Resolution {resolution}s is not a multiple of the store's {store.resolution}s bars")
+        self.store = store
+        self.resolution = resolution
+
+        super().__init__(store.daily_frame(tickers, None, end_date), tickers, start_date, end_date, lookback)
+
+        days = np.array([day_number(d) for d in self.trading_dates], dtype=np.int64)
+        self._days = days
+        self._day_bounds: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            ticker: store.day_bounds(ticker, days) for ticker in self.tickers
+        }
+
+    def get_indicator(self, name: str, ticker: str, *params) -> np.ndarray:
+        """
+        Like MarketData.get_indicator, but SMAs and RSIs the store materialized
+        at ingestion are read instead of computed.
+        """
+        key = (name, ticker) + params
+        if key not in self._indicators:
+            series = self._materialized_indicator(name, ticker, params)
+            if series is not None:
+                self._indicators[key] = series
+        return super().get_indicator(name, ticker, *params)
+
+    def _materialized_indicator(self, name: str, ticker: str, params: tuple) -> Optional[np.ndarray]:
+        if name == "sma" and params and params[1:] in ((), (1,)):
+            spec = f"sma:{params[0]}"
+        elif name == "rsi" and len(params) == 1:
+            spec = f"rsi:{params[0]}"
+        else:
+            return None
+        stored = self.store.indicator(ticker, spec)
+        if stored is None or ticker not in self._day_bounds:
+            return None
+
+        # Align the ticker's own daily rows to trading_dates
+        stored_days = np.asarray(self.store.daily_bars(ticker).timestamp) // SECONDS_PER_DAY
+        rows = np.searchsorted(stored_days, self._days)
+        present = rows < len(stored_days)
+        present[present] = stored_days[rows[present]] == self._days[present]
+        series = np.full(len(self._days), np.nan)
+        series[present] = stored[rows[present]]
+
+        # A computed indicator is NaN wherever its window covers a day the
+        # ticker has no bar; keep that so gaps are still reported
+        history = materialized_history(spec)
+        missing = np.concatenate(([0], np.cumsum(np.isnan(self.get_close_series(ticker)))))
+        index = np.arange(len(self._days))
+        series[missing[index + 1] - missing[np.maximum(index + 1 - history, 0)] > 0] = np.nan
+        if name == "sma" and len(params) == 1:
+            # Without min_periods an SMA needs a full window of history
+            series[present & (rows < params[0] - 1)] = np.nan
+        return series
+
+    def get_bars(self, ticker: str, day: date) -> Bars:
+        """Bars of ticker on day at this market data's resolution."""
+        index = self.date_index(day)
+        if index is None or ticker not in self._day_bounds:
+            raise ValueError(f"No data for {ticker} on {day}")
+        starts, ends = self._day_bounds[ticker]
+        bars = self.store.slice(ticker, int(starts[index]), int(ends[index]))
+        if len(bars) == 0:
+            raise ValueError(f"No data for {ticker} on {day}")
+        if self.resolution != self.store.resolution:
+            bars = bars.resample(self.resolution)
+        return bars
@@ -0,0 +1,424 @@
+import inspect
+import itertools
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backtester.analytics import compute_summary
+from backtester.back_tester import BackTester
+from backtester.environment import Environment
+from backtester.market_data import MarketData
+from backtester.strategies.base_strategy import Strategy
+from backtester.strategies.expression_strategy import ExpressionStrategy
+from backtester.strategies.percentage_sma_strategy import PercentageSMAStrategy
+from backtester.strategies.ranking_strategy import RankingStrategy
+from backtester.strategies.rsi_strategy import RSIStrategy
+
+
+# Strategies whose parameters can be searched, by their API type name
+STRATEGY_CLASSES = {
+    "PercentageSMAStrategy": PercentageSMAStrategy,
+    "RSIStrategy": RSIStrategy,
+    "RankingStrategy": RankingStrategy,
+    "ExpressionStrategy": ExpressionStrategy,
+}
+
+METRICS = ("sharpe", "sortino", "total_return", "cagr")
+
+
+def expand_grid(param_grid: Dict[str, List]) -> List[dict]:
+    """All combinations of a {parameter: [values]} grid, in a stable order."""
+    names = sorted(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[n] for n in names))]
+
+
+def _strategy_class(strategy_type: str):
+    try:
+        return STRATEGY_CLASSES[strategy_type]
+    except KeyError:
+        raise ValueError(f"Cannot optimize strategy type {strategy_type}")
+
+
+def strategy_params(strategy_type: str, stored: dict) -> dict:
+    """Constructor arguments of strategy_type found in a stored strategy document."""
+    names = set(inspect.signature(_strategy_class(strategy_type)).parameters) - {"name", "type"}
+    return {k: v for k, v in stored.items() if k in names}
+
+
+def make_strategy(strategy_type: str, params: dict) -> Strategy:
+    strategy_class = _strategy_class(strategy_type)
+    return strategy_class(**{**params, "type": strategy_type})
+
+
+def score(summary: dict, metric: str) -> float:
+    """Metric value to maximize; runs where it is undefined rank last."""
+    value = summary.get(metric)
+    if value is None or not math.isfinite(value):
+        return -math.inf
+    return value
+
+
+# Set once per worker process by _init_worker so market data and its
+# precomputed indicator series are pickled once per worker, not once per task
+_worker_market_data: Optional[MarketData] = None
+
+
+def _init_worker(market_data: MarketData):
+    global _worker_market_data
+    _worker_market_data = market_data
+
+
+def _evaluate(
+    tickers: List[str],
+    start_date: date,
+    end_date: date,
+    cash: float,
+    strategy_type: str,
+    params: dict,
+    missing_data: str = "abort",
+    market_data: Optional[MarketData] = None,
+) -> Tuple[dict, Dict[date, float]]:
+    env = Environment(
+        tickers=tickers,
+        start_date=start_date,
+        end_date=end_date,
+        cash=cash,
+        strategies=[make_strategy(strategy_type, params)],
+        missing_data=missing_data,
+    )
+    tester = BackTester(data_df=None, env=env, market_data=market_data or _worker_market_data)
+    tester.backtest()
+    holdings = tester.get_holdings()
+    summary = compute_summary(holdings, tester.get_trades(), tester.get_positions(), cash)
+    return summary, {d: h.returns for d, h in holdings.items()}
+
+
+def _advance(
+    tester: Optional[BackTester],
+    tickers: List[str],
+    start_date: date,
+    end_date: date,
+    cash: float,
+    strategy_type: str,
+    params: dict,
+    missing_data: str = "abort",
+    market_data: Optional[MarketData] = None,
+) -> Tuple[dict, BackTester]:
+    """Backtest params up to end_date, resuming tester (from an earlier end date) if given."""
+    market_data = market_data or _worker_market_data
+    if tester is None:
+        env = Environment(
+            tickers=tickers,
+            start_date=start_date,
+            end_date=end_date,
+            cash=cash,
+            strategies=[make_strategy(strategy_type, params)],
+            missing_data=missing_data,
+        )
+        tester = BackTester(data_df=None, env=env, market_data=market_data)
+        tester.backtest()
+    else:
+        tester.resume(end_date, market_data)
+    summary = compute_summary(tester.get_holdings(), tester.get_trades(), tester.get_positions(), cash)
+    return summary, tester
+
+
+@dataclass
+class WalkForwardWindow:
+    train_start: date
+    train_end: date
+    test_start: date
+    test_end: date
+    best_params: Optional[dict] = None
+    train_score: Optional[float] = None
+    test_summary: Optional[dict] = None
+
+
+def split_windows(
+    trading_dates: List[date], train_days: int, test_days: int, step_days: Optional[int] = None
+) -> List[WalkForwardWindow]:
+    """Rolling train/test windows over trading_dates; by default each test window follows the previous one."""
+    step_days = step_days or test_days
+    windows = []
+    i = 0
+    while i + train_days < len(trading_dates):
+        train = trading_dates[i:i + train_days]
+        test = trading_dates[i + train_days:i + train_days + test_days]
+        windows.append(WalkForwardWindow(train[0], train[-1], test[0], test[-1]))
+        i += step_days
+    return windows
+
+
+def walk_forward(
+    market_data: MarketData,
+    tickers: List[str],
+    start_date: date,
+    end_date: date,
+    strategy_type: str,
+    param_grid: Dict[str, List],
+    base_params: Optional[dict] = None,
+    train_days: int = 252,
+    test_days: int = 63,
+    step_days: Optional[int] = None,
+    metric: str = "sharpe",
+    cash: float = 1000,
+    max_workers: Optional[int] = None,
+    missing_data: str = "abort",
+) -> dict:
+    """
+    Walk-forward optimization of one strategy type.
+
+    For each rolling window every parameter combination is backtested on the
+    train range and the best one by metric is backtested on the following
+    test range. Train runs of all windows execute in parallel worker processes.
+    Indicator series are computed once over the full calendar before the
+    workers start, so no window re-simulates shared history. The out-of-sample
+    daily returns of the test windows are chained into one equity curve.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric}, expected one of {', '.join(METRICS)}")
+
+    base_params = base_params or {}
+    candidates = [{**base_params, **params} for params in expand_grid(param_grid)]
+    if not candidates:
+        raise ValueError("param_grid has no combinations")
+
+    trading_dates = [d for d in market_data.trading_dates if start_date <= d <= end_date]
+    windows = split_windows(trading_dates, train_days, test_days, step_days)
+    if not windows:
+        raise ValueError("Date range is too short for a single train/test window")
+
+    for params in candidates:
+        strategy = make_strategy(strategy_type, params)
+        for ticker in tickers:
+            strategy.warmup(market_data, ticker)
+
+    executor = None
+    if max_workers != 1:
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(market_data,),
+        )
+
+    def run_all(tasks: List[tuple]) -> List[Tuple[dict, Dict[date, float]]]:
+        if executor is None:
+            return [_evaluate(*task, market_data=market_data) for task in tasks]
+        return list(executor.map(_evaluate, *zip(*tasks)))
+
+    try:
+        train_results = run_all([
+            (tickers, window.train_start, window.train_end, cash, strategy_type, params, missing_data)
+            for window in windows
+            for params in candidates
+        ])
+
+        for w, window in enumerate(windows):
+            results = train_results[w * len(candidates):(w + 1) * len(candidates)]
+            scores = [score(summary, metric) for summary, _ in results]
+            best = int(np.argmax(scores))
+            window.best_params = candidates[best]
+            window.train_score = scores[best] if math.isfinite(scores[best]) else None
+
+        test_results = run_all([
+            (tickers, window.test_start, window.test_end, cash, strategy_type, window.best_params, missing_data)
+            for window in windows
+        ])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # Chain the out-of-sample windows: each test run starts flat with `cash`,
+    # so convert its cumulative returns to daily returns and compound them
+    curve = []
+    equity = 1.0
+    for window, (summary, returns_by_date) in zip(windows, test_results):
+        window.test_summary = summary
+        previous = 1.0
+        for d in sorted(returns_by_date):
+            if curve and d <= curve[-1]["date"]:
+                continue  # Overlapping test windows when step_days < test_days
+            current = 1 + returns_by_date[d]
+            equity *= current / previous if previous != 0 else 1.0
+            previous = current
+            curve.append({"date": d, "returns": equity - 1})
+
+    return {
+        "strategy_type": strategy_type,
+        "metric": metric,
+        "candidates": len(candidates),
+        "windows": [
+            {
+                "train_start": w.train_start.isoformat(),
+                "train_end": w.train_end.isoformat(),
+                "test_start": w.test_start.isoformat(),
+                "test_end": w.test_end.isoformat(),
+                "best_params": w.best_params,
+                "train_score": w.train_score,
+                "test_return": w.test_summary.get("total_return") if w.test_summary else None,
+            }
+            for w in windows
+        ],
+        "equity_curve": [{"date": point["date"].isoformat(), "returns": point["returns"]} for point in curve],
+    }
+
+
+def halving_cost(candidates: int, trading_days: int, min_days: int = 63, keep: float = 0.5) -> int:
+    """Trading days successive_halving simulates over all candidates when it runs to the end."""
+    cost, done, days = 0, 0, min(min_days, trading_days)
+    while True:
+        cost += candidates * (days - done)
+        candidates, done = max(1, math.ceil(candidates * keep)), days
+        if days == trading_days:
+            return cost
+        days = trading_days if candidates == 1 else min(trading_days, math.ceil(days / keep))
+
+
+def successive_halving(
+    market_data: MarketData,
+    tickers: List[str],
+    start_date: date,
+    end_date: date,
+    strategy_type: str,
+    param_grid: Dict[str, List],
+    base_params: Optional[dict] = None,
+    metric: str = "sharpe",
+    cash: float = 1000,
+    min_days: int = 63,
+    keep: float = 0.5,
+    max_candidate_days: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    missing_data: str = "abort",
+) -> dict:
+    """
+    Successive-halving search over one strategy type's parameters.
+
+    Every combination is backtested on the first min_days trading days of the
+    range; the best keep fraction by metric survives and is extended to a
+    range 1/keep times as long, and so on until the survivors have run over
+    the whole range. A survivor resumes from its engine state at the end of
+    the previous rung instead of simulating those days again, so a candidate
+    costs only the days it reaches. Candidates of a rung run in parallel
+    worker processes, which send their engine state back with the results.
+
+    max_candidate_days bounds the total compute, counted in trading days
+    simulated over all candidates. When the next rung would exceed it the
+    search stops and reports the best candidate of the last completed rung.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric}, expected one of {', '.join(METRICS)}")
+    if not 0 < keep < 1:
+        raise ValueError("keep must be between 0 and 1")
+    if min_days < 1:
+        raise ValueError("min_days must be at least 1")
+
+    base_params = base_params or {}
+    candidates = [{**base_params, **params} for params in expand_grid(param_grid)]
+    if not candidates:
+        raise ValueError("param_grid has no combinations")
+
+    trading_dates = [d for d in market_data.trading_dates if start_date <= d <= end_date]
+    if not trading_dates:
+        raise ValueError("Date range has no trading days")
+    if max_candidate_days is not None and len(candidates) * min(min_days, len(trading_dates)) > max_candidate_days:
+        raise ValueError(
+            f"max_candidate_days of {max_candidate_days} does not cover the first rung: "
+            f"{len(candidates)} candidates x {min(min_days, len(trading_dates))} days"
+        )
+
+    for params in candidates:
+        strategy = make_strategy(strategy_type, params)
+        for ticker in tickers:
+            strategy.warmup(market_data, ticker)
+
+    executor = None
+    if max_workers != 1 and len(candidates) > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(market_data,),
+        )
+
+    def run_all(tasks: List[tuple]) -> List[Tuple[dict, BackTester]]:
+        if executor is None:
+            return [_advance(*task, market_data=market_data) for task in tasks]
+        return list(executor.map(_advance, *zip(*tasks)))
+
+    # Per candidate: engine state, trading days simulated so far and latest summary
+    testers: List[Optional[BackTester]] = [None] * len(candidates)
+    days_run = [0] * len(candidates)
+    summaries: List[Optional[dict]] = [None] * len(candidates)
+    alive = list(range(len(candidates)))
+    rungs = []
+    spent = 0
+    budget_exhausted = False
+    days = min(min_days, len(trading_dates))
+    try:
+        while True:
+            cost = sum(days - days_run[i] for i in alive)
+            if max_candidate_days is not None and spent + cost > max_candidate_days:
+                budget_exhausted = True
+                break
+            results = run_all([
+                (testers[i], tickers, start_date, trading_dates[days - 1], cash, strategy_type, candidates[i], missing_data)
+                for i in alive
+            ])
+            for i, (summary, tester) in zip(alive, results):
+                testers[i], summaries[i], days_run[i] = tester, summary, days
+            spent += cost
+
+            # Stable sort, so ties go to the earlier combination of the grid
+            scores = np.array([score(summaries[i], metric) for i in alive])
+            ranked = [alive[j] for j in np.argsort(-scores, kind="stable")]
+            rungs.append({
+                "end_date": trading_dates[days - 1].isoformat(),
+                "trading_days": days,
+                "candidates": len(alive),
+                "best_score": _finite(score(summaries[ranked[0]], metric)),
+            })
+            alive = ranked[:max(1, math.ceil(len(ranked) * keep))]
+            if days == len(trading_dates):
+                break
+            # A lone survivor goes straight to the end of the range
+            days = len(trading_dates) if len(alive) == 1 else min(len(trading_dates), math.ceil(days / keep))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    best = alive[0]
+    ranked = sorted(
+        (i for i in range(len(candidates)) if summaries[i] is not None),
+        key=lambda i: (-days_run[i], -score(summaries[i], metric), i),
+    )
+    return {
+        "strategy_type": strategy_type,
+        "metric": metric,
+        "candidates": len(candidates),
+        "best_params": candidates[best],
+        "best_score": _finite(score(summaries[best], metric)),
+        "best_summary": summaries[best],
+        "candidate_days": spent,
+        "exhaustive_candidate_days": len(candidates) * len(trading_dates),
+        "budget_exhausted": budget_exhausted,
+        "rungs": rungs,
+        "results": [
+            {
+                "params": candidates[i],
+                "trading_days": days_run[i],
+                "end_date": trading_dates[days_run[i] - 1].isoformat(),
+                "score": _finite(score(summaries[i], metric)),
+            }
+            for i in ranked
+        ],
+    }
+
+
+def _finite(value: float) -> Optional[float]:
+    return value if math.isfinite(value) else None
@@ -0,0 +1,95 @@
+"""
+Portfolio history as change events instead of one snapshot per trading day.
+
+An event records that a ticker's net amount became `amount` on `date` (0 when
+the position was closed). Positions only change on entry, liquidation and
+rebalance days, so a run's events are usually far fewer than its
+days x tickers snapshots. Snapshots for any range are rebuilt by replaying
+the events.
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class PortfolioChange:
+    date: date
+    ticker: str
+    amount: float
+
+
+def diff(previous: Dict[str, float], current: Dict[str, float], day: date) -> List[PortfolioChange]:
+    """Changes that turn the previous snapshot into the current one."""
+    changes = [
+        PortfolioChange(day, ticker, amount)
+        for ticker, amount in current.items()
+        if previous.get(ticker) != amount
+    ]
+    changes.extend(
+        PortfolioChange(day, ticker, 0.0)
+        for ticker in previous
+        if ticker not in current
+    )
+    return changes
+
+
+def encode(snapshots: Iterable[Tuple[date, Dict[str, float]]]) -> List[PortfolioChange]:
+    """Change events of chronological (date, portfolio) snapshots."""
+    events = []
+    previous: Dict[str, float] = {}
+    for day, portfolio in snapshots:
+        events.extend(diff(previous, portfolio, day))
+        previous = portfolio
+    return events
+
+
+def replay(
+    dates: List[str],
+    events: List[dict],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> Tuple[List[str], Dict[str, float], List[dict]]:
+    """
+    Split stored events at a range of ISO dates.
+
+    Returns:
+        (dates in the range, portfolio at the end of the day before start,
+        events inside the range); events must be sorted by date
+    """
+    start = start or (dates[0] if dates else "")
+    end = end or (dates[-1] if dates else "")
+    initial: Dict[str, float] = {}
+    i = 0
+    while i < len(events) and events[i]["date"] < start:
+        _apply(initial, events[i])
+        i += 1
+    j = i
+    while j < len(events) and events[j]["date"] <= end:
+        j += 1
+    return [d for d in dates if start <= d <= end], initial, events[i:j]
+
+
+def dense(
+    dates: List[str],
+    events: List[dict],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> List[dict]:
+    """Daily {"date", "positions"} snapshots for the range, as the backtest recorded them."""
+    days, portfolio, events = replay(dates, events, start, end)
+    snapshots = []
+    i = 0
+    for day in days:
+        while i < len(events) and events[i]["date"] <= day:
+            _apply(portfolio, events[i])
+            i += 1
+        snapshots.append({"date": day, "positions": dict(portfolio)})
+    return snapshots
+
+
+def _apply(portfolio: Dict[str, float], event: dict):
+    if event["amount"] == 0:
+        portfolio.pop(event["stock"], None)
+    else:
+        portfolio[event["stock"]] = event["amount"]
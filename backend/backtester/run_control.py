@@ -0,0 +1,94 @@
+import os
+import resource
+import threading
+import time
+from typing import Optional
+
+
+class BacktestAborted(Exception):
+    """Raised inside BackTester.backtest when a run is cancelled or exceeds its budget."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Peak RSS is the best we can do without /proc (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 if peak < 1 << 32 else peak / (1024 * 1024)
+
+
+class RunControl:
+    """
+    Cooperative cancellation plus a wall-clock and memory budget for one backtest.
+
+    BackTester calls check() once per simulated trading day, so cancelling or
+    running out of budget stops the simulation between days and leaves the
+    already stored results untouched.
+
+    The memory budget is on how far the process's resident size grows past
+    what it was when the run started, so memory held by the rest of the
+    process does not count. Runs sharing a process still see each other's
+    growth.
+    """
+
+    # Reading RSS costs a syscall, so only sample it every few trading days
+    MEMORY_CHECK_INTERVAL = 16
+
+    def __init__(self, max_seconds: Optional[float] = None, max_memory_mb: Optional[float] = None):
+        self.max_seconds = max_seconds
+        self.max_memory_mb = max_memory_mb
+        self.started_at: Optional[float] = None
+        self.baseline_rss_mb = 0.0
+        self._cancelled = threading.Event()
+        self._checks = 0
+
+    def __getstate__(self):
+        # Cancellation does not cross process boundaries, only the budget does
+        state = self.__dict__.copy()
+        del state["_cancelled"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cancelled = threading.Event()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._checks = 0
+        if self.max_memory_mb is not None:
+            self.baseline_rss_mb = _current_rss_mb()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return time.monotonic() - self.started_at
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise BacktestAborted("cancelled")
+
+        if self.max_seconds is not None and self.elapsed() > self.max_seconds:
+            raise BacktestAborted(f"exceeded wall-clock budget of {self.max_seconds}s")
+
+        self._checks += 1
+        if self.max_memory_mb is not None and self._checks % self.MEMORY_CHECK_INTERVAL == 0:
+            rss = _current_rss_mb()
+            if rss - self.baseline_rss_mb > self.max_memory_mb:
+                raise BacktestAborted(
+                    f"exceeded memory budget of {self.max_memory_mb} MB "
+                    f"({rss:.0f} MB resident, {self.baseline_rss_mb:.0f} MB at start)"
+                )
@@ -0,0 +1,232 @@
+"""
+Market data shared by every process on a machine.
+
+A snapshot is a directory of .npy arrays, one (tickers x trading dates) matrix
+per field, that processes memory-map read-only, so the OS page cache holds a
+single copy however many uvicorn workers and backtest subprocesses use it.
+Put the root on tmpfs (e.g. /dev/shm/backtesting) to keep it in shared memory.
+
+    root/
+        current         name of the version processes should attach
+        <version>/      immutable snapshot, named by a hash of its source
+
+Snapshots are written to a temporary directory and renamed into place, and
+`current` is replaced atomically, so readers never see a partial version.
+Processes keep their mapping of the version they attached until they
+reattach; removed versions stay readable for them until then.
+
+Publish a new version from a CSV of daily bars (e.g. from a deploy step) with:
+
+    python -m backtester.shared_data publish /dev/shm/backtesting ./backtester/data.csv
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backtester.market_data import MarketData, TickerData
+
+
+FIELDS = ("open", "high", "low", "close", "volume")
+CURRENT_FILE = "current"
+LOCK_FILE = ".lock"
+
+
+def file_version(path: str) -> str:
+    """Version name of a source file, a hash of its contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def write_snapshot(df: pd.DataFrame, path: str):
+    """Write rows of date, ticker, open, close, high, low, volume as a snapshot directory."""
+    df = df.assign(date=pd.to_datetime(df["date"]).dt.date).drop_duplicates(["date", "ticker"], keep="last")
+    dates = sorted(df["date"].unique())
+    tickers = sorted(df["ticker"].unique())
+
+    os.makedirs(path)
+    with open(os.path.join(path, "tickers.json"), "w") as f:
+        json.dump(tickers, f)
+    np.save(os.path.join(path, "dates.npy"), np.array(dates, dtype="datetime64[D]"))
+    for field in FIELDS:
+        matrix = df.pivot(index="ticker", columns="date", values=field).reindex(index=tickers, columns=dates)
+        np.save(os.path.join(path, field + ".npy"), matrix.to_numpy(dtype=float))
+    present = df.assign(present=True).pivot(index="ticker", columns="date", values="present")
+    present = present.reindex(index=tickers, columns=dates).notna().to_numpy()
+    np.save(os.path.join(path, "present.npy"), present)
+
+
+class SharedMarketData(MarketData):
+    def __init__(self, path: str):
+        """
+        Market data backed by a memory-mapped snapshot, equivalent to
+        MarketData over the whole source CSV.
+
+        Args:
+            path (str): Snapshot directory written by write_snapshot
+        """
+        self.path = path
+        self.version = os.path.basename(os.path.normpath(path))
+        self._attach()
+        self._indicators = {}
+
+    def _attach(self):
+        with open(os.path.join(self.path, "tickers.json")) as f:
+            self._tickers: List[str] = json.load(f)
+        self._ticker_index: Dict[str, int] = {t: i for i, t in enumerate(self._tickers)}
+        self.trading_dates: List[date] = np.load(os.path.join(self.path, "dates.npy")).astype(object).tolist()
+        self._date_index: Dict[date, int] = {d: i for i, d in enumerate(self.trading_dates)}
+        self._fields: Dict[str, np.ndarray] = {
+            field: np.load(os.path.join(self.path, field + ".npy"), mmap_mode="r") for field in FIELDS
+        }
+        self._present = np.load(os.path.join(self.path, "present.npy"), mmap_mode="r")
+
+    def __getstate__(self):
+        # Subprocesses map the same files instead of receiving a pickled copy
+        return {"path": self.path, "version": self.version, "_indicators": self._indicators}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
+
+    @property
+    def tickers(self) -> List[str]:
+        return list(self._tickers)
+
+    def get_close_series(self, ticker: str) -> np.ndarray:
+        return self.get_series("close", ticker)
+
+    def get_series(self, field: str, ticker: str) -> np.ndarray:
+        index = self._ticker_index.get(ticker)
+        if index is None:
+            return np.full(len(self.trading_dates), np.nan)
+        return self._fields[field][index]
+
+    def is_trading_date(self, check_date: date) -> bool:
+        return check_date in self._date_index
+
+    def has_bars(self, ticker: str) -> np.ndarray:
+        index = self._ticker_index.get(ticker)
+        if index is None:
+            return np.zeros(len(self.trading_dates), dtype=bool)
+        return np.asarray(self._present[index])
+
+    def _get_data(self, ticker: str, day: date) -> TickerData:
+        row = self._ticker_index.get(ticker)
+        column = self._date_index.get(day)
+        if row is None or column is None or not self._present[row, column]:
+            raise ValueError(f"No data for {ticker} on {day}")
+        return TickerData(
+            open=float(self._fields["open"][row, column]),
+            close=float(self._fields["close"][row, column]),
+            high=float(self._fields["high"][row, column]),
+            low=float(self._fields["low"][row, column]),
+            volume=int(self._fields["volume"][row, column]),
+        )
+
+
+class SharedDataStore:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @contextmanager
+    def _lock(self):
+        # Serializes publishing between processes; readers never take it
+        with open(os.path.join(self.root, LOCK_FILE), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def current(self) -> Optional[str]:
+        """Version processes should attach, or None if nothing was published."""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _set_current(self, version: str):
+        tmp = os.path.join(self.root, f"{CURRENT_FILE}.{os.getpid()}")
+        with open(tmp, "w") as f:
+            f.write(version)
+        os.replace(tmp, os.path.join(self.root, CURRENT_FILE))
+
+    def publish(self, csv_path: str, keep: int = 2) -> str:
+        """
+        Make the CSV the current version, writing its snapshot unless a
+        process already did, and remove all but the newest keep versions.
+        """
+        with self._lock():
+            return self._publish(csv_path, keep)
+
+    def ensure(self, csv_path: str) -> str:
+        """Current version, publishing the CSV first only if nothing was published yet."""
+        with self._lock():
+            return self.current() or self._publish(csv_path, keep=2)
+
+    def _publish(self, csv_path: str, keep: int) -> str:
+        version = file_version(csv_path)
+        path = os.path.join(self.root, version)
+        if not os.path.isdir(path):
+            tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+            try:
+                write_snapshot(pd.read_csv(csv_path), os.path.join(tmp, version))
+                os.rename(os.path.join(tmp, version), path)
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+        if self.current() != version:
+            self._set_current(version)
+        self._prune(keep)
+        return version
+
+    def _prune(self, keep: int):
+        current = self.current()
+        versions = sorted(
+            (name for name in os.listdir(self.root)
+             if not name.startswith(".") and os.path.isdir(os.path.join(self.root, name))),
+            key=lambda name: os.path.getmtime(os.path.join(self.root, name)),
+            reverse=True,
+        )
+        # Processes still mapping a removed version keep reading it until they reattach
+        for name in versions[keep:]:
+            if name != current:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def attach(self, version: Optional[str] = None) -> SharedMarketData:
+        """Map a version, by default the current one."""
+        version = version or self.current()
+        if version is None:
+            raise FileNotFoundError(f"No market data published in {self.root}")
+        return SharedMarketData(os.path.join(self.root, version))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish_parser = commands.add_parser("publish", help="Publish a CSV of daily bars as the current version")
+    publish_parser.add_argument("root")
+    publish_parser.add_argument("csv")
+    publish_parser.add_argument("--keep", type=int, default=2, help="Versions to keep on disk")
+    args = parser.parse_args(argv)
+
+    version = SharedDataStore(args.root).publish(args.csv, args.keep)
+    print(f"[SHARED DATA] Current version is {version}")
+
+
+if __name__ == "__main__":
+    main()
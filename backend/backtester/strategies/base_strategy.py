@@ -2,7 +2,9 @@ from abc import ABC, abstractmethod
 from datetime import date
 from backtester.market_data import MarketData
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
+
+import numpy as np
 
 
 class StrategyType(Enum):
@@ -32,6 +34,49 @@ class Strategy(ABC):
     def strategy_type(self) -> StrategyType:
         pass
 
+    def should_enter_batch(self, date: date, tickers: List[str], market_data: MarketData) -> np.ndarray:
+        """
+        should_enter for every ticker on one day, as a boolean mask aligned to
+        tickers. Override to evaluate all tickers at once; the default asks
+        should_enter for each ticker in turn.
+        """
+        return np.array([bool(self.should_enter(date, ticker, market_data)) for ticker in tickers], dtype=bool)
+
+    def signals_for_range(self, dates: List[date], tickers: List[str], market_data: MarketData) -> np.ndarray:
+        """
+        should_enter for every trading day in dates and every ticker, as a
+        (len(dates), len(tickers)) boolean mask. Override when signals only
+        depend on market data, so the whole range can be computed at once; the
+        default evaluates one day at a time with should_enter_batch.
+        """
+        mask = np.zeros((len(dates), len(tickers)), dtype=bool)
+        for i, day in enumerate(dates):
+            mask[i] = self.should_enter_batch(day, tickers, market_data)
+        return mask
+
+    def weights_for_range(self, dates: List[date], tickers: List[str], market_data: MarketData) -> Optional[np.ndarray]:
+        """
+        Target portfolio weights for strategies that rebalance instead of
+        entering on should_enter: a (len(dates), len(tickers)) array with a
+        row of weights on rebalance days and NaN rows on other days. The
+        default None means the strategy is not rebalanced.
+        """
+        return None
+
+    def warmup(self, market_data: MarketData, ticker: str):
+        """
+        Precompute anything should_enter will need for ticker, e.g. indicator
+        series cached on market_data. Called before backtests when warming up.
+        """
+        pass
+
+    def lookback_days(self) -> int:
+        """
+        Number of trading days before the current date that should_enter reads.
+        Used to decide how much history has to be loaded before the start date.
+        """
+        return 0
+
     def liquidate_below(self) -> Optional[float]:
         """
         Returns the price below which to exit based on stop_loss_pct if set.
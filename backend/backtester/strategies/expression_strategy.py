@@ -0,0 +1,141 @@
+from datetime import date
+from typing import Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+
+from backtester import indicators
+from backtester.expressions import CompiledExpression
+from backtester.market_data import MarketData
+from backtester.strategies.base_strategy import Strategy, StrategyType
+
+
+class ExpressionStrategy(Strategy):
+    def __init__(
+        self,
+        expression: str,
+        position_type: Literal["long", "short"],
+        stop_loss_pct: Optional[float] = None,
+        take_profit_pct: Optional[float] = None,
+        name: Optional[str] = None,
+        type: Optional[str] = None
+    ):
+        """
+        Initialize Expression Strategy
+
+        Args:
+            expression (str): Entry rule, e.g. "close < sma(close, 20) * 0.95 and rsi(close, 14) < 30"
+            position_type (str): "long" or "short" - defines if strategy opens long or short
+            stop_loss_pct (float, optional): Stop loss percentage
+            take_profit_pct (float, optional): Take profit percentage
+            name (str, optional): Strategy name
+            type (str, optional): Strategy type
+
+        Raises:
+            ExpressionError: If the expression is not valid
+        """
+        super().__init__()
+        self.expression = expression
+        self.compiled = CompiledExpression(expression)
+        self.position_type = position_type
+        self.stop_loss_pct = stop_loss_pct
+        self.take_profit_pct = take_profit_pct
+        self.entry_price: Optional[float] = None
+        self._masks: Dict[Tuple[int, str], np.ndarray] = {}
+        self.name = name
+        self.type = type
+
+    def _indicator(self, market_data: MarketData, ticker: str):
+        def indicator(name: str, field: str, windows) -> np.ndarray:
+            # MarketData caches indicators of close prices only
+            if field == "close":
+                return market_data.get_indicator(name, ticker, *windows)
+            return indicators.compute(name, market_data.get_series(field, ticker), *windows)
+        return indicator
+
+    def _entry_mask(self, market_data: MarketData, ticker: str) -> np.ndarray:
+        """Entry rule evaluated over the whole trading calendar of ticker, computed once."""
+        key = (id(market_data), ticker)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self.compiled.evaluate(
+                lambda field: market_data.get_series(field, ticker),
+                self._indicator(market_data, ticker),
+            )
+            mask = np.broadcast_to(mask, (len(market_data.trading_dates),))
+            self._masks[key] = mask
+        return mask
+
+    def signals_for_range(self, dates: List[date], tickers: List[str], market_data: MarketData) -> np.ndarray:
+        """
+        Evaluate the compiled expression once per ticker over whole series
+
+        Args:
+            dates (List[date]): Trading dates
+            tickers (List[str]): Stock tickers
+            market_data (MarketData): Market data object
+
+        Returns:
+            np.ndarray: Boolean mask of shape (len(dates), len(tickers))
+        """
+        rows = market_data.date_rows(dates)
+        known = rows >= 0
+        mask = np.zeros((len(dates), len(tickers)), dtype=bool)
+        for j, ticker in enumerate(tickers):
+            mask[known, j] = self._entry_mask(market_data, ticker)[rows[known]]
+        return mask
+
+    def should_enter(self, date: date, ticker: str, market_data: MarketData) -> bool:
+        """
+        Determine if we should enter a position based on the expression
+
+        Args:
+            date (date): Current date
+            ticker (str): Stock ticker
+            market_data (MarketData): Market data object
+
+        Returns:
+            bool: True if we should enter, False otherwise
+        """
+        return bool(self.signals_for_range([date], [ticker], market_data)[0, 0])
+
+    def should_enter_batch(self, date: date, tickers: List[str], market_data: MarketData) -> np.ndarray:
+        return self.signals_for_range([date], tickers, market_data)[0]
+
+    def get_exposure(self) -> float:
+        """
+        Get the exposure percentage for this strategy
+
+        Returns:
+            float: Exposure percentage (0.0 to 1.0)
+        """
+        return 1.0
+
+    def warmup(self, market_data: MarketData, ticker: str):
+        """
+        Precompute the close price indicators the expression reads for ticker
+
+        Args:
+            market_data (MarketData): Market data object
+            ticker (str): Stock ticker
+        """
+        for name, field, windows in self.compiled.indicator_calls():
+            if field == "close":
+                market_data.get_indicator(name, ticker, *windows)
+
+    def lookback_days(self) -> int:
+        """
+        Get the number of previous trading days the expression reads
+
+        Returns:
+            int: Lookback in trading days
+        """
+        return self.compiled.lookback_days
+
+    def strategy_type(self) -> StrategyType:
+        """
+        Get the strategy type
+
+        Returns:
+            StrategyType: LONG or SHORT based on position_type
+        """
+        return StrategyType.LONG if self.position_type == "long" else StrategyType.SHORT
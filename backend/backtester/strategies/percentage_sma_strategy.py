@@ -1,9 +1,12 @@
 from backtester.market_data import MarketData
 from datetime import date
 from backtester.strategies.base_strategy import Strategy, StrategyType
-from typing import Literal, Optional
+from typing import List, Literal, Optional
+import math
 import statistics
 
+import numpy as np
+
 class PercentageSMAStrategy(Strategy):
     def __init__(
         self, 
@@ -52,6 +55,14 @@ class PercentageSMAStrategy(Strategy):
         Returns:
             float: Simple Moving Average value
         """
+        # Use the cached SMA series; the SMA for today ends at the previous trading day
+        index = market_data.date_index(current_date)
+        if index is not None and index > 0:
+            sma = market_data.get_indicator("sma", ticker, self.days, 1)[index - 1]
+            if not math.isnan(sma):
+                return float(sma)
+
+        # Missing bars in the window: recompute directly so the gap is reported
         # Get list of previous trading days
         trading_dates = market_data.get_trading_dates_before(current_date, self.days)
         
@@ -96,6 +107,45 @@ class PercentageSMAStrategy(Strategy):
         # Only enter if price condition is met and position type matches
         return price_condition
     
+    def signals_for_range(self, dates: List[date], tickers: List[str], market_data: MarketData) -> np.ndarray:
+        """
+        Evaluate should_enter for all dates and tickers from the cached close and SMA series
+
+        Entries the cached series cannot answer (missing bars, no history yet)
+        fall back to should_enter, so they behave exactly as in a per-ticker run.
+
+        Args:
+            dates (List[date]): Trading dates
+            tickers (List[str]): Stock tickers
+            market_data (MarketData): Market data object
+
+        Returns:
+            np.ndarray: Boolean mask of shape (len(dates), len(tickers))
+        """
+        rows = market_data.date_rows(dates)
+        has_history = rows > 0
+        mask = np.zeros((len(dates), len(tickers)), dtype=bool)
+        for j, ticker in enumerate(tickers):
+            closes = market_data.get_close_series(ticker)
+            sma = market_data.get_indicator("sma", ticker, self.days, 1)
+            current_price = np.where(has_history, closes[rows], np.nan)
+            previous_sma = np.where(has_history, sma[rows - 1], np.nan)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                percentage_diff = ((current_price - previous_sma) / previous_sma) * 100
+            if self.direction == "drop":
+                price_condition = percentage_diff <= -self.percentage_change
+            else:
+                price_condition = percentage_diff >= self.percentage_change
+
+            fallback = ~np.isfinite(percentage_diff)
+            mask[:, j] = price_condition & ~fallback
+            for i in np.flatnonzero(fallback):
+                mask[i, j] = self.should_enter(dates[i], ticker, market_data)
+        return mask
+
+    def should_enter_batch(self, date: date, tickers: List[str], market_data: MarketData) -> np.ndarray:
+        return self.signals_for_range([date], tickers, market_data)[0]
+
     def get_exposure(self) -> float:
         """
         Get the exposure percentage for this strategy
@@ -105,6 +155,25 @@ class PercentageSMAStrategy(Strategy):
         """
         return 1.0  # Use 100% of available cash
     
+    def warmup(self, market_data: MarketData, ticker: str):
+        """
+        Precompute the SMA series used by should_enter for ticker
+        
+        Args:
+            market_data (MarketData): Market data object
+            ticker (str): Stock ticker
+        """
+        market_data.get_indicator("sma", ticker, self.days, 1)
+
+    def lookback_days(self) -> int:
+        """
+        Get the number of previous trading days used by the SMA
+
+        Returns:
+            int: SMA window in trading days
+        """
+        return self.days
+
     def strategy_type(self) -> StrategyType:
         """
         Get the strategy type
@@ -0,0 +1,140 @@
+from datetime import date
+from typing import List, Literal, Optional
+
+import numpy as np
+
+from backtester.market_data import MarketData
+from backtester.strategies.base_strategy import Strategy, StrategyType
+
+
+class RankingStrategy(Strategy):
+    def __init__(
+        self,
+        metric: Literal["momentum", "rsi"],
+        lookback: int,
+        top_n: int,
+        rebalance_days: int,
+        position_type: Literal["long", "short"],
+        select: Optional[Literal["highest", "lowest"]] = None,
+        stop_loss_pct: Optional[float] = None,
+        take_profit_pct: Optional[float] = None,
+        name: Optional[str] = None,
+        type: Optional[str] = None
+    ):
+        """
+        Initialize Ranking Strategy
+
+        Every rebalance_days trading days the whole universe is ranked by metric
+        and the portfolio is rebalanced into the top_n names with equal weights.
+
+        Args:
+            metric (str): "momentum" (return over lookback days) or "rsi" (RSI over lookback days)
+            lookback (int): Momentum window or RSI period in trading days
+            top_n (int): Number of tickers to hold
+            rebalance_days (int): Trading days between rebalances
+            position_type (str): "long" or "short" - defines if strategy opens long or short
+            select (str, optional): Hold the "highest" or "lowest" ranked tickers;
+                defaults to highest momentum or lowest RSI
+            stop_loss_pct (float, optional): Stop loss percentage
+            take_profit_pct (float, optional): Take profit percentage
+            name (str, optional): Strategy name
+            type (str, optional): Strategy type
+        """
+        super().__init__()
+        if metric not in ("momentum", "rsi"):
+            raise ValueError(f"Unknown ranking metric {metric}")
+        self.metric = metric
+        self.lookback = lookback
+        self.top_n = top_n
+        self.rebalance_days = max(1, rebalance_days)
+        self.position_type = position_type
+        self.select = select or ("highest" if metric == "momentum" else "lowest")
+        self.stop_loss_pct = stop_loss_pct
+        self.take_profit_pct = take_profit_pct
+        self.entry_price: Optional[float] = None
+        self.name = name
+        self.type = type
+
+    def _scores(self, market_data: MarketData, ticker: str) -> np.ndarray:
+        return market_data.get_indicator(self.metric, ticker, self.lookback)
+
+    def weights_for_range(self, dates: List[date], tickers: List[str], market_data: MarketData) -> np.ndarray:
+        """
+        Rank all tickers on every rebalance day at once
+
+        Like the other strategies, a day's decision uses the indicator up to the
+        previous trading day. Tickers without a score or without a bar on the
+        rebalance day are not selected; if fewer than top_n qualify the rest of
+        the allocation stays in cash.
+
+        Args:
+            dates (List[date]): Trading dates
+            tickers (List[str]): Stock tickers
+            market_data (MarketData): Market data object
+
+        Returns:
+            np.ndarray: Weights of shape (len(dates), len(tickers)), NaN rows on other days
+        """
+        weights = np.full((len(dates), len(tickers)), np.nan)
+        rows = market_data.date_rows(dates)
+        rebalance = np.flatnonzero((np.arange(len(dates)) % self.rebalance_days == 0) & (rows > 0))
+        if len(rebalance) == 0 or not tickers:
+            return weights
+
+        # (rebalance days x tickers) matrices of yesterday's score and today's close
+        rows = rows[rebalance]
+        scores = np.column_stack([self._scores(market_data, t)[rows - 1] for t in tickers])
+        closes = np.column_stack([market_data.get_close_series(t)[rows] for t in tickers])
+
+        ranked = -scores if self.select == "highest" else scores.copy()
+        ranked[~np.isfinite(ranked) | np.isnan(closes)] = np.inf
+
+        top_n = min(self.top_n, len(tickers))
+        chosen = np.argpartition(ranked, top_n - 1, axis=1)[:, :top_n]
+        selected = np.zeros(ranked.shape, dtype=bool)
+        np.put_along_axis(selected, chosen, True, axis=1)
+        selected &= np.isfinite(ranked)
+
+        weights[rebalance] = np.where(selected, 1.0 / self.top_n, 0.0)
+        return weights
+
+    def should_enter(self, date: date, ticker: str, market_data: MarketData) -> bool:
+        # Entries happen through rebalancing to weights_for_range
+        return False
+
+    def get_exposure(self) -> float:
+        """
+        Get the exposure percentage of each selected ticker
+
+        Returns:
+            float: Exposure percentage (0.0 to 1.0)
+        """
+        return 1.0 / self.top_n
+
+    def warmup(self, market_data: MarketData, ticker: str):
+        """
+        Precompute the ranking score series for ticker
+
+        Args:
+            market_data (MarketData): Market data object
+            ticker (str): Stock ticker
+        """
+        self._scores(market_data, ticker)
+
+    def lookback_days(self) -> int:
+        """
+        Get the number of previous trading days used by the score
+
+        Returns:
+            int: Lookback in trading days
+        """
+        return self.lookback + 1
+
+    def strategy_type(self) -> StrategyType:
+        """
+        Get the strategy type
+
+        Returns:
+            StrategyType: LONG or SHORT based on position_type
+        """
+        return StrategyType.LONG if self.position_type == "long" else StrategyType.SHORT
@@ -1,4 +1,9 @@
+import math
+from datetime import date
 from typing import List, Optional
+
+import numpy as np
+
 from ..back_tester import StrategyType
 from ..market_data import MarketData
 from .base_strategy import Strategy
@@ -16,6 +21,15 @@ class RSIStrategy(Strategy):
         self.type = type
 
     def calculate_rsi(self, market_data: MarketData, ticker: str, date: str) -> float:
+        # Use the cached RSI series; the RSI for today ends at the previous trading day
+        index = market_data.date_index(date)
+        if index is not None:
+            if index - 1 < self.period:
+                return 50.0  # Default to neutral if not enough data
+            rsi = market_data.get_indicator("rsi", ticker, self.period)[index - 1]
+            if not math.isnan(rsi):
+                return float(rsi)
+
         # Get historical prices
         dates = market_data.get_trading_dates_before(date, self.period + 1)
         if len(dates) < self.period + 1:
@@ -55,9 +69,40 @@ class RSIStrategy(Strategy):
         print(f"[RSI DEBUG] {ticker} {date} RSI={rsi:.2f} threshold={self.rsi_threshold} type={self.position_type} -> enter={decision}")
         return decision
 
+    def signals_for_range(self, dates: List[date], tickers: List[str], market_data: MarketData) -> np.ndarray:
+        # Same decision as should_enter from the cached RSI series; entries it
+        # cannot answer (missing bars) go through should_enter
+        rows = market_data.date_rows(dates)
+        known = rows >= 0
+        warming_up = rows - 1 < self.period
+        mask = np.zeros((len(dates), len(tickers)), dtype=bool)
+        for j, ticker in enumerate(tickers):
+            series = market_data.get_indicator("rsi", ticker, self.period)
+            rsi = np.where(warming_up, 50.0, series[np.maximum(rows - 1, 0)])
+            rsi = np.where(known, rsi, np.nan)
+            if self.position_type == "long":
+                decision = rsi < self.rsi_threshold
+            else:  # SHORT
+                decision = rsi > (100 - self.rsi_threshold)
+
+            fallback = np.isnan(rsi)
+            mask[:, j] = decision & ~fallback
+            for i in np.flatnonzero(fallback):
+                mask[i, j] = self.should_enter(dates[i], ticker, market_data)
+        return mask
+
+    def should_enter_batch(self, date, tickers, market_data) -> np.ndarray:
+        return self.signals_for_range([date], tickers, market_data)[0]
+
     def get_exposure(self) -> float:
         return 1.0  # Full exposure for RSI strategy
 
+    def warmup(self, market_data: MarketData, ticker: str):
+        market_data.get_indicator("rsi", ticker, self.period)
+
+    def lookback_days(self) -> int:
+        return self.period + 1
+
     def strategy_type(self) -> StrategyType:
         return StrategyType.LONG if self.position_type == "long" else StrategyType.SHORT
 
@@ -0,0 +1,275 @@
+"""
+Paper trading: a BackTester that is fed bars as they arrive instead of
+replaying a fixed historical window.
+
+Market data grows one bar at a time and every indicator a strategy reads is
+kept up to date with its online counterpart (indicators.OnlineSMA, ...), so
+the work per bar does not depend on how much history has accumulated. Each
+bar is handled like a day of BackTester.backtest for its ticker: stop-loss
+and take-profit of the ticker's positions are checked at its close, then
+every strategy may enter, and the holdings are snapshotted.
+
+Bars must arrive in date order; within a date, tickers may come in any
+order. A ticker that skips dates has the missing bars forward-filled from
+its previous close when its next bar arrives.
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtester import indicators
+from backtester.back_tester import BackTester, Holdings, Trade, _overrides
+from backtester.environment import Environment
+from backtester.market_data import MarketData, TickerData
+from backtester.strategies.base_strategy import Strategy, StrategyType
+from backtester.strategies.expression_strategy import ExpressionStrategy
+
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+
+class _Column:
+    """Float array with amortized O(1) append; values is a view of the filled part."""
+
+    def __init__(self, values: Optional[np.ndarray] = None):
+        values = np.asarray(values if values is not None else [], dtype=float)
+        self._buffer = np.empty(max(2 * len(values), 64))
+        self._buffer[:len(values)] = values
+        self._length = len(values)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, value: float):
+        if self._length == len(self._buffer):
+            buffer = np.empty(2 * len(self._buffer))
+            buffer[:self._length] = self._buffer[:self._length]
+            self._buffer = buffer
+        self._buffer[self._length] = value
+        self._length += 1
+
+    def __setitem__(self, index: int, value: float):
+        self._buffer[index] = value
+
+    def __getitem__(self, index: int) -> float:
+        return self._buffer[index]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._buffer[:self._length]
+
+
+class StreamingMarketData(MarketData):
+    def __init__(self, history: Optional[pd.DataFrame] = None, tickers: Optional[List[str]] = None):
+        """
+        Market data that bars are appended to, starting from optional history.
+
+        Args:
+            history (pd.DataFrame, optional): Rows of date, ticker, open, close, high, low, volume
+            tickers (List[str], optional): Only keep these tickers of the history
+        """
+        if history is not None:
+            super().__init__(history, tickers)
+        else:
+            self.data = {}
+            self.trading_dates = []
+            self._date_index = {}
+            self._close_series = {}
+            self._series = {}
+            self._indicators = {}
+
+        self._columns: Dict[Tuple[str, str], _Column] = {}
+        # Row of each ticker's last real or filled bar
+        self._last_row: Dict[str, int] = {}
+        self._online: Dict[Tuple, Tuple[object, _Column]] = {}
+        for ticker in (tickers or self.tickers):
+            closes = MarketData.get_close_series(self, ticker)
+            for field in FIELDS:
+                series = closes if field == "close" else MarketData.get_series(self, field, ticker)
+                self._columns[(field, ticker)] = _Column(series)
+            present = np.flatnonzero(~np.isnan(closes))
+            self._last_row[ticker] = int(present[-1]) if len(present) else -1
+
+    def _add_ticker(self, ticker: str):
+        for field in FIELDS:
+            self._columns[(field, ticker)] = _Column(np.full(len(self.trading_dates), np.nan))
+        self._last_row[ticker] = -1
+
+    def _add_date(self, day: date):
+        self.trading_dates.append(day)
+        self._date_index[day] = len(self.trading_dates) - 1
+        self.data[day] = {}
+        # Every column keeps one slot per trading date, NaN until the ticker's bar arrives
+        for column in self._columns.values():
+            column.append(np.nan)
+        for _, column in self._online.values():
+            column.append(np.nan)
+
+    def append(self, ticker: str, day: date, bar: TickerData) -> int:
+        """Add ticker's bar for day and update its indicators; returns the bar's row."""
+        if self.trading_dates and day < self.trading_dates[-1]:
+            raise ValueError(f"Bar for {ticker} on {day} arrived after bars for {self.trading_dates[-1]}")
+        if not self.trading_dates or day > self.trading_dates[-1]:
+            self._add_date(day)
+        if ticker not in self._last_row:
+            self._add_ticker(ticker)
+        if ticker in self.data[day]:
+            raise ValueError(f"{ticker} already has a bar on {day}")
+
+        row = len(self.trading_dates) - 1
+        last = self._last_row[ticker]
+        if last >= 0:
+            # Forward-fill the dates the ticker skipped: a flat bar at the previous close
+            close = self._columns[("close", ticker)][last]
+            filled = TickerData(open=close, close=close, high=close, low=close, volume=0)
+            for skipped in range(last + 1, row):
+                self.data[self.trading_dates[skipped]][ticker] = filled
+                self._set_row(ticker, skipped, filled)
+
+        self.data[day][ticker] = bar
+        self._set_row(ticker, row, bar)
+        return row
+
+    def _set_row(self, ticker: str, row: int, bar: TickerData):
+        for field in FIELDS:
+            self._columns[(field, ticker)][row] = getattr(bar, field)
+        for key, (indicator, column) in self._online.items():
+            if key[1] == ticker:
+                column[row] = indicator.update(bar.close)
+        self._last_row[ticker] = row
+
+    def last_close(self, ticker: str) -> float:
+        """Close of ticker's latest bar."""
+        return float(self._columns[("close", ticker)][self._last_row[ticker]])
+
+    def get_close_series(self, ticker: str) -> np.ndarray:
+        return self.get_series("close", ticker)
+
+    def get_series(self, field: str, ticker: str) -> np.ndarray:
+        column = self._columns.get((field, ticker))
+        if column is None:
+            return np.full(len(self.trading_dates), np.nan)
+        return column.values
+
+    def get_indicator(self, name: str, ticker: str, *params) -> np.ndarray:
+        """
+        Indicator series of ticker's closes. The first request computes it over
+        the history so far; from then on every appended bar updates it in O(1).
+        """
+        key = (name, ticker) + params
+        entry = self._online.get(key)
+        if entry is None:
+            indicator = indicators.online(name, *params)
+            closes = self.get_close_series(ticker)
+            last = self._last_row.get(ticker, -1)
+            column = _Column(np.full(len(self.trading_dates), np.nan))
+            for row in range(last + 1):
+                column[row] = indicator.update(closes[row])
+            entry = self._online[key] = (indicator, column)
+        return entry[1].values
+
+
+@dataclass
+class BarUpdate:
+    """What one bar changed: trades it caused and the holdings after it."""
+    ticker: str
+    date: date
+    trades: List[Trade]
+    holdings: Holdings
+
+
+class PaperTrader(BackTester):
+    def __init__(self, env: Environment, history: Optional[pd.DataFrame] = None):
+        """
+        Trade env's strategies on bars fed to on_bar.
+
+        Args:
+            env (Environment): Tickers, starting cash and strategies; the dates are not used
+            history (pd.DataFrame, optional): Bars before the first fed one, so
+                indicators start warm; nothing is traded on them
+
+        Raises:
+            ValueError: If a strategy rebalances, which needs every ticker's bar of a day at once
+        """
+        for strategy in env.strategies:
+            if _overrides(strategy, "weights_for_range"):
+                raise ValueError(f"{type(strategy).__name__} rebalances and cannot be paper traded bar by bar")
+        super().__init__(None, env, market_data=StreamingMarketData(history, env.tickers))
+
+        self._tickers = set(env.tickers)
+        # Bars per ticker, history included; a strategy only enters once it has lookback_days of history
+        self._bars: Dict[str, int] = {
+            ticker: int(np.count_nonzero(~np.isnan(self.all_market_data.get_close_series(ticker))))
+            for ticker in env.tickers
+        }
+        self.bars_received: Dict[str, int] = {ticker: 0 for ticker in env.tickers}
+        self._published = 0
+        for strategy in env.strategies:
+            for ticker in env.tickers:
+                strategy.warmup(self.all_market_data, ticker)
+
+    def _get_portfolio_value(self, portfolio: Dict[str, float], date: date) -> float:
+        # Tickers whose bar for date has not arrived yet are valued at their latest close
+        return sum(
+            self.all_market_data.last_close(ticker) * position.amount
+            for ticker in portfolio
+            for position in portfolio[ticker]
+        )
+
+    def _should_enter(self, strategy: Strategy, day: date, ticker: str, row: int) -> bool:
+        if isinstance(strategy, ExpressionStrategy):
+            # Only the trailing window the expression reads, instead of the whole history
+            start = max(0, row - strategy.lookback_days())
+            result = strategy.compiled.evaluate(
+                lambda field: self.all_market_data.get_series(field, ticker)[start:row + 1]
+            )
+            return bool(np.broadcast_to(result, (row + 1 - start,))[-1])
+        return bool(strategy.should_enter_batch(day, [ticker], self.all_market_data)[0])
+
+    def on_bar(
+        self, ticker: str, day: date, open: float, high: float, low: float, close: float, volume: int = 0
+    ) -> BarUpdate:
+        """
+        Feed one bar and trade on it.
+
+        Raises:
+            ValueError: If ticker is not in the environment or the bar is out of order
+        """
+        if ticker not in self._tickers:
+            raise ValueError(f"{ticker} is not in the environment")
+        row = self.all_market_data.append(
+            ticker, day, TickerData(open=open, close=close, high=high, low=low, volume=volume)
+        )
+        self._bars[ticker] += 1
+        self.bars_received[ticker] += 1
+
+        for position in list(self.current_portfolio.get(ticker, ())):
+            exit_price = self._liquidation_price(position, day)
+            if exit_price is not None:
+                self._liquidatePosition(position, day, exit_price)
+
+        for strategy in self.env.strategies:
+            if self._bars[ticker] <= strategy.lookback_days():
+                continue
+            if self._should_enter(strategy, day, ticker, row):
+                simulate = (
+                    self._simulate_long_position
+                    if strategy.strategy_type() == StrategyType.LONG
+                    else self._simulate_short_position
+                )
+                simulate(
+                    ticker,
+                    exposure=strategy.get_exposure(),
+                    liquidate_above=None,
+                    liquidate_below=None,
+                    date=day,
+                    strategy=strategy
+                )
+
+        self.holdings[day] = self._snapshotHoldings(day)
+        trades = self.trades[self._published:]
+        self._published = len(self.trades)
+        return BarUpdate(ticker=ticker, date=day, trades=trades, holdings=self.holdings[day])
@@ -0,0 +1,244 @@
+"""
+Backtester benchmarks over deterministic synthetic data.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --tickers 20 --years 5 --output bench.json
+
+Results are written as JSON so runs on different commits can be compared.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from backtester.back_tester import BackTester
+from backtester.environment import Environment
+from backtester.bar_store import BarStore
+from backtester.market_data import IntradayMarketData, MarketData
+from backtester.strategies.percentage_sma_strategy import PercentageSMAStrategy
+from backtester.strategies.ranking_strategy import RankingStrategy
+from backtester.strategies.rsi_strategy import RSIStrategy
+from benchmarks.synthetic import generate_intraday, generate_ohlcv
+
+
+STRATEGIES: Dict[str, Callable[[], object]] = {
+    "PercentageSMAStrategy": lambda: PercentageSMAStrategy(
+        days=20, percentage_change=3, direction="drop", position_type="long",
+        stop_loss_pct=5, take_profit_pct=5,
+    ),
+    "RSIStrategy": lambda: RSIStrategy(
+        period=14, rsi_threshold=30, position_type="long",
+        stop_loss_pct=5, take_profit_pct=5,
+    ),
+    "RankingStrategy": lambda: RankingStrategy(
+        metric="momentum", lookback=126, top_n=20, rebalance_days=21, position_type="long",
+    ),
+}
+
+
+def _timed(fn: Callable[[], object], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        # Strategies print debug lines; keep them out of the timing output
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _summary(timings: List[float], **extra) -> dict:
+    return {
+        "runs": len(timings),
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "max_s": max(timings),
+        **extra,
+    }
+
+
+def _environment(df: pd.DataFrame, strategies: list) -> Environment:
+    dates = sorted(df["date"].unique())
+    # Leave a year of history before the start date for indicator lookback
+    start = dates[min(252, len(dates) - 1)]
+    return Environment(
+        tickers=sorted(df["ticker"].unique()),
+        start_date=datetime.strptime(start, "%Y-%m-%d").date(),
+        end_date=datetime.strptime(dates[-1], "%Y-%m-%d").date(),
+        cash=1000,
+        strategies=strategies,
+    )
+
+
+def _simulated_days(tester: BackTester) -> int:
+    return max(len(tester.get_holdings()), 1)
+
+
+def bench_market_data(df: pd.DataFrame, repeat: int) -> dict:
+    timings = _timed(lambda: MarketData(df), repeat)
+    return _summary(timings, rows=len(df), per_row_s=statistics.median(timings) / len(df))
+
+
+def _bench_backtest(df: pd.DataFrame, repeat: int, make_strategies: Callable[[], list]) -> dict:
+    market_data = MarketData(df)
+    testers = []
+
+    def run():
+        tester = BackTester(data_df=None, env=_environment(df, make_strategies()), market_data=market_data)
+        tester.backtest()
+        testers.append(tester)
+
+    timings = _timed(run, repeat)
+    tester = testers[-1]
+    days = _simulated_days(tester)
+    return _summary(
+        timings,
+        trading_days=days,
+        per_day_s=statistics.median(timings) / days,
+        trades=len(tester.get_trades()),
+    )
+
+
+def bench_backtest_per_strategy(df: pd.DataFrame, repeat: int) -> dict:
+    return {
+        name: _bench_backtest(df, repeat, lambda make=make: [make()])
+        for name, make in STRATEGIES.items()
+    }
+
+
+def bench_liquidation_heavy(df: pd.DataFrame, repeat: int) -> dict:
+    # Enter on small SMA deviations with tight exits so positions churn daily
+    def make_strategies():
+        return [
+            PercentageSMAStrategy(
+                days=5, percentage_change=0.1, direction="drop", position_type="long",
+                stop_loss_pct=0.5, take_profit_pct=0.5,
+            ),
+            PercentageSMAStrategy(
+                days=5, percentage_change=0.1, direction="rise", position_type="short",
+                stop_loss_pct=0.5, take_profit_pct=0.5,
+            ),
+        ]
+    return _bench_backtest(df, repeat, make_strategies)
+
+
+def bench_api_serialization(df: pd.DataFrame, repeat: int) -> dict:
+    from app import _backtest_documents, _content_etag
+
+    tester = BackTester(data_df=None, env=_environment(df, [STRATEGIES["PercentageSMAStrategy"]()]), market_data=MarketData(df))
+    with contextlib.redirect_stdout(io.StringIO()):
+        tester.backtest()
+
+    payload_bytes: Dict[str, int] = {}
+
+    def run():
+        documents = _backtest_documents(
+            tester.get_trades(), tester.get_holdings(), tester.get_positions(),
+            tester.get_portfolio_events(), tester.env.cash
+        )
+        for name, series in documents.items():
+            _content_etag(series)
+            payload_bytes[name] = len(json.dumps(series))
+
+    timings = _timed(run, repeat)
+    return _summary(timings, payload_bytes=sum(payload_bytes.values()), payload_bytes_by_document=dict(payload_bytes))
+
+
+def bench_intraday(df: pd.DataFrame, repeat: int) -> dict:
+    # Minute bars for the same universe and span as the daily data, with
+    # stop-loss/take-profit checks at bar resolution
+    n_tickers = df["ticker"].nunique()
+    years = df["date"].nunique() / 252
+    with tempfile.TemporaryDirectory() as path:
+        store = BarStore.create(path, resolution=60)
+        for chunk in generate_intraday(n_tickers, years):
+            store.append(chunk)
+
+        market_data_timings = _timed(lambda: IntradayMarketData(BarStore(path)), repeat)
+        market_data = IntradayMarketData(BarStore(path))
+        testers = []
+
+        def run():
+            strategies = [STRATEGIES["PercentageSMAStrategy"]()]
+            tester = BackTester(data_df=None, env=_environment(df, strategies), market_data=market_data)
+            tester.backtest()
+            testers.append(tester)
+
+        timings = _timed(run, repeat)
+        bars = sum(len(store.bars(ticker)) for ticker in store.tickers)
+    days = _simulated_days(testers[-1])
+    return _summary(
+        timings,
+        bars=bars,
+        market_data_median_s=statistics.median(market_data_timings),
+        trading_days=days,
+        per_day_s=statistics.median(timings) / days,
+        trades=len(testers[-1].get_trades()),
+    )
+
+
+SCENARIOS: Dict[str, Callable[[pd.DataFrame, int], dict]] = {
+    "market_data": bench_market_data,
+    "backtest": bench_backtest_per_strategy,
+    "liquidation_heavy": bench_liquidation_heavy,
+    "api_serialization": bench_api_serialization,
+    "intraday": bench_intraday,
+}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=10)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    df = generate_ohlcv(args.tickers, args.years, seed=args.seed)
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        print(f"[BENCH] {name}", file=sys.stderr)
+        results[name] = SCENARIOS[name](df, args.repeat)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "params": {"tickers": args.tickers, "years": args.years, "seed": args.seed, "repeat": args.repeat},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from datetime import date
+from typing import Iterator, List
+
+
+def synthetic_tickers(n_tickers: int) -> List[str]:
+    return [f"SYN{i:04d}" for i in range(n_tickers)]
+
+
+def generate_ohlcv(
+    n_tickers: int,
+    years: float,
+    seed: int = 0,
+    start_date: date = date(2005, 1, 3),
+    annual_drift: float = 0.07,
+    annual_volatility: float = 0.30,
+) -> pd.DataFrame:
+    """
+    Deterministic synthetic daily bars in the same long format as data.csv
+    (date, ticker, open, close, high, low, volume).
+
+    Closes follow a geometric Brownian motion per ticker over business days;
+    the same (n_tickers, years, seed) always produces identical data.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start=start_date, periods=int(round(years * 252)))
+    n_days = len(dates)
+
+    daily_drift = annual_drift / 252
+    daily_volatility = annual_volatility / np.sqrt(252)
+    log_returns = rng.normal(
+        daily_drift - daily_volatility ** 2 / 2, daily_volatility, size=(n_days, n_tickers)
+    )
+    initial = rng.uniform(20, 500, size=n_tickers)
+    close = initial * np.exp(np.cumsum(log_returns, axis=0))
+
+    previous_close = np.vstack([initial, close[:-1]])
+    open_ = previous_close * np.exp(rng.normal(0, daily_volatility / 4, size=close.shape))
+    spread = np.abs(rng.normal(0, daily_volatility / 2, size=close.shape))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.integers(100_000, 10_000_000, size=close.shape)
+
+    tickers = synthetic_tickers(n_tickers)
+    return pd.DataFrame({
+        "date": np.repeat(dates.strftime("%Y-%m-%d").to_numpy(), n_tickers),
+        "ticker": np.tile(tickers, n_days),
+        "open": open_.ravel(),
+        "close": close.ravel(),
+        "high": high.ravel(),
+        "low": low.ravel(),
+        "volume": volume.ravel(),
+    })
+
+
+def generate_intraday(
+    n_tickers: int,
+    years: float,
+    seed: int = 0,
+    start_date: date = date(2005, 1, 3),
+    bars_per_day: int = 390,
+    chunk_days: int = 21,
+    annual_volatility: float = 0.30,
+) -> Iterator[pd.DataFrame]:
+    """
+    Deterministic synthetic 1-minute bars from 09:30 in the long format
+    BarStore.append reads (timestamp, ticker, open, high, low, close, volume),
+    yielded chunk_days business days at a time to keep memory bounded.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start=start_date, periods=int(round(years * 252)))
+    tickers = synthetic_tickers(n_tickers)
+    minute_volatility = annual_volatility / np.sqrt(252 * bars_per_day)
+    offsets = (np.timedelta64(9 * 60 + 30, "m") + np.arange(bars_per_day) * np.timedelta64(1, "m"))
+    last = rng.uniform(20, 500, size=n_tickers)
+
+    for first in range(0, len(dates), chunk_days):
+        days = dates[first:first + chunk_days].to_numpy().astype("datetime64[m]")
+        n_bars = len(days) * bars_per_day
+        log_returns = rng.normal(-minute_volatility ** 2 / 2, minute_volatility, size=(n_bars, n_tickers))
+        close = last * np.exp(np.cumsum(log_returns, axis=0))
+        open_ = np.vstack([last, close[:-1]])
+        spread = np.abs(rng.normal(0, minute_volatility / 2, size=close.shape))
+        last = close[-1]
+
+        timestamps = (days[:, None] + offsets).ravel()
+        yield pd.DataFrame({
+            "timestamp": np.repeat(timestamps, n_tickers),
+            "ticker": np.tile(tickers, n_bars),
+            "open": open_.ravel(),
+            "high": (np.maximum(open_, close) * (1 + spread)).ravel(),
+            "low": (np.minimum(open_, close) * (1 - spread)).ravel(),
+            "close": close.ravel(),
+            "volume": rng.integers(100, 10_000, size=close.shape).ravel(),
+        })
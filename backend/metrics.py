@@ -0,0 +1,111 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+
+# Upper bounds (seconds) of the HTTP latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """
+    In-process aggregates exposed in the Prometheus text format: HTTP latency
+    per route and totals over instrumented backtests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (method, route, status) -> [bucket counts..., +Inf], sum
+        self._http_buckets: Dict[Tuple[str, str, int], List[int]] = {}
+        self._http_sum: Dict[Tuple[str, str, int], float] = defaultdict(float)
+        self._runs: Dict[str, int] = defaultdict(int)
+        self._backtest: Dict[str, float] = defaultdict(float)
+        self._phases: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._strategies: Dict[Tuple[str, str], float] = defaultdict(float)
+
+    def observe_request(self, method: str, route: str, status_code: int, seconds: float):
+        key = (method, route, status_code)
+        with self._lock:
+            buckets = self._http_buckets.get(key)
+            if buckets is None:
+                buckets = self._http_buckets[key] = [0] * (len(LATENCY_BUCKETS) + 1)
+            buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self._http_sum[key] += seconds
+
+    def observe_run(self, status: str, run_metrics: Optional[dict] = None):
+        with self._lock:
+            self._runs[status] += 1
+            if not run_metrics:
+                return
+            self._backtest["trading_days"] += run_metrics["trading_days"]
+            self._backtest["positions_opened"] += run_metrics["positions_opened"]
+            self._backtest["positions_closed"] += run_metrics["positions_closed"]
+            for phase, stats in run_metrics["phases"].items():
+                self._phases[(phase, "calls")] += stats["calls"]
+                self._phases[(phase, "seconds")] += stats["total_s"]
+            for strategy, stats in run_metrics["strategies"].items():
+                for field in ("calls", "total_s", "positions_opened", "positions_closed"):
+                    self._strategies[(str(strategy), field)] += stats[field]
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            lines.append("# HELP http_request_duration_seconds HTTP request latency by route.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (method, route, status_code), buckets in sorted(self._http_buckets.items()):
+                labels = dict(method=method, route=route, status=status_code)
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                    cumulative += count
+                    lines.append(f"http_request_duration_seconds_bucket{_labels(**labels, le=bound)} {cumulative}")
+                lines.append(f"http_request_duration_seconds_sum{_labels(**labels)} {self._http_sum[(method, route, status_code)]}")
+                lines.append(f"http_request_duration_seconds_count{_labels(**labels)} {cumulative}")
+
+            lines.append("# HELP backtest_runs_total Finished backtest runs by status.")
+            lines.append("# TYPE backtest_runs_total counter")
+            for status, count in sorted(self._runs.items()):
+                lines.append(f"backtest_runs_total{_labels(status=status)} {count}")
+
+            # Each family is one contiguous block with its own HELP and TYPE
+            for name, description in (
+                ("trading_days", "Trading days simulated by instrumented runs."),
+                ("positions_opened", "Positions opened by instrumented runs."),
+                ("positions_closed", "Positions closed by instrumented runs."),
+            ):
+                lines.append(f"# HELP backtest_{name}_total {description}")
+                lines.append(f"# TYPE backtest_{name}_total counter")
+                lines.append(f"backtest_{name}_total {self._backtest[name]}")
+
+            for field, description in (
+                ("seconds", "Time spent per engine phase in instrumented runs."),
+                ("calls", "Calls per engine phase in instrumented runs."),
+            ):
+                lines.append(f"# HELP backtest_phase_{field}_total {description}")
+                lines.append(f"# TYPE backtest_phase_{field}_total counter")
+                for (phase, phase_field), value in sorted(self._phases.items()):
+                    if phase_field == field:
+                        lines.append(f"backtest_phase_{field}_total{_labels(phase=phase)} {value}")
+
+            for field, name, description in (
+                ("total_s", "seconds", "Time spent in should_enter per strategy class."),
+                ("calls", "calls", "Calls to should_enter per strategy class."),
+                ("positions_opened", "positions_opened", "Positions opened per strategy class."),
+                ("positions_closed", "positions_closed", "Positions closed per strategy class."),
+            ):
+                lines.append(f"# HELP backtest_strategy_{name}_total {description}")
+                lines.append(f"# TYPE backtest_strategy_{name}_total counter")
+                for (strategy, strategy_field), value in sorted(self._strategies.items()):
+                    if strategy_field == field:
+                        lines.append(f"backtest_strategy_{name}_total{_labels(strategy=strategy)} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,383 @@
+import hashlib
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+def config_key(env: dict) -> str:
+    """Hash of everything in a stored environment that affects backtest results."""
+    config = {
+        "environment_id": str(env["_id"]),
+        "stocks": env.get("stocks", []),
+        "start_date": env.get("start_date"),
+        "end_date": env.get("end_date"),
+        "strategies": env.get("strategies", []),
+        "missing_data": env.get("missing_data", "abort"),
+    }
+    payload = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def job_key(kind: str, env: dict, params: dict) -> str:
+    """Hash of a run that returns a result computed from an environment and parameters, e.g. a walk-forward."""
+    payload = json.dumps({"kind": kind, "config": config_key(env), "params": params}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def run_to_dict(run: dict) -> dict:
+    return {
+        "run_id": run["_id"],
+        "status": run["status"],
+        "error": run.get("error"),
+        "created_at": run["created_at"].isoformat(),
+        "finished_at": run["finished_at"].isoformat() if run.get("finished_at") else None,
+        "usage": run.get("usage"),
+    }
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Quota:
+    """Compute a user may use; None means unlimited."""
+    cpu_seconds_per_day: Optional[float] = None
+    max_concurrent_runs: Optional[int] = None
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+ACTIVE = ["queued", "running"]
+
+
+class RunQueue:
+    """
+    Backtest runs queued in a MongoDB collection and executed by any number of
+    worker processes (see worker.py), so the API only enqueues.
+
+    A run document goes queued -> running -> done | cancelled | aborted | failed.
+    Workers claim the next queued run, lower priority first and FIFO within
+    a priority, with one atomic find-and-modify, so each run is claimed once
+    however many workers poll. A claim is a lease that the worker renews by
+    heartbeat while the run executes. If the worker dies the lease expires and
+    another worker claims the run again, up to max_attempts times.
+
+    Submitting a configuration that is already queued or running returns that
+    run instead of queueing another one. Submitting a different configuration
+    for the same environment cancels the stale run, so two runs never race to
+    write the same environment's results.
+
+    Besides backtests, which store an environment's results, runs of other
+    kinds (e.g. walk-forward) keep the data they return in their result
+    field. They neither cancel nor are cancelled by the environment's
+    backtests.
+
+    Finished runs keep the resources they used, so a user's CPU seconds over
+    the last day and active runs can be checked against a Quota.
+
+    With an environments collection, the status of each environment's latest
+    backtest is copied to its run_status field, so listing environments does
+    not have to read the runs.
+    """
+
+    NORMAL = 0
+    LOW = 1
+
+    # Kinds of runs that produce an environment's stored results; batch runs
+    # were recorded before batch members were queued as backtests
+    RESULT_KINDS = ["backtest", "batch"]
+
+    def __init__(
+        self,
+        collection,
+        lease_seconds: float = 30,
+        max_attempts: int = 3,
+        max_queued: Optional[int] = None,
+        environments=None,
+    ):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_queued = max_queued
+        self.environments = environments
+
+    def _writes_results(self, run: dict) -> bool:
+        # Runs queued before kinds existed are backtests
+        return run.get("kind") in self.RESULT_KINDS + [None]
+
+    def _mirror(self, environment_id: str, status: str):
+        if self.environments is not None and ObjectId.is_valid(environment_id):
+            self.environments.update_one({"_id": ObjectId(environment_id)}, {"$set": {"run_status": status}})
+
+    def ensure_indexes(self):
+        # Claims scan queued runs in priority order; status lookups go by environment
+        self.collection.create_index([("status", ASCENDING), ("priority", ASCENDING), ("created_at", ASCENDING)])
+        self.collection.create_index([("environment_id", ASCENDING), ("created_at", DESCENDING)])
+        self.collection.create_index([("key", ASCENDING), ("status", ASCENDING)])
+        # At most one active run per configuration, however many API processes submit it.
+        # The active flag mirrors status in ACTIVE, since servers before MongoDB 6.0 only
+        # accept equality (not $in) in a partial index's filter.
+        self.collection.update_many(
+            {"status": {"$in": ACTIVE}, "active": {"$exists": False}}, {"$set": {"active": True}}
+        )
+        self.collection.create_index(
+            [("key", ASCENDING)],
+            name="active_run_key",
+            unique=True,
+            partialFilterExpression={"active": True, "cancel_requested": False},
+        )
+        # Quota checks: a user's active runs and the runs they finished in the last day
+        self.collection.create_index([("user_id", ASCENDING), ("status", ASCENDING)])
+        self.collection.create_index([("user_id", ASCENDING), ("finished_at", ASCENDING)])
+
+    def submit(
+        self, env: dict, priority: int = NORMAL, quota: Optional[Quota] = None,
+        kind: str = "backtest", params: Optional[dict] = None,
+    ) -> Tuple[dict, bool]:
+        """
+        Returns (run, created); created is False when attaching to an active run.
+
+        Args:
+            env (dict): Stored environment to run
+            priority (int): NORMAL or LOW
+            quota (Quota, optional): Limits of the environment's user
+            kind (str): "backtest", or the kind of a run that returns a result, e.g. "walk_forward"
+            params (dict, optional): What a run of another kind needs besides env
+
+        Raises:
+            QueueFull: If max_queued runs are already queued
+            QuotaExceeded: If a new run would take the environment's user over quota
+        """
+        writes_results = kind in self.RESULT_KINDS
+        key = config_key(env) if writes_results else job_key(kind, env, params)
+        environment_id = str(env["_id"])
+        active = {"key": key, "active": True, "cancel_requested": False}
+        existing = self.collection.find_one(active)
+        if existing is not None:
+            return existing, False
+
+        if quota is not None:
+            # The run this submit replaces is cancelled below, so it does not count as concurrent
+            self.check_quota(env.get("user_id"), quota, replacing=environment_id if writes_results else None)
+
+        if self.max_queued is not None:
+            queued = self.queued()
+            if queued >= self.max_queued:
+                raise QueueFull(f"{queued} backtests already queued")
+
+        if writes_results:
+            self.cancel(environment_id)
+        run_id = uuid.uuid4().hex
+        # An upsert, so two API processes submitting the same configuration share one run
+        try:
+            run = self.collection.find_one_and_update(
+                active,
+                {"$setOnInsert": {
+                    "_id": run_id,
+                    "kind": kind,
+                    "user_id": env.get("user_id"),
+                    "environment_id": environment_id,
+                    "env": env,
+                    "params": params,
+                    "status": "queued",
+                    "priority": priority,
+                    "attempts": 0,
+                    "worker": None,
+                    "lease_until": None,
+                    "error": None,
+                    "created_at": datetime.utcnow(),
+                    "finished_at": None,
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Both upserts missed and inserted; the unique index kept the other one
+            existing = self.collection.find_one(active)
+            if existing is None:
+                raise
+            return existing, False
+        if writes_results:
+            self._mirror(environment_id, run["status"])
+        return run, run["_id"] == run_id
+
+    def claim(self, worker_id: str) -> Optional[dict]:
+        """Lease the next queued run, or a running one whose worker stopped heartbeating."""
+        now = datetime.utcnow()
+        self.reap(now)
+        run = self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "queued"},
+                    {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$lt": self.max_attempts}},
+                ],
+                "cancel_requested": False,
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "worker": worker_id,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", ASCENDING), ("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if run is not None and self._writes_results(run):
+            self._mirror(run["environment_id"], run["status"])
+        return run
+
+    def heartbeat(self, run_id: str, worker_id: str) -> Optional[dict]:
+        """Renew the lease; None means the run was claimed by another worker after this one's lease expired."""
+        return self.collection.find_one_and_update(
+            {"_id": run_id, "worker": worker_id, "status": "running"},
+            {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def finish(
+        self, run_id: str, worker_id: str, status: str, error: Optional[str] = None,
+        usage: Optional[dict] = None, result: Optional[dict] = None,
+    ) -> bool:
+        """Record the outcome, resources used and result unless the run's lease has passed to another worker."""
+        update = {
+            "status": status,
+            "active": False,
+            "error": error,
+            "usage": usage,
+            "finished_at": datetime.utcnow(),
+            "lease_until": None,
+        }
+        if result is not None:
+            update["result"] = result
+        run = self.collection.find_one_and_update(
+            {"_id": run_id, "worker": worker_id, "status": "running"},
+            {"$set": update},
+        )
+        if run is None:
+            return False
+        if self._writes_results(run):
+            self._mirror(run["environment_id"], status)
+        return True
+
+    def user_usage(self, user_id: str, now: Optional[datetime] = None) -> dict:
+        """A user's active runs and the CPU seconds of the runs they finished in the last 24 hours."""
+        now = now or datetime.utcnow()
+        since = now - timedelta(days=1)
+        finished = list(self.collection.find(
+            {"user_id": user_id, "finished_at": {"$gte": since}},
+            {"finished_at": 1, "usage.cpu_s": 1},
+            sort=[("finished_at", ASCENDING)],
+        ))
+        return {
+            "active_runs": self.collection.count_documents({"user_id": user_id, "status": {"$in": ACTIVE}}),
+            "runs_last_day": len(finished),
+            "cpu_seconds_last_day": sum((run.get("usage") or {}).get("cpu_s", 0.0) for run in finished),
+            # When the oldest counted run stops counting
+            "window_resets_at": finished[0]["finished_at"] + timedelta(days=1) if finished else None,
+        }
+
+    def check_quota(self, user_id: str, quota: Quota, replacing: Optional[str] = None):
+        """
+        Raise QuotaExceeded if user_id may not start another run.
+
+        Args:
+            user_id (str): User starting the run
+            quota (Quota): Limits to enforce
+            replacing (str, optional): Environment whose active runs the new run cancels
+        """
+        now = datetime.utcnow()
+        if quota.max_concurrent_runs is not None:
+            query = {"user_id": user_id, "status": {"$in": ACTIVE}}
+            if replacing is not None:
+                query["environment_id"] = {"$ne": replacing}
+            active = self.collection.count_documents(query)
+            if active >= quota.max_concurrent_runs:
+                raise QuotaExceeded(
+                    f"{active} backtests already queued or running, the limit is {quota.max_concurrent_runs}",
+                    retry_after=int(min(self.lease_seconds, 60)),
+                )
+        if quota.cpu_seconds_per_day is not None:
+            usage = self.user_usage(user_id, now)
+            if usage["cpu_seconds_last_day"] >= quota.cpu_seconds_per_day:
+                raise QuotaExceeded(
+                    f"used {usage['cpu_seconds_last_day']:.1f} of {quota.cpu_seconds_per_day:g} CPU seconds "
+                    "in the last 24 hours",
+                    retry_after=max(1, int((usage["window_resets_at"] - now).total_seconds()) + 1),
+                )
+
+    def reap(self, now: Optional[datetime] = None) -> int:
+        """
+        Finish runs whose lease expired and that no worker will claim again:
+        cancelled ones whose worker died before seeing the request, and ones
+        on their last attempt.
+        """
+        now = now or datetime.utcnow()
+        expired = {"status": "running", "lease_until": {"$lt": now}}
+        reaped = 0
+        for query, status, error in [
+            ({**expired, "cancel_requested": True}, "cancelled", "cancelled"),
+            (
+                {**expired, "attempts": {"$gte": self.max_attempts}},
+                "failed",
+                f"worker stopped heartbeating on all {self.max_attempts} attempts",
+            ),
+        ]:
+            environment_ids = (
+                self.collection.distinct("environment_id", {**query, "kind": {"$in": self.RESULT_KINDS + [None]}})
+                if self.environments is not None else []
+            )
+            result = self.collection.update_many(
+                query,
+                {"$set": {"status": status, "active": False, "error": error, "finished_at": now, "lease_until": None}},
+            )
+            for environment_id in environment_ids:
+                self._mirror(environment_id, status)
+            reaped += result.modified_count
+        return reaped
+
+    def cancel(self, environment_id: str) -> List[dict]:
+        """
+        Cancel an environment's active backtests: queued runs immediately,
+        running ones when their worker sees the request at its next heartbeat.
+        """
+        now = datetime.utcnow()
+        backtests = {"environment_id": environment_id, "kind": {"$in": self.RESULT_KINDS + [None]}}
+        runs = list(self.collection.find({**backtests, "status": {"$in": ACTIVE}}))
+        cancelled = self.collection.update_many(
+            {**backtests, "status": "queued"},
+            {"$set": {"status": "cancelled", "active": False, "cancel_requested": True, "finished_at": now}},
+        )
+        if cancelled.modified_count:
+            self._mirror(environment_id, "cancelled")
+        self.collection.update_many(
+            {**backtests, "status": "running"},
+            {"$set": {"cancel_requested": True}},
+        )
+        return [self.collection.find_one({"_id": run["_id"]}) for run in runs]
+
+    def get(self, run_id: str) -> Optional[dict]:
+        return self.collection.find_one({"_id": run_id})
+
+    def latest(self, environment_id: str) -> Optional[dict]:
+        # Runs queued before usage was recorded have no kind
+        return self.collection.find_one(
+            {"environment_id": environment_id, "kind": {"$in": self.RESULT_KINDS + [None]}},
+            sort=[("created_at", DESCENDING)],
+        )
+
+    def queued(self) -> int:
+        return self.collection.count_documents({"status": "queued"})
@@ -0,0 +1,57 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+
+class Warmup:
+    """
+    Tracks application startup: how long each phase took, whether the market
+    data has been loaded, and whether background warmup has finished.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self._data_loaded = threading.Event()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 4)
+            print(f"[STARTUP] {name} took {self.phases[name]:.3f}s")
+
+    def mark_data_loaded(self):
+        self._data_loaded.set()
+
+    def wait_for_data(self, timeout: Optional[float] = None) -> bool:
+        return self._data_loaded.wait(timeout)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def start(self, fn: Callable[["Warmup"], None]):
+        """Run fn(self) in a background thread; the app is ready once it returns."""
+        def run():
+            try:
+                fn(self)
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                print(f"[STARTUP] Warmup failed: {self.error}")
+                return
+            finally:
+                # Requests waiting on the data must not hang if loading failed
+                self._data_loaded.set()
+            self._ready.set()
+
+        self._thread = threading.Thread(target=run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "error": self.error, "phases": dict(self.phases)}
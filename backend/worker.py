@@ -0,0 +1,151 @@
+"""
+Backtest worker: claims queued runs from MongoDB and executes them.
+
+The API only enqueues runs (backtests, batches, walk-forward and parameter
+search). Start as many workers as needed, on this machine or others, against
+the same MONGO_URI:
+
+    uv run python worker.py --threads 2
+
+Each worker loads the market data like the API does (set MARKET_DATA_DIR to
+share one memory-mapped copy between the workers of a machine), then runs
+claimed runs while renewing their lease. A run whose worker dies is
+claimed again by another worker once its lease expires.
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from backtester.run_control import BacktestAborted, RunControl
+from run_registry import RunQueue
+
+
+class Worker:
+    def __init__(
+        self,
+        queue: RunQueue,
+        run: Callable[[dict, RunControl], Tuple[Optional[dict], Optional[dict]]],
+        worker_id: Optional[str] = None,
+        poll_seconds: float = 1.0,
+        max_seconds: Optional[float] = None,
+        max_memory_mb: Optional[float] = None,
+    ):
+        """
+        Args:
+            queue (RunQueue): Queue to claim runs from
+            run (Callable): Executes a claimed run document under a RunControl and returns
+                (usage, result): the resources it used and, for runs that return data
+                instead of storing it, that data. usage may include pool_cpu_s, the CPU
+                time of processes the run started, which is added to the thread's
+            worker_id (str, optional): Name of this worker in claimed runs, unique across workers
+            poll_seconds (float): How long to wait for a wake() before polling an empty queue again
+            max_seconds (float, optional): Wall-clock budget per run
+            max_memory_mb (float, optional): Memory budget per run
+        """
+        self.queue = queue
+        self.run = run
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.poll_seconds = poll_seconds
+        self.max_seconds = max_seconds
+        self.max_memory_mb = max_memory_mb
+        self._wake = threading.Event()
+
+    def wake(self):
+        """Check the queue now instead of at the next poll, e.g. right after a submit in this process."""
+        self._wake.set()
+
+    def run_once(self) -> bool:
+        """Claim and execute one run; False if nothing was queued."""
+        job = self.queue.claim(self.worker_id)
+        if job is None:
+            return False
+
+        control = RunControl(max_seconds=self.max_seconds, max_memory_mb=self.max_memory_mb)
+        finished = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job["_id"], control, finished),
+            name=f"heartbeat-{job['_id']}", daemon=True
+        )
+        heartbeat.start()
+        status, error, usage, result = "done", None, None, None
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        try:
+            usage, result = self.run(job, control)
+        except BacktestAborted as e:
+            status, error = "cancelled" if control.cancelled else "aborted", e.reason
+        except Exception as e:
+            print(f"[WORKER] Run {job['_id']} failed: {type(e).__name__}: {e}")
+            status, error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            finished.set()
+            heartbeat.join()
+        # The whole run is charged, loading data and storing results included, whether or not it finished.
+        # Only this thread's CPU counts, plus the pools the run reported: workers can share a
+        # process (see app.py), so process-wide getrusage would charge a run for its neighbours.
+        usage = dict(usage or {})
+        pool_cpu_s = usage.pop("pool_cpu_s", 0.0)
+        usage.update(wall_s=time.perf_counter() - started, cpu_s=time.thread_time() - cpu_started + pool_cpu_s)
+        self.queue.finish(job["_id"], self.worker_id, status, error, usage, result)
+        return True
+
+    def _heartbeat(self, run_id: str, control: RunControl, finished: threading.Event):
+        # Renew well before the lease runs out; cancelling stops the run before its next trading day
+        interval = min(5.0, self.queue.lease_seconds / 3)
+        while not finished.wait(interval):
+            run = self.queue.heartbeat(run_id, self.worker_id)
+            if run is None:
+                print(f"[WORKER] Lost the lease on run {run_id}")
+                control.cancel()
+                return
+            if run.get("cancel_requested"):
+                control.cancel()
+
+    def run_forever(self, stop: Optional[threading.Event] = None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                # e.g. MongoDB unreachable; keep polling
+                print(f"[WORKER] Could not claim a run: {type(e).__name__}: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def start(self, stop: threading.Event) -> threading.Thread:
+        thread = threading.Thread(target=self.run_forever, args=(stop,), name=f"backtest-worker-{self.worker_id}", daemon=True)
+        thread.start()
+        return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=1, help="Runs to execute at once in this process")
+    parser.add_argument("--poll-seconds", type=float, default=1.0, help="Seconds between polls of an empty queue")
+    args = parser.parse_args(argv)
+
+    # The app module has no import side effects; configure and load data as its startup does
+    import app
+    import dotenv
+
+    dotenv.load_dotenv()
+    app._configure()
+    app._warm(app.warmup)
+
+    stop = threading.Event()
+    for i in range(args.threads):
+        app.make_worker(f"{socket.gethostname()}:{os.getpid()}:{i}", args.poll_seconds).start(stop)
+    print(f"[WORKER] {args.threads} worker threads polling for runs")
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        # Runs in progress are claimed again by other workers once their lease expires
+        stop.set()
+
+
+if __name__ == "__main__":
+    main()